@@ -5,15 +5,44 @@ import plotly.graph_objects as go
 import os
 from datetime import datetime, date, timedelta
 
-import json
-import re
+import time
 from pathlib import Path
 
+from agro_cache import em_cache
+from agro_cenarios import biblioteca_sessao, diferencas_campos, diferencas_kpis
+from agro_engine import calcular_cenario
+from agro_estado import agendar_gravacao, chave_persistida, destino_sessao, ler_estado, para_json
+from agro_estilo import aplicar_estilo
+from agro_figuras import LIMITE_SVG, figura, passo_rotulos
+from agro_formato import formatar_br
+from agro_fluxo import consolidar_fluxo, eventos_safra, necessidade_venda, primeiro_mes_apos, tabela_necessidade_venda
+from agro_hedge import agenda_precos, otimizar_hedge
+from agro_montecarlo import SimulacaoMonteCarlo, resumo
+from agro_progressivo import aguardar, antecipar
+from agro_sensibilidade import DRIVERS, curvas_sensibilidade, eixo, grade, mapa_margem_ha, tornado
+from agro_solver import VARIAVEIS, resolver_metas
+from agro_tabelas import exibir_tabela, mascara_linhas, mascara_sinais
+
+# Cálculos puros em cache por hash das entradas (LRU do processo, compartilhado entre sessões e
+# páginas): reabrir o mesmo cenário não recalcula nada. Nesta página, os nomes abaixo são as
+# versões em cache (mesma assinatura; dicts/DataFrames vêm como cópia, arrays somente leitura).
+calcular_cenario = em_cache(calcular_cenario)
+mapa_margem_ha = em_cache(mapa_margem_ha)
+curvas_sensibilidade = em_cache(curvas_sensibilidade)
+tornado = em_cache(tornado)
+eventos_safra = em_cache(eventos_safra)
+consolidar_fluxo = em_cache(consolidar_fluxo)
+tabela_necessidade_venda = em_cache(tabela_necessidade_venda)
+resolver_metas = em_cache(resolver_metas)
+agenda_precos = em_cache(agenda_precos)
+otimizar_hedge = em_cache(otimizar_hedge)
+
 # ============================================================
 # Persistência (SESSÃO + JSON)
 # - Mantém todos os inputs editáveis salvos automaticamente
 # - Funciona entre páginas (SOJA / MILHO / SOJA+MILHO)
-# - Sobrevive a reiniciar o Streamlit (arquivo agro_state.json)
+# - Sobrevive a reiniciar o Streamlit (agro_state.db, por perfil/fazenda — ?perfil=&fazenda= na URL;
+#   agro_state.json com AGRO_STATE_BACKEND=json)
 # ============================================================
 
 STATE_FILE_NAME = "agro_state.json"
@@ -30,44 +59,35 @@ def _root_dir() -> Path:
 STATE_FILE = _root_dir() / STATE_FILE_NAME
 
 
-def _parse_date_like(v):
-    if isinstance(v, str) and re.match(r"^\d{4}-\d{2}-\d{2}$", v):
-        try:
-            return date.fromisoformat(v)
-        except Exception:
-            return v
-    return v
-
-
 def load_persisted_state() -> None:
-    """Carrega o JSON uma vez por sessão e injeta em st.session_state."""
+    """Carrega o estado salvo (perfil/fazenda da sessão) uma vez e injeta em st.session_state."""
     if st.session_state.get("_agro_state_loaded"):
         return
-    if STATE_FILE.exists():
-        try:
-            data = json.loads(STATE_FILE.read_text(encoding="utf-8"))
-            if isinstance(data, dict):
-                for k, v in data.items():
-                    if k not in st.session_state:
-                        st.session_state[k] = _parse_date_like(v)
-        except Exception:
-            # Se o JSON estiver corrompido, ignora e segue
-            pass
-
-
-def save_persisted_state(prefixes=("soja_", "milho_")) -> None:
-    """Salva no JSON tudo que começa com soja_ ou milho_."""
-    try:
-        out = {}
-        for k, v in st.session_state.items():
-            if any(str(k).startswith(p) for p in prefixes):
-                if isinstance(v, date):
-                    out[k] = v.isoformat()
-                else:
-                    out[k] = v
-        STATE_FILE.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
-    except Exception:
-        pass
+    data = ler_estado(destino_sessao(STATE_FILE))
+    for k, v in data.items():
+        if k not in st.session_state:
+            st.session_state[k] = v
+    # Retrato do que já está no arquivo: o primeiro save grava só o que for diferente
+    st.session_state["_agro_state_salvo"] = {k: para_json(v) for k, v in data.items()}
+    st.session_state["_agro_state_loaded"] = True
+
+
+def save_persisted_state(prefixes=("soja_", "milho_"), imediato=False) -> None:
+    """Salva o que começa com soja_ ou milho_ e mudou desde o último save da sessão.
+
+    A escrita é agrupada com a dos reruns seguintes e atômica (agro_estado); `imediato=True`
+    grava na hora.
+    """
+    salvo = st.session_state.setdefault("_agro_state_salvo", {})
+    alteradas = {}
+    for k, v in st.session_state.items():
+        if chave_persistida(k, prefixes):
+            v = para_json(v)
+            if k not in salvo or salvo[k] != v:
+                alteradas[k] = v
+    if alteradas or imediato:
+        # `salvo` só recebe as chaves depois de gravadas: se a escrita falhar, elas voltam no próximo save
+        agendar_gravacao(destino_sessao(STATE_FILE), alteradas, imediato=imediato, gravadas=salvo)
 
 
 def _rerun() -> None:
@@ -76,6 +96,50 @@ def _rerun() -> None:
     else:
         st.experimental_rerun()
 
+
+def _fragment(**kwargs):
+    # st.fragment (>= 1.37) / st.experimental_fragment (versões anteriores)
+    if hasattr(st, "fragment"):
+        return st.fragment(**kwargs)
+    return st.experimental_fragment(**kwargs)
+
+
+def _manter_widgets(chaves) -> None:
+    """Widgets não renderizados no rerun (ex.: aba fechada) perdem o valor no Streamlit;
+    regravar a chave antes mantém o valor na sessão (e no JSON)."""
+    for k in chaves:
+        if k in st.session_state:
+            st.session_state[k] = st.session_state[k]
+
+
+def _aguardar_pausa(assinatura, janela_s: float, prefixo: str):
+    """Auto-aplicar com espera (debounce): enquanto as entradas da barra lateral mudarem em
+    menos de `janela_s` segundos, a página continua mostrando as últimas entradas aplicadas.
+
+    Retorna (entradas a usar nos cálculos, espera em andamento?). Durante a espera o
+    salvamento também fica adiado.
+    """
+    ss = st.session_state
+    agora = time.monotonic()
+    if ss.get(f"_{prefixo}_entradas_vistas") != assinatura:
+        ss[f"_{prefixo}_entradas_vistas"] = assinatura
+        ss[f"_{prefixo}_ult_edicao"] = agora
+    aplicadas = f"_{prefixo}_entradas_aplicadas"
+    if janela_s <= 0 or aplicadas not in ss or agora - ss[f"_{prefixo}_ult_edicao"] >= janela_s:
+        ss[aplicadas] = assinatura
+    if ss[aplicadas] == assinatura:
+        return assinatura, False
+
+    st.info(f"⏳ Alterações recebidas — recalculando após {janela_s:g} s sem edições. Exibindo o último cenário aplicado.")
+
+    @_fragment(run_every=0.5)
+    def _espera():
+        if time.monotonic() - ss[f"_{prefixo}_ult_edicao"] >= janela_s:
+            _rerun()
+
+    _espera()
+    return ss[aplicadas], True
+
 # ---------------- DEFAULTS (SOJA) ----------------
 SOJA_DEFAULTS = {
     "soja_simular_quebra": False,
@@ -112,6 +176,15 @@ SOJA_DEFAULTS = {
     "soja_preco_futuro_est": 117.0,
 }
 
+# Campos do plano editados na barra lateral (no auto-aplicar com espera, vale o último aplicado)
+CAMPOS_BARRA = tuple("soja_" + campo for campo in (
+    "simular_quebra", "perc_quebra", "area_propria_ha", "area_arrendada_ha", "produtividade_sc_ha",
+    "custo_operacional_ha", "perc_travado_pct", "preco_travado", "preco_mercado", "margem_alvo_pct",
+    "perc_financiado_pct", "taxa_juros_aa_pct", "data_desembolso", "data_pagamento", "arrendamento_sc_ha",
+    "perc_insumos_pct", "perc_colheita_pct", "pct_entrada_insumo_pct", "pct_parc2_pct", "data_parc2",
+    "pct_parc3_pct", "data_parc3", "mes_plantio", "mes_colheita",
+))
+
 
 def reset_soja_defaults() -> None:
     for k, v in SOJA_DEFAULTS.items():
@@ -120,6 +193,14 @@ def reset_soja_defaults() -> None:
     _rerun()
 
 
+def carregar_cenario_soja(nome: str, versao: int) -> None:
+    """Coloca na tela uma versão salva da biblioteca de cenários (como o reset, mas com ela)."""
+    for k, v in biblioteca_sessao(STATE_FILE, "soja_", SOJA_DEFAULTS).carregar(nome, versao).items():
+        st.session_state[k] = v
+    save_persisted_state()
+    _rerun()
+
+
 # ---------------- CONFIGURAÇÃO DA PÁGINA ----------------
 st.set_page_config(
     page_title="AgroExposure | Intelligence Pro",
@@ -130,361 +211,7 @@ st.set_page_config(
 load_persisted_state()
 
 # ---------------- DESIGN SYSTEM (AGRO PREMIUM) ----------------
-st.markdown("""
-<style>
-    /* Fonte (moderna e legível) */
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800;900&display=swap');
-
-    :root {
-        /* Base */
-        --bg: #F6F4EE;              /* off-white / bege */
-        --surface: #FFFFFF;         /* cards */
-        --surface-2: #FBFAF6;       /* variação suave */
-        --border: #E5E1D8;          /* bordas quentes */
-        --border-strong: #D6D0C3;   /* bordas + fortes */
-        --text: #1F2937;            /* cinza grafite */
-        --muted: #6B7280;           /* texto secundário */
-
-        /* Agro palette */
-        --primary: #1F5A3B;         /* verde profundo (soja) */
-        --primary-600: #164B2E;     /* verde mais escuro */
-        --primary-100: #E7F1EA;     /* verde muito claro */
-        --olive: #556B2F;           /* oliva / musgo */
-        --earth: #8B6B4E;           /* solo / terroso */
-        --sand: #F3EBDD;            /* bege claro */
-        --gold: #B08D57;            /* dourado fosco (sutil) */
-        --lime: #7AA65A;            /* verde-limão discreto */
-
-        /* Alerts (sem cores gritantes) */
-        --danger: #A94A44;          /* vermelho terroso */
-        --warning: #B07C2C;         /* âmbar fosco */
-
-        /* Shadow / radius */
-        --shadow: 0 14px 34px rgba(17, 24, 39, 0.10);
-        --shadow-sm: 0 10px 24px rgba(17, 24, 39, 0.08);
-        --radius: 16px;
-    }
-
-    /* APP */
-    .stApp {
-        background: linear-gradient(180deg, #F1EEE6 0%, var(--bg) 35%, var(--bg) 100%) !important;
-        color: var(--text) !important;
-        font-family: 'Inter', sans-serif !important;
-    }
-
-    /* Layout geral */
-    .block-container {
-        padding-top: 1.2rem !important;
-        padding-bottom: 5.5rem !important;
-        max-width: 1400px;
-    }
-
-    /* Tipografia */
-    h1, h2, h3, h4 { letter-spacing: -0.02em; }
-    h1 { font-weight: 900 !important; }
-    h2, h3 { font-weight: 800 !important; }
-
-    /* HERO */
-    .hero {
-        background: linear-gradient(180deg, rgba(255,255,255,0.96) 0%, rgba(251,250,246,0.96) 100%);
-        border: 1px solid var(--border);
-        border-radius: 22px;
-        box-shadow: var(--shadow);
-        padding: 20px 24px;
-        margin: 0 0 14px 0;
-    }
-    .hero-title {
-        font-size: 34px;
-        font-weight: 900;
-        letter-spacing: -0.04em;
-        color: var(--text);
-        margin: 0;
-        line-height: 1.1;
-    }
-    .hero-subtitle {
-        margin-top: 6px;
-        color: var(--muted);
-        font-size: 14px;
-        font-weight: 600;
-    }
-
-    /* SIDEBAR */
-    section[data-testid="stSidebar"] {
-        background: rgba(255,255,255,0.96) !important;
-        border-right: 1px solid var(--border);
-    }
-    section[data-testid="stSidebar"] .block-container {
-        padding-top: 1.0rem !important; /* sobe o menu */
-        padding-bottom: 2.2rem !important;
-    }
-
-    .sidebar-brand { text-align: center; margin-bottom: 12px; }
-    .sidebar-brand .title {
-        font-weight: 900;
-        letter-spacing: 0.12em;
-        color: var(--primary);
-        font-size: 13px;
-        text-transform: uppercase;
-        margin: 0;
-    }
-    .sidebar-brand .subtitle {
-        color: var(--muted);
-        font-size: 12px;
-        font-weight: 600;
-        margin-top: 4px;
-    }
-
-    hr { border-color: rgba(229,225,216,0.85) !important; }
-
-    /* INPUTS */
-    div[data-baseweb="input"],
-    div[data-baseweb="select"] > div {
-        background: var(--surface) !important;
-        border: 1px solid var(--border) !important;
-        border-radius: 12px !important;
-    }
-    div[data-baseweb="input"]:focus-within,
-    div[data-baseweb="select"] > div:focus-within {
-        border-color: rgba(122,166,90,0.65) !important;
-        box-shadow: 0 0 0 3px rgba(122,166,90,0.18) !important;
-    }
-
-    .stToggle label, .stSlider label, .stNumberInput label, .stSelectbox label {
-        color: var(--muted) !important;
-        font-weight: 700 !important;
-    }
-
-    /* BUTTONS */
-    .stButton > button {
-        border-radius: 12px !important;
-        font-weight: 800 !important;
-        padding: 0.55rem 1rem !important;
-        border: 1px solid var(--border) !important;
-    }
-    .stButton > button:active { transform: translateY(1px); }
-
-    button[kind="primary"] {
-        background: var(--primary) !important;
-        border: 1px solid var(--primary) !important;
-        color: #FFFFFF !important;
-        box-shadow: 0 10px 20px rgba(31,90,59,0.18) !important;
-    }
-    button[kind="primary"]:hover {
-        background: var(--primary-600) !important;
-        border-color: var(--primary-600) !important;
-    }
-
-    /* TABS (PILLS) */
-    div[data-baseweb="tab-list"] { gap: 8px !important; }
-    div[data-baseweb="tab-list"] button {
-        background: var(--surface) !important;
-        border: 1px solid var(--border) !important;
-        border-radius: 999px !important;
-        padding: 8px 14px !important;
-    }
-    div[data-baseweb="tab-list"] button[aria-selected="true"] {
-        background: var(--primary) !important;
-        border-color: var(--primary) !important;
-        color: #FFFFFF !important;
-        box-shadow: 0 10px 20px rgba(31,90,59,0.18) !important;
-    }
-    div[data-baseweb="tab-list"] button p { font-weight: 800 !important; }
-
-    /* KPI (METRIC) CARDS */
-    div[data-testid="metric-container"] {
-        background: #ffffff !important;
-        border: 1px solid var(--border-strong) !important;
-        border-radius: var(--radius) !important;
-        padding: 16px 16px !important;
-        box-shadow: var(--shadow-sm) !important;
-        min-height: 124px;
-        position: relative;
-        overflow: hidden;
-        transition: transform .12s ease, box-shadow .12s ease, border-color .12s ease;
-    }
-    div[data-testid="metric-container"]::before {
-        content: "";
-        position: absolute;
-        top: 0; left: 0; bottom: 0;
-        width: 6px;
-        background: linear-gradient(180deg, var(--primary) 0%, var(--olive) 65%, var(--gold) 100%);
-        opacity: 0.92;
-    }
-    div[data-testid="metric-container"]:hover {
-        transform: translateY(-1px);
-        border-color: rgba(31,90,59,0.22) !important;
-        box-shadow: var(--shadow) !important;
-    }
-    div[data-testid="metric-container"] label {
-        color: var(--muted) !important;
-        font-size: 12px !important;
-        font-weight: 800 !important;
-        letter-spacing: 0.01em;
-    }
-    div[data-testid="metric-container"] div[data-testid="stMetricValue"] {
-        color: var(--text) !important;
-        font-size: 26px !important;
-        font-weight: 900 !important;
-    }
-    div[data-testid="metric-container"] div[data-testid="stMetricDelta"] {
-        font-size: 12px !important;
-        font-weight: 800 !important;
-        background: rgba(243,235,221,0.75) !important;
-        border: 1px solid rgba(176,141,87,0.20) !important;
-        padding: 5px 10px !important;
-        border-radius: 999px !important;
-        width: fit-content !important;
-        margin-top: 10px !important;
-    }
-
-    /* DATAFRAMES */
-    div[data-testid="stDataFrame"] {
-        border-radius: var(--radius);
-        overflow: hidden;
-        border: 1px solid var(--border);
-        background: var(--surface);
-        box-shadow: var(--shadow-sm);
-    }
-    .dataframe thead th {
-        background: rgba(231,241,234,0.90) !important;
-        color: var(--primary-600) !important;
-        font-weight: 900 !important;
-        text-transform: uppercase;
-        font-size: 0.78rem !important;
-        padding: 12px 15px !important;
-        border: none !important;
-    }
-    .dataframe tbody td {
-        padding: 12px 15px !important;
-        border-bottom: 1px solid rgba(229,225,216,0.75) !important;
-        color: #334155 !important;
-        font-size: 0.92rem !important;
-    }
-    .dataframe tbody tr:nth-of-type(even) { background-color: rgba(251,250,246,0.90) !important; }
-    .dataframe tbody tr:hover { background-color: rgba(231,241,234,0.65) !important; }
-
-    /* EXPANDERS */
-    div[data-testid="stExpander"] {
-        background: var(--surface) !important;
-        border: 1px solid var(--border);
-        border-radius: var(--radius);
-        box-shadow: var(--shadow-sm);
-        overflow: hidden;
-    }
-    .streamlit-expanderHeader {
-        background: var(--surface) !important;
-        font-weight: 800 !important;
-        color: var(--text) !important;
-    }
-
-    /* COMPONENTES CUSTOM */
-    .prod-card {
-        background: linear-gradient(180deg, rgba(231,241,234,0.65) 0%, rgba(243,235,221,0.35) 100%);
-        border: 1px solid rgba(31,90,59,0.18);
-        border-radius: 14px;
-        padding: 12px 12px;
-        margin-top: 8px;
-    }
-    .prod-title {
-        font-weight: 900;
-        color: var(--primary-600);
-        font-size: 13px;
-        margin-bottom: 8px;
-        letter-spacing: 0.01em;
-    }
-    .prod-row {
-        display:flex;
-        justify-content:space-between;
-        align-items:center;
-        color: #243B33;
-        font-size: 13px;
-        font-weight: 700;
-    }
-    .prod-sep {
-        margin: 8px 0;
-        border-top: 1px solid rgba(31,90,59,0.18);
-    }
-
-    .advisor-card {
-        background: linear-gradient(180deg, rgba(255,255,255,0.98) 0%, rgba(251,250,246,0.98) 100%);
-        border: 1px solid var(--border-strong);
-        border-radius: var(--radius);
-        box-shadow: var(--shadow-sm);
-        padding: 14px 16px;
-        position: relative;
-        overflow: hidden;
-    }
-    .advisor-card::before {
-        content: "";
-        position: absolute;
-        left: 0;
-        top: 0;
-        bottom: 0;
-        width: 5px;
-        background: var(--primary);
-    }
-    .advisor-card.warning::before { background: var(--gold); }
-    .advisor-card.danger::before { background: var(--danger); }
-
-    .advisor-card .t {
-        font-weight: 900;
-        color: var(--text);
-        font-size: 12px;
-        letter-spacing: 0.08em;
-        text-transform: uppercase;
-    }
-    .advisor-card .big {
-        font-weight: 900;
-        font-size: 22px;
-        color: var(--text);
-        margin-top: 6px;
-    }
-    .advisor-card .p {
-        color: var(--muted);
-        font-weight: 700;
-        font-size: 12px;
-        margin-top: 6px;
-        line-height: 1.35;
-    }
-
-    /* FOOTER */
-    /* --- PLOTLY CHARTS (CARD PREMIUM) --- */
-    div[data-testid="stPlotlyChart"] {
-        background: var(--surface);
-        border: 1px solid var(--border);
-        border-radius: var(--radius);
-        box-shadow: var(--shadow-sm);
-        padding: 10px 10px 6px 10px;
-    }
-    div[data-testid="stPlotlyChart"] > div {
-        border-radius: calc(var(--radius) - 2px);
-        overflow: hidden;
-    }
-
-    .footer {
-        position: fixed;
-        left: 0;
-        bottom: 0;
-        width: 100%;
-        background: rgba(255,255,255,0.86);
-        backdrop-filter: blur(10px);
-        border-top: 1px solid var(--border);
-        color: var(--muted);
-        text-align: center;
-        padding: 10px 12px;
-        font-size: 11px;
-        z-index: 999;
-    }
-
-    /* PRINT */
-    @media print {
-        section[data-testid="stSidebar"], header, .footer, .stButton, button, .stDeployButton { display: none !important; }
-        body, .stApp { background-color: white !important; }
-        .block-container { max-width: 100% !important; padding: 0 !important; margin: 0 !important; }
-        div[data-testid="metric-container"] { border: 1px solid #000 !important; box-shadow: none !important; }
-    }
-</style>
-""", unsafe_allow_html=True)
+aplicar_estilo("agro_soja.css")
 # ---------------- FUNÇÕES UTILITÁRIAS DE FORMATAÇÃO ----------------
 def fmt_brl(valor):
     if isinstance(valor, (int, float)):
@@ -511,6 +238,17 @@ def fmt_pct(valor, dec=1):
     return valor
 
 
+# Versões por coluna (tabelas): mesma saída dos fmt_* acima, a coluna inteira de uma vez
+def fmt_brl_col(valores):
+    return formatar_br(valores, prefixo="R$ ", sinal="- ")
+
+def fmt_dec_col(valores, suffix="", dec=2):
+    return formatar_br(valores, dec=dec, sufixo=suffix)
+
+def fmt_pct_col(valores, dec=1):
+    return formatar_br(valores, dec=dec, sufixo="%")
+
+
 # ---------------- THEME (PLOTLY) ----------------
 C_PRIMARY = "#1F5A3B"
 C_OLIVE = "#556B2F"
@@ -551,234 +289,314 @@ with st.sidebar:
     if st.button("🔄 Resetar SOJA (padrões)", use_container_width=True, key="soja_reset_btn"):
         reset_soja_defaults()
     if st.button("💾 Salvar SOJA", use_container_width=True, key="soja_save_btn"):
-        save_persisted_state(prefixes=("soja_",))
+        save_persisted_state(prefixes=("soja_",), imediato=True)
         st.success("Dados da SOJA salvos ✅")
+
+    # --- Biblioteca de cenários (versões nomeadas) ---
+    biblioteca = biblioteca_sessao(STATE_FILE, "soja_", SOJA_DEFAULTS)
+    with st.expander("📚 Cenários salvos", expanded=False):
+        nome_cenario = st.text_input("Nome do cenário", key="_soja_cenario_nome", placeholder="ex.: safra base, quebra 20%").strip()
+        if st.button("💾 Salvar como nova versão", use_container_width=True, key="_soja_cenario_salvar_btn", disabled=not nome_cenario):
+            versao_salva = biblioteca.salvar(nome_cenario, st.session_state)
+            st.success(f"{nome_cenario} · v{versao_salva} salvo ✅")
+        indice_cenarios = biblioteca.indice()
+        # Rótulo "nome · vN" -> (nome, versão)
+        versoes_cenarios = {f"{n} · v{v}": (n, int(v)) for n, v in zip(indice_cenarios["nome"], indice_cenarios["versao"])}
+        if versoes_cenarios:
+            escolhido = st.selectbox("Versão", list(versoes_cenarios), key="_soja_cenario_sel")
+            if st.button("📂 Carregar na tela", use_container_width=True, key="_soja_cenario_carregar_btn"):
+                carregar_cenario_soja(*versoes_cenarios[escolhido])
+        else:
+            st.caption("Nenhum cenário salvo ainda.")
     st.markdown("---")
 
     st.markdown("### ⚙️ Parâmetros da Safra")
     
-    with st.container():
-        st.markdown("##### 🚨 Stress Test (Quebra)")
-        simular_quebra = st.toggle("Ativar Simulação de Quebra", key="soja_simular_quebra")
-        fator_quebra = 0.0
-        if simular_quebra:
-            perc_quebra = st.slider("% de Quebra da Safra", 0, 90, 20, step=5, key="soja_perc_quebra")
-            fator_quebra = perc_quebra / 100.0
-            st.warning(f"Simulando uma perda de {perc_quebra}% na produção.")
+    # Edição em lote: com o modo ativo, as entradas ficam num formulário e a página só recalcula
+    # (e salva) ao clicar em "Aplicar". Fora dele, dá para pedir espera antes do recálculo.
+    c_lote1, c_lote2 = st.columns([1.3, 1])
+    modo_lote = c_lote1.toggle("✏️ Editar em lote", key="soja_modo_lote", help="Acumula as alterações e recalcula uma única vez ao clicar em Aplicar.")
+    espera_s = 0.0
+    if not modo_lote:
+        espera_s = c_lote2.number_input("Espera (s)", 0.0, 10.0, 0.0, step=0.5, format="%.1f", key="soja_auto_aplicar_espera_s", help="Auto-aplicar: recalcula só após esse tempo sem novas edições (0 = imediato).")
+    painel_entradas = st.form("_soja_form_entradas", border=False) if modo_lote else st.container()
+
+    with painel_entradas:
+        with st.container():
+            st.markdown("##### 🚨 Stress Test (Quebra)")
+            simular_quebra = st.toggle("Ativar Simulação de Quebra", key="soja_simular_quebra")
+            fator_quebra = 0.0
+            if simular_quebra:
+                perc_quebra = st.slider("% de Quebra da Safra", 0, 90, 20, step=5, key="soja_perc_quebra")
+                fator_quebra = perc_quebra / 100.0
+                st.warning(f"Simulando uma perda de {perc_quebra}% na produção.")
 
-    st.markdown("---")
+        st.markdown("---")
 
-    # 1. Produção
-    st.markdown("<p style='color:var(--primary); font-weight:bold; margin-top:10px; font-size:1.1rem;'>1. Produção e Custo</p>", unsafe_allow_html=True)
+        # 1. Produção
+        st.markdown("<p style='color:var(--primary); font-weight:bold; margin-top:10px; font-size:1.1rem;'>1. Produção e Custo</p>", unsafe_allow_html=True)
     
-    col_a1, col_a2 = st.columns(2)
-    with col_a1:
-        area_propria = st.number_input("Área Própria (ha)", value=1000, step=0, key="soja_area_propria_ha") 
-    with col_a2:
-        area_arrendada = st.number_input("Área Arrendada (ha)", value=500, step=0, key="soja_area_arrendada_ha") 
+        col_a1, col_a2 = st.columns(2)
+        with col_a1:
+            area_propria = st.number_input("Área Própria (ha)", value=1000, step=0, key="soja_area_propria_ha") 
+        with col_a2:
+            area_arrendada = st.number_input("Área Arrendada (ha)", value=500, step=0, key="soja_area_arrendada_ha") 
     
-    area_total = area_propria + area_arrendada
-    if area_total == 0: area_total = 1 
+        area_total = area_propria + area_arrendada
+        if area_total == 0: area_total = 1 
     
-    perc_propria = (area_propria / area_total) * 100
-    perc_arrendada = (area_arrendada / area_total) * 100
+        perc_propria = (area_propria / area_total) * 100
+        perc_arrendada = (area_arrendada / area_total) * 100
     
-    st.markdown(f"<div style='margin-bottom:10px;'>📍 Total: <b>{fmt_dec(area_total, ' ha', dec=0)}</b> <span style='color:#78909C; font-size:12px;'>({perc_propria:.0f}% Próp. | {perc_arrendada:.0f}% Arr.)</span></div>", unsafe_allow_html=True)
+        st.markdown(f"<div style='margin-bottom:10px;'>📍 Total: <b>{fmt_dec(area_total, ' ha', dec=0)}</b> <span style='color:#78909C; font-size:12px;'>({perc_propria:.0f}% Próp. | {perc_arrendada:.0f}% Arr.)</span></div>", unsafe_allow_html=True)
 
-    produtividade_base = st.number_input("Produtividade Est. (sc/ha)", value=60.0, step=1.0, format="%.1f", key="soja_produtividade_sc_ha")
+        produtividade_base = st.number_input("Produtividade Est. (sc/ha)", value=60.0, step=1.0, format="%.1f", key="soja_produtividade_sc_ha")
     
-    if simular_quebra:
-        produtividade = produtividade_base * (1 - fator_quebra)
-        st.markdown(f"**Produtividade Efetiva:** <span style='color:#A94A44; font-weight:bold;'>{fmt_dec(produtividade, ' sc/ha', dec=1)}</span>", unsafe_allow_html=True)
-    else:
-        produtividade = produtividade_base
+        if simular_quebra:
+            produtividade = produtividade_base * (1 - fator_quebra)
+            st.markdown(f"**Produtividade Efetiva:** <span style='color:#A94A44; font-weight:bold;'>{fmt_dec(produtividade, ' sc/ha', dec=1)}</span>", unsafe_allow_html=True)
+        else:
+            produtividade = produtividade_base
         
-    vol_propria = area_propria * produtividade
-    vol_arrendada = area_arrendada * produtividade
-    producao_total = area_total * produtividade
-
-    st.markdown(f"""
-    <div class='prod-card'>
-        <div class='prod-title'>📍 Produção Total</div>
-        <div class='prod-row'><span>🌱 Própria</span> <b>{fmt_dec(vol_propria, ' sc')}</b></div>
-        <div class='prod-row'><span>🌱 Arrendada</span> <b>{fmt_dec(vol_arrendada, ' sc')}</b></div>
-        <div class='prod-sep'></div>
-        <div class='prod-row' style='font-size:14px;'><span>🚜 <b>Total</b></span> <b>{fmt_dec(producao_total, ' sc')}</b></div>
-    </div>
-    """, unsafe_allow_html=True)
+        vol_propria = area_propria * produtividade
+        vol_arrendada = area_arrendada * produtividade
+        producao_total = area_total * produtividade
+
+        st.markdown(f"""
+        <div class='prod-card'>
+            <div class='prod-title'>📍 Produção Total</div>
+            <div class='prod-row'><span>🌱 Própria</span> <b>{fmt_dec(vol_propria, ' sc')}</b></div>
+            <div class='prod-row'><span>🌱 Arrendada</span> <b>{fmt_dec(vol_arrendada, ' sc')}</b></div>
+            <div class='prod-sep'></div>
+            <div class='prod-row' style='font-size:14px;'><span>🚜 <b>Total</b></span> <b>{fmt_dec(producao_total, ' sc')}</b></div>
+        </div>
+        """, unsafe_allow_html=True)
     
-    custo_ha_operacional = st.number_input("Custo Operacional (R$/ha)", value=6000.0, step=100.0, format="%.2f", key="soja_custo_operacional_ha")
+        custo_ha_operacional = st.number_input("Custo Operacional (R$/ha)", value=6000.0, step=100.0, format="%.2f", key="soja_custo_operacional_ha")
     
-    # 2. Comercialização
-    st.markdown("<hr style='margin: 15px 0; border-color:#E0E0E0;'><p style='color:var(--primary); font-weight:bold; font-size:1.1rem;'>2. Comercialização</p>", unsafe_allow_html=True)
-    perc_comercializado = st.slider("% Já Travado (Hedge)", 0, 100, 25, key="soja_perc_travado_pct") 
-    vol_hedge = producao_total * (perc_comercializado/100)
-    st.caption(f"📦 Volume Travado: {fmt_dec(vol_hedge, ' sc')}")
-    preco_medio_venda = st.number_input("Preço Médio Travado (R$/sc)", value=115.0, step=0.5, format="%.2f", key="soja_preco_travado") 
+        # 2. Comercialização
+        st.markdown("<hr style='margin: 15px 0; border-color:#E0E0E0;'><p style='color:var(--primary); font-weight:bold; font-size:1.1rem;'>2. Comercialização</p>", unsafe_allow_html=True)
+        perc_comercializado = st.slider("% Já Travado (Hedge)", 0, 100, 25, key="soja_perc_travado_pct") 
+        vol_hedge = producao_total * (perc_comercializado/100)
+        st.caption(f"📦 Volume Travado: {fmt_dec(vol_hedge, ' sc')}")
+        preco_medio_venda = st.number_input("Preço Médio Travado (R$/sc)", value=115.0, step=0.5, format="%.2f", key="soja_preco_travado") 
     
-    # 3. Mercado
-    st.markdown("<hr style='margin: 15px 0; border-color:#E0E0E0;'><p style='color:var(--primary); font-weight:bold; font-size:1.1rem;'>3. Metas e Mercado</p>", unsafe_allow_html=True)
-    preco_mercado = st.number_input("Preço de Mercado (atual) R$/sc", value=105.0, step=0.5, format="%.2f", key="soja_preco_mercado") 
-    margem_desejada = st.slider("Margem Alvo (%)", 0, 50, 20, key="soja_margem_alvo_pct")
-
-    # 4. Custeio
-    st.markdown("<hr style='margin: 15px 0; border-color:#E0E0E0;'><p style='color:var(--primary); font-weight:bold; font-size:1.1rem;'>4. Financiamento & Terra</p>", unsafe_allow_html=True)
-    perc_financiado = st.number_input("% Custeio Financiado", value=30.0, step=5.0, key="soja_perc_financiado_pct") 
-    taxa_juros_ano = st.number_input("Taxa de Juros ao Ano (%)", value=12.0, step=0.5, format="%.2f", key="soja_taxa_juros_aa_pct")
-    col_d1, col_d2 = st.columns(2)
-    data_tomada = col_d1.date_input("Desembolso", value=date(2025, 8, 30), key="soja_data_desembolso")
-    data_pagamento = col_d2.date_input("Pagamento", value=date(2026, 4, 30), key="soja_data_pagamento")
+        # 3. Mercado
+        st.markdown("<hr style='margin: 15px 0; border-color:#E0E0E0;'><p style='color:var(--primary); font-weight:bold; font-size:1.1rem;'>3. Metas e Mercado</p>", unsafe_allow_html=True)
+        preco_mercado = st.number_input("Preço de Mercado (atual) R$/sc", value=105.0, step=0.5, format="%.2f", key="soja_preco_mercado") 
+        margem_desejada = st.slider("Margem Alvo (%)", 0, 50, 20, key="soja_margem_alvo_pct")
+
+        # 4. Custeio
+        st.markdown("<hr style='margin: 15px 0; border-color:#E0E0E0;'><p style='color:var(--primary); font-weight:bold; font-size:1.1rem;'>4. Financiamento & Terra</p>", unsafe_allow_html=True)
+        perc_financiado = st.number_input("% Custeio Financiado", value=30.0, step=5.0, key="soja_perc_financiado_pct") 
+        taxa_juros_ano = st.number_input("Taxa de Juros ao Ano (%)", value=12.0, step=0.5, format="%.2f", key="soja_taxa_juros_aa_pct")
+        col_d1, col_d2 = st.columns(2)
+        data_tomada = col_d1.date_input("Desembolso", value=date(2025, 8, 30), key="soja_data_desembolso")
+        data_pagamento = col_d2.date_input("Pagamento", value=date(2026, 4, 30), key="soja_data_pagamento")
     
-    st.markdown("<div style='margin-top:10px; font-weight:600; font-size:13px; color:#455A64;'>Custo do Arrendamento</div>", unsafe_allow_html=True)
-    arrendamento_sc_ha = st.number_input("Pagamento (sc/ha)", value=15.0, step=0.5, format="%.2f", key="soja_arrendamento_sc_ha") 
-    st.caption(f"Ref. Área Arrendada: {fmt_dec(area_arrendada, ' ha', dec=0)}")
+        st.markdown("<div style='margin-top:10px; font-weight:600; font-size:13px; color:#455A64;'>Custo do Arrendamento</div>", unsafe_allow_html=True)
+        arrendamento_sc_ha = st.number_input("Pagamento (sc/ha)", value=15.0, step=0.5, format="%.2f", key="soja_arrendamento_sc_ha") 
+        st.caption(f"Ref. Área Arrendada: {fmt_dec(area_arrendada, ' ha', dec=0)}")
 
-    # 5. PERFIL DE PAGAMENTOS
-    st.markdown("<hr style='margin: 15px 0; border-color:#E0E0E0;'><p style='color:var(--primary); font-weight:bold; font-size:1.1rem;'>5. Perfil de Pagamentos</p>", unsafe_allow_html=True)
-    st.info("Distribuição do Custo Operacional (R$):")
+        # 5. PERFIL DE PAGAMENTOS
+        st.markdown("<hr style='margin: 15px 0; border-color:#E0E0E0;'><p style='color:var(--primary); font-weight:bold; font-size:1.1rem;'>5. Perfil de Pagamentos</p>", unsafe_allow_html=True)
+        st.info("Distribuição do Custo Operacional (R$):")
     
-    perc_insumos = st.slider("1. Insumos (Sementes/Quím/Fert)", 0, 100, 60, key="soja_perc_insumos_pct")
-    val_insumos_ha = custo_ha_operacional * (perc_insumos/100)
-    st.markdown(f"<div style='text-align:right; font-size:12px; color:#546E7A; margin-top:-10px; margin-bottom:10px;'><b>{perc_insumos}% = {fmt_brl(val_insumos_ha)}/ha</b></div>", unsafe_allow_html=True)
+        perc_insumos = st.slider("1. Insumos (Sementes/Quím/Fert)", 0, 100, 60, key="soja_perc_insumos_pct")
+        val_insumos_ha = custo_ha_operacional * (perc_insumos/100)
+        st.markdown(f"<div style='text-align:right; font-size:12px; color:#546E7A; margin-top:-10px; margin-bottom:10px;'><b>{perc_insumos}% = {fmt_brl(val_insumos_ha)}/ha</b></div>", unsafe_allow_html=True)
     
-    max_colheita = 100 - perc_insumos
-    perc_colheita = st.slider("2. Colheita & Frete", 0, max_colheita, min(20, max_colheita), key="soja_perc_colheita_pct")
-    val_colheita_ha = custo_ha_operacional * (perc_colheita/100)
-    st.markdown(f"<div style='text-align:right; font-size:12px; color:#546E7A; margin-top:-10px;'><b>{perc_colheita}% = {fmt_brl(val_colheita_ha)}/ha</b></div>", unsafe_allow_html=True)
+        max_colheita = 100 - perc_insumos
+        perc_colheita = st.slider("2. Colheita & Frete", 0, max_colheita, min(20, max_colheita), key="soja_perc_colheita_pct")
+        val_colheita_ha = custo_ha_operacional * (perc_colheita/100)
+        st.markdown(f"<div style='text-align:right; font-size:12px; color:#546E7A; margin-top:-10px;'><b>{perc_colheita}% = {fmt_brl(val_colheita_ha)}/ha</b></div>", unsafe_allow_html=True)
     
-    perc_manutencao = 100 - perc_insumos - perc_colheita
-    val_manut_ha = custo_ha_operacional * (perc_manutencao/100)
+        perc_manutencao = 100 - perc_insumos - perc_colheita
+        val_manut_ha = custo_ha_operacional * (perc_manutencao/100)
     
-    st.markdown(f"""
-    <div style='background-color:#E1F5FE; padding:12px; border-radius:8px; border:1px solid #B3E5FC; margin-top:15px;'>
-        <small style='color:#0277BD; font-weight:bold; text-transform:uppercase;'>3. Manutenção (Saldo)</small><br>
-        <span style='font-size:18px; font-weight:800; color:#01579B;'>{perc_manutencao}%</span> <span style='font-size:12px; color:#0277BD;'>restantes</span><br>
-        <div style='margin-top:4px; font-size:13px; color:#0277BD;'><b>= {fmt_brl(val_manut_ha)}/ha</b></div>
-    </div>
-    """, unsafe_allow_html=True)
+        st.markdown(f"""
+        <div style='background-color:#E1F5FE; padding:12px; border-radius:8px; border:1px solid #B3E5FC; margin-top:15px;'>
+            <small style='color:#0277BD; font-weight:bold; text-transform:uppercase;'>3. Manutenção (Saldo)</small><br>
+            <span style='font-size:18px; font-weight:800; color:#01579B;'>{perc_manutencao}%</span> <span style='font-size:12px; color:#0277BD;'>restantes</span><br>
+            <div style='margin-top:4px; font-size:13px; color:#0277BD;'><b>= {fmt_brl(val_manut_ha)}/ha</b></div>
+        </div>
+        """, unsafe_allow_html=True)
     
-    with st.expander("📅 Escalonar Pagto Insumos", expanded=True):
-        st.write("Do valor dos Insumos (Item 1), como pagar a parte **não financiada**?")
-        c_p1, c_p2 = st.columns(2)
-        pct_entrada_insumo = c_p1.number_input("% Entrada", 0, 100, 50, step=10, key="soja_pct_entrada_insumo_pct") 
-        st.markdown("---")
-        c_p2a, c_p2b = st.columns([1, 1.5])
-        pct_parc2 = c_p2a.number_input("% P2", 0, 100, 25, step=5, key="soja_pct_parc2_pct") 
-        data_parc2 = c_p2b.date_input("Data P2", value=date(2026, 4, 30), key="soja_data_parc2") 
-        c_p3a, c_p3b = st.columns([1, 1.5])
-        pct_parc3 = c_p3a.number_input("% P3", 0, 100, 25, step=5, key="soja_pct_parc3_pct") 
-        data_parc3 = c_p3b.date_input("Data P3", value=date(2026, 5, 30), key="soja_data_parc3") 
+        with st.expander("📅 Escalonar Pagto Insumos", expanded=True):
+            st.write("Do valor dos Insumos (Item 1), como pagar a parte **não financiada**?")
+            c_p1, c_p2 = st.columns(2)
+            pct_entrada_insumo = c_p1.number_input("% Entrada", 0, 100, 50, step=10, key="soja_pct_entrada_insumo_pct") 
+            st.markdown("---")
+            c_p2a, c_p2b = st.columns([1, 1.5])
+            pct_parc2 = c_p2a.number_input("% P2", 0, 100, 25, step=5, key="soja_pct_parc2_pct") 
+            data_parc2 = c_p2b.date_input("Data P2", value=date(2026, 4, 30), key="soja_data_parc2") 
+            c_p3a, c_p3b = st.columns([1, 1.5])
+            pct_parc3 = c_p3a.number_input("% P3", 0, 100, 25, step=5, key="soja_pct_parc3_pct") 
+            data_parc3 = c_p3b.date_input("Data P3", value=date(2026, 5, 30), key="soja_data_parc3") 
         
-        if (pct_entrada_insumo + pct_parc2 + pct_parc3) != 100:
-            st.error("A soma das parcelas deve ser 100%")
+            if (pct_entrada_insumo + pct_parc2 + pct_parc3) != 100:
+                st.error("A soma das parcelas deve ser 100%")
 
-    c_op1, c_op2 = st.columns(2)
-    mes_plantio = c_op1.selectbox("Plantio", [9, 10, 11, 12], index=0, format_func=lambda x: f"Mês {x}", key="soja_mes_plantio") 
-    mes_colheita = c_op2.selectbox("Colheita", [1, 2, 3, 4], index=3, format_func=lambda x: f"Mês {x}", key="soja_mes_colheita") 
+        c_op1, c_op2 = st.columns(2)
+        mes_plantio = c_op1.selectbox("Plantio", [9, 10, 11, 12], index=0, format_func=lambda x: f"Mês {x}", key="soja_mes_plantio") 
+        mes_colheita = c_op2.selectbox("Colheita", [1, 2, 3, 4], index=3, format_func=lambda x: f"Mês {x}", key="soja_mes_colheita") 
+
+        if modo_lote:
+            st.form_submit_button("✅ Aplicar", type="primary", use_container_width=True, key="_soja_aplicar_btn")
+
+entradas_sidebar = (
+    simular_quebra, fator_quebra, area_propria, area_arrendada, produtividade, custo_ha_operacional,
+    perc_comercializado, preco_medio_venda, preco_mercado, margem_desejada, perc_financiado, taxa_juros_ano,
+    data_tomada, data_pagamento, arrendamento_sc_ha, perc_insumos, perc_colheita, pct_entrada_insumo,
+    pct_parc2, data_parc2, pct_parc3, data_parc3, mes_plantio, mes_colheita,
+)
+# O plano da barra lateral (campos de SOJA_DEFAULTS) acompanha as entradas: na espera, ambos ficam no último aplicado
+plano_barra = {k: st.session_state[k] for k in CAMPOS_BARRA if k in st.session_state}
+(entradas_sidebar, plano_barra), aguardando_pausa = _aguardar_pausa((entradas_sidebar, plano_barra), espera_s, "soja")
+(
+    simular_quebra, fator_quebra, area_propria, area_arrendada, produtividade, custo_ha_operacional,
+    perc_comercializado, preco_medio_venda, preco_mercado, margem_desejada, perc_financiado, taxa_juros_ano,
+    data_tomada, data_pagamento, arrendamento_sc_ha, perc_insumos, perc_colheita, pct_entrada_insumo,
+    pct_parc2, data_parc2, pct_parc3, data_parc3, mes_plantio, mes_colheita,
+) = entradas_sidebar
+# Derivados da barra lateral usados no painel (recalculados sobre as entradas aplicadas)
+area_total = (area_propria + area_arrendada) or 1
+producao_total = area_total * produtividade
 
 # ==============================================================================
 # ==============================================================================
 # 2. CÁLCULOS PRINCIPAIS (AUDITORIA: CONSISTÊNCIA ECONÔMICA + EVITAR DUPLA CONTAGEM)
 # ==============================================================================
+# Toda a economia vive em agro_engine.calcular_kpis (vetorizado, importável, mesmas regras).
+# Aqui avaliamos apenas o cenário da tela e expomos os KPIs com os nomes usados no painel.
+entradas_cenario = dict(
+    area_propria=area_propria,
+    area_arrendada=area_arrendada,
+    produtividade=produtividade,
+    custo_ha_operacional=custo_ha_operacional,
+    perc_comercializado=perc_comercializado,
+    preco_medio_venda=preco_medio_venda,
+    preco_mercado=preco_mercado,
+    margem_desejada=margem_desejada,
+    perc_financiado=perc_financiado,
+    taxa_juros_ano=taxa_juros_ano,
+    arrendamento_sc_ha=arrendamento_sc_ha,
+)
+kpis = calcular_cenario(data_tomada=data_tomada, data_pagamento=data_pagamento, **entradas_cenario)
 
 # A. Físico e Receita
-# Arrendamento é em SACAS (produto) -> reduz o volume comercializável
-vol_arrendamento_sacas = area_arrendada * arrendamento_sc_ha
-producao_liquida_sacas = producao_total - vol_arrendamento_sacas
+vol_arrendamento_sacas = kpis["vol_arrendamento_sacas"]
+producao_liquida_sacas = kpis["producao_liquida_sacas"]
+receita_hedge = kpis["receita_hedge"]
+qtd_aberta_fisica = kpis["qtd_aberta_fisica"]
+receita_spot = kpis["receita_spot"]
+receita_bruta_total = kpis["receita_bruta_total"]
+preco_medio_blended = kpis["preco_medio_blended"]
 
-# Hedge / Venda antecipada (percentual sobre a produção TOTAL projetada)
-qtd_vendida = producao_total * (perc_comercializado / 100)
-receita_hedge = qtd_vendida * preco_medio_venda
+# B. Custos (Caixa) + Terra (Econômico)
+custo_operacional_total = kpis["custo_operacional_total"]
+valor_base_financiamento = kpis["valor_base_financiamento"]
+dias_financiamento = kpis["dias_financiamento"]
+custo_financeiro_juros = kpis["custo_financeiro_juros"]
+custo_arrendamento_reais_hoje = kpis["custo_arrendamento_reais_hoje"]
+custo_total_caixa = kpis["custo_total_caixa"]
+
+# C. Resultados / D. ROI e Barter
+lucro_operacional = kpis["lucro_operacional"]
+lucro_liquido = kpis["lucro_liquido"]
+margem_liquida_perc = kpis["margem_liquida_perc"]
+roi_perc = kpis["roi_perc"]
+roi_caixa_perc = kpis["roi_caixa_perc"]
+barter_operacional_sc_ha = kpis["barter_operacional_sc_ha"]
+barter_total_sc_ha = kpis["barter_total_sc_ha"]
+
+# Preços-chave (breakeven e meta) + KPIs por hectare
+preco_breakeven_saldo = kpis["preco_breakeven_saldo"]
+breakeven_sc_ha_conservador = kpis["breakeven_sc_ha_conservador"]
+breakeven_sc_ha_plano = kpis["breakeven_sc_ha_plano"]
+preco_alvo_restante_meta = kpis["preco_alvo_restante_meta"]
+custo_sc_liquida = kpis["custo_sc_liquida"]
+custo_sc_total = kpis["custo_sc_total"]
+custo_ha_area_arrendada = kpis["custo_ha_area_arrendada"]
+custo_ha_area_propria = kpis["custo_ha_area_propria"]
+juros_por_saca_reais = kpis["juros_por_saca_reais"]
+juros_sc_ha = kpis["juros_sc_ha"]
 
-# Volume físico disponível para venda (já líquido de arrendamento)
-qtd_aberta_fisica = max(0, producao_liquida_sacas - qtd_vendida)
+# ==============================================================================
+# SEÇÕES PESADAS EM SEGUNDO PLANO
+# Fluxo de caixa, curvas de sensibilidade, metas e mapa de calor dependem só da sidebar (e das
+# faixas do mapa, já no session_state): começam agora no pool de threads, e KPIs + gauge
+# aparecem sem esperar por eles. Cada seção abaixo aguarda só o próprio resultado.
+base_sens = {**entradas_cenario, "dias_financiamento": dias_financiamento}
+cronograma_caixa = dict(
+    perc_insumos=perc_insumos, perc_colheita=perc_colheita,
+    pct_entrada_insumo=pct_entrada_insumo, pct_parc2=pct_parc2, data_parc2=data_parc2,
+    pct_parc3=pct_parc3, data_parc3=data_parc3,
+    data_tomada=data_tomada, data_pagamento=data_pagamento,
+    mes_plantio=mes_plantio, mes_colheita=mes_colheita,
+)
+
+def _livro_caixa(receita_saldo, meses_ate_venda_spot=2):
+    # Livro de eventos datados (insumos, manutenção, colheita, custeio, hedge, spot)
+    return eventos_safra(
+        custo_operacional_total=custo_operacional_total,
+        valor_base_financiamento=valor_base_financiamento,
+        custo_financeiro_juros=custo_financeiro_juros,
+        perc_insumos=perc_insumos,
+        perc_colheita=perc_colheita,
+        pct_entrada_insumo=pct_entrada_insumo,
+        pct_parc2=pct_parc2,
+        data_parc2=data_parc2,
+        pct_parc3=pct_parc3,
+        data_parc3=data_parc3,
+        data_tomada=data_tomada,
+        data_pagamento=data_pagamento,
+        mes_plantio=mes_plantio,
+        mes_colheita=mes_colheita,
+        receita_hedge=receita_hedge,
+        receita_spot=receita_saldo,
+        meses_ate_venda_spot=meses_ate_venda_spot,
+    )
 
-# Receita Spot (saldo vendido ao preço atual)
-receita_spot = qtd_aberta_fisica * preco_mercado
-receita_bruta_total = receita_hedge + receita_spot
+def _fluxo_caixa():
+    # Fluxo mensal; o horizonte cobre todos os eventos da safra (mínimo de 12 meses a partir do primeiro evento).
+    fluxo = consolidar_fluxo(_livro_caixa(receita_spot), resolucao="M", periodos_min=12)
+    return fluxo, tabela_necessidade_venda(fluxo, preco_mercado, producao_total)
 
-# Preço Médio Ponderado (BLENDED) sobre o volume COMERCIALIZÁVEL
-preco_medio_blended = receita_bruta_total / producao_liquida_sacas if producao_liquida_sacas > 0 else 0
+def _deficit_por_mes_venda(precos_saldo):
+    """Déficit total de caixa (soma dos gaps mensais) com o saldo vendido j meses após a
+    colheita ao preço `precos_saldo[j]` — um cenário do livro de eventos por mês de venda."""
+    precos_saldo = np.asarray(precos_saldo, dtype=float)
+    ledger = _livro_caixa(qtd_aberta_fisica * precos_saldo, np.arange(precos_saldo.size))
+    fluxo = consolidar_fluxo(ledger, resolucao="M")
+    return necessidade_venda(fluxo["entradas"], fluxo["saidas"], preco_mercado, producao_total)["deficit"].sum(axis=1)
+
+# Faixas padrão do mapa de calor (zoom)
+FAIXAS_HEAT = dict(prod_min=40.0, prod_max=90.0, prod_passo=5.0, preco_min=90.0, preco_max=185.0, preco_passo=5.0)
+
+def _eixos_heat(prod_min, prod_max, prod_passo, preco_min, preco_max, preco_passo):
+    """Eixos (produtividade, preço) do mapa; faixa inválida ou grande demais -> grade padrão + aviso."""
+    try:
+        prod_range, preco_range = grade((prod_min, prod_max, prod_passo), (preco_min, preco_max, preco_passo))
+        return prod_range, preco_range, None
+    except ValueError as e:
+        return eixo(40, 90, 5), eixo(90, 185, 5), f"{e} Usando a grade padrão."
+
+def _mapa_heat(prod_range, preco_range):
+    # Grade inteira por broadcasting (custo fixo = Op + Juros por ha; arrendamento em sacas a cada preço)
+    return mapa_margem_ha(
+        prod_range,
+        preco_range,
+        custo_fixo_ha=(custo_operacional_total + custo_financeiro_juros) / area_total,
+        arr_sc_ha_medio=(area_arrendada * arrendamento_sc_ha) / area_total,
+    )
+
+faixas_heat = {k: st.session_state.get(f"soja_heat_{k}", v) for k, v in FAIXAS_HEAT.items()}
+fut_fluxo = antecipar(_fluxo_caixa)
+fut_sens = antecipar(curvas_sensibilidade, base_sens, variacao=0.25, pontos=500)
+fut_metas = antecipar(resolver_metas, base_sens, cronograma=cronograma_caixa)
+fut_heat = antecipar(_mapa_heat, *_eixos_heat(**faixas_heat)[:2])
 
-# B. Custos (Caixa) + Terra (Econômico)
-custo_operacional_total = area_total * custo_ha_operacional
-valor_base_financiamento = custo_operacional_total * (perc_financiado / 100)
-dias_financiamento = max(0, (data_pagamento - data_tomada).days)
-custo_financeiro_juros = valor_base_financiamento * ((taxa_juros_ano / 100) / 365) * dias_financiamento
-
-# Custo da Terra (arrendamento) em R$ (referência de valor econômico)
-# IMPORTANTE (AUDITORIA): Como o arrendamento é pago em SACAS, ele já reduz o volume de venda.
-# Portanto, NÃO deve ser subtraído novamente no lucro de vendas (senão dupla contagem).
-custo_arrendamento_reais_hoje = vol_arrendamento_sacas * preco_mercado
-
-# Total CAIXA (o que precisa ser coberto por vendas): Operação + Juros
-custo_total_caixa = custo_operacional_total + custo_financeiro_juros
-
-# Total ECONÔMICO (inclui Terra ao preço de referência) - útil para indicadores de custo/barter
-custo_total_safra = custo_total_caixa + custo_arrendamento_reais_hoje
-
-# C. Resultados (consistentes)
-# Lucro operacional e fluxo de caixa operacional já são consistentes (arrendamento em sacas está no volume líquido).
-lucro_operacional = receita_bruta_total - custo_operacional_total
-fluxo_caixa_operacional = lucro_operacional - custo_financeiro_juros
-
-# LUCRO LÍQUIDO (AUDITORIA): usa apenas custos de CAIXA porque o arrendamento já foi descontado no volume vendido
-lucro_liquido = receita_bruta_total - custo_total_caixa
-
-# Margem líquida sobre a RECEITA DE VENDA
-margem_liquida_perc = (lucro_liquido / receita_bruta_total) * 100 if receita_bruta_total > 0 else 0
-
-# D. ROI E BARTER
-# ROI (incluindo Terra como capital econômico)
-roi_perc = (lucro_liquido / custo_total_safra) * 100 if custo_total_safra > 0 else 0
-# ROI (somente caixa)
-roi_caixa_perc = (lucro_liquido / custo_total_caixa) * 100 if custo_total_caixa > 0 else 0
-
-barter_operacional_sc_ha = custo_ha_operacional / preco_mercado if preco_mercado > 0 else 0
-barter_total_sc_ha = (custo_total_safra / area_total) / preco_mercado if preco_mercado > 0 else 0
-
-# -------------------------------------------------------------------------
-# PREÇOS-CHAVE (BREAKEVEN E META)
-# -------------------------------------------------------------------------
-# 1) Breakeven do SALDO (0x0): preço mínimo no saldo para pagar custos de CAIXA (Op + Juros)
-saldo_a_cobrir = custo_total_caixa - receita_hedge
-vol_disponivel_pgto = producao_liquida_sacas - qtd_vendida
-preco_breakeven_saldo = saldo_a_cobrir / vol_disponivel_pgto if vol_disponivel_pgto > 0 else 0
-
-# 2) Breakeven de PRODUTIVIDADE (duas visões)
-# 2.1 Conservador: considera 100% do saldo ao preço de mercado (sem prêmio do hedge)
-custo_op_fin_sc = custo_total_caixa / preco_mercado if preco_mercado > 0 else 0
-breakeven_sc_total_conserv = custo_op_fin_sc + vol_arrendamento_sacas
-breakeven_sc_ha_conservador = breakeven_sc_total_conserv / area_total if area_total > 0 else 0
-
-# 2.2 Plano atual (considera prêmio do hedge no preço médio da produção total)
-preco_medio_total_producao = ((perc_comercializado/100) * preco_medio_venda) + ((1 - (perc_comercializado/100)) * preco_mercado)
-breakeven_sc_ha_plano = (custo_total_caixa + custo_arrendamento_reais_hoje) / (area_total * preco_medio_total_producao) if (area_total > 0 and preco_medio_total_producao > 0) else 0
-
-# Mantém a variável original como a versão mais realista (plano)
-breakeven_sc_ha = breakeven_sc_ha_plano
-
-# 3) Preço Alvo do SALDO (para atingir margem desejada sobre receita de venda)
-# Receita alvo: R * (1 - m) = custos_caixa => R = custos_caixa / (1 - m)
-receita_alvo_total = custo_total_caixa / (1 - (margem_desejada/100)) if margem_desejada < 100 else custo_total_caixa * 1.5
-receita_faltante_para_meta = receita_alvo_total - receita_hedge
-preco_alvo_restante_meta = receita_faltante_para_meta / qtd_aberta_fisica if qtd_aberta_fisica > 0 else 0
-
-# Indicadores auxiliares
-margem_seguranca_sc_ha = produtividade - breakeven_sc_ha
-
-# Custo por saca (CAIXA) no volume comercializável
-custo_sc_liquida = custo_total_caixa / producao_liquida_sacas if producao_liquida_sacas > 0 else 0
-# Custo por saca (ECONÔMICO) incluindo terra ao preço de referência
-custo_sc_total = custo_total_safra / producao_liquida_sacas if producao_liquida_sacas > 0 else 0
-
-# KPIs por hectare
-custo_ha_medio_op_fin = (custo_total_caixa) / area_total if area_total > 0 else 0
-custo_ha_area_arrendada = custo_ha_medio_op_fin + (arrendamento_sc_ha * preco_mercado)
-custo_ha_area_propria = custo_ha_medio_op_fin
-
-juros_por_saca_reais = custo_financeiro_juros / producao_total if producao_total > 0 else 0
-juros_sc_ha = (custo_financeiro_juros / area_total) / preco_medio_blended if (area_total > 0 and preco_medio_blended > 0) else 0
 # 3. INTERFACE DASHBOARD (LAYOUT PREMIUM)
 # ==============================================================================
 st.markdown("""
@@ -814,56 +632,66 @@ with c5:
     st.metric("🎯 Preço Alvo (Saldo)", fmt_brl(preco_alvo_restante_meta), delta=msg_meta, delta_color=cor_meta, help=f"Por quanto vender as sacas restantes para garantir {margem_desejada}% de Margem Líquida Final.")
 
 # GAUGE DE META (VELOCÍMETRO)
-fig_gauge = go.Figure(go.Indicator(
-    mode = "gauge+number+delta",
-    value = margem_liquida_perc,
-    domain = {'x': [0, 1], 'y': [0, 1]},
-    title = {'text': "<b>Status da Meta de Margem</b>", 'font': {'size': 18, 'color': '#263238', 'family': 'Inter'}},
-    delta = {'reference': margem_desejada, 'increasing': {'color': "#1F5A3B"}},
-    gauge = {
-        'axis': {'range': [None, max(50, margem_desejada + 20)], 'tickwidth': 1, 'tickcolor': "#37474F"},
-        'bar': {'color': "#1F5A3B"},
-        'bgcolor': "white",
-        'borderwidth': 2,
-        'bordercolor': "#CFD8DC",
-        'steps': [
-            {'range': [0, 0], 'color': '#FFEBEE'},
-            {'range': [0, margem_desejada], 'color': '#E8F5E9'}],
-        'threshold': {
-            'line': {'color': "#B08D57", 'width': 4},
-            'thickness': 0.75,
-            'value': margem_desejada}
-    }
-))
-fig_gauge.update_layout(height=200, margin=dict(l=20,r=20,t=40,b=20), paper_bgcolor="rgba(0,0,0,0)", font={'family': "Inter"})
+def _fig_gauge(margem, meta):
+    fig = go.Figure(go.Indicator(
+        mode = "gauge+number+delta",
+        value = margem,
+        domain = {'x': [0, 1], 'y': [0, 1]},
+        title = {'text': "<b>Status da Meta de Margem</b>", 'font': {'size': 18, 'color': '#263238', 'family': 'Inter'}},
+        delta = {'reference': meta, 'increasing': {'color': "#1F5A3B"}},
+        gauge = {
+            'axis': {'range': [None, max(50, meta + 20)], 'tickwidth': 1, 'tickcolor': "#37474F"},
+            'bar': {'color': "#1F5A3B"},
+            'bgcolor': "white",
+            'borderwidth': 2,
+            'bordercolor': "#CFD8DC",
+            'steps': [
+                {'range': [0, 0], 'color': '#FFEBEE'},
+                {'range': [0, meta], 'color': '#E8F5E9'}],
+            'threshold': {
+                'line': {'color': "#B08D57", 'width': 4},
+                'thickness': 0.75,
+                'value': meta}
+        }
+    ))
+    fig.update_layout(height=200, margin=dict(l=20,r=20,t=40,b=20), paper_bgcolor="rgba(0,0,0,0)", font={'family': "Inter"})
+    return fig
+
+fig_gauge = figura("soja_gauge", dict(margem=margem_liquida_perc, meta=margem_desejada), _fig_gauge)
 st.plotly_chart(fig_gauge, use_container_width=True)
 
 st.markdown("---")
 
 # --- SIMULADOR WHAT-IF ---
-with st.expander("⚖️ Simulador de Negociação (What-If)", expanded=False):
-    st.markdown("#### Simule impacto na Margem Global")
-    col_s1, col_s2, col_s3 = st.columns([1,1,2])
-    with col_s1: st.info(f"Travado: {perc_comercializado}% a {fmt_brl(preco_medio_venda)}")
-    with col_s2:
-        n_perc = st.number_input("Nova Venda (%)", 0, 100, 10, key="soja_nova_venda_pct")
-        n_preco = st.number_input("Preço (R$)", value=preco_mercado, format="%.2f", key="soja_nova_venda_preco")
-    with col_s3:
-        # AUDITORIA: Arrendamento é pago em SACAS e já reduz o volume líquido.
-        # Portanto, não entra novamente como custo em R$ neste What-If (evita dupla contagem).
-        q_nova_bruta = producao_total * (n_perc/100)
-        q_nova = min(qtd_aberta_fisica, max(0, q_nova_bruta))
-
-        # Receita simulada: hedge fixo + parte do saldo ao novo preço + restante ao preço atual
-        rec_sim = receita_hedge + (q_nova * n_preco) + ((qtd_aberta_fisica - q_nova) * preco_mercado)
-
-        # Custos simulados (CAIXA)
-        custo_tot_sim = custo_total_caixa
-
-        lucro_sim = rec_sim - custo_tot_sim
-        margem_sim = (lucro_sim/rec_sim)*100 if rec_sim > 0 else 0
-        delta_m = margem_sim - margem_liquida_perc
-        st.metric("Nova Margem Estimada", fmt_pct(margem_sim, 2), delta=(('+' if delta_m>=0 else '') + fmt_pct(delta_m, 2)))
+# Fragmento: alterar a nova venda reexecuta só este painel, não a página inteira
+@_fragment()
+def painel_what_if():
+    with st.expander("⚖️ Simulador de Negociação (What-If)", expanded=False):
+        st.markdown("#### Simule impacto na Margem Global")
+        col_s1, col_s2, col_s3 = st.columns([1,1,2])
+        with col_s1: st.info(f"Travado: {perc_comercializado}% a {fmt_brl(preco_medio_venda)}")
+        with col_s2:
+            n_perc = st.number_input("Nova Venda (%)", 0, 100, 10, key="soja_nova_venda_pct")
+            n_preco = st.number_input("Preço (R$)", value=preco_mercado, format="%.2f", key="soja_nova_venda_preco")
+        with col_s3:
+            # AUDITORIA: Arrendamento é pago em SACAS e já reduz o volume líquido.
+            # Portanto, não entra novamente como custo em R$ neste What-If (evita dupla contagem).
+            q_nova_bruta = producao_total * (n_perc/100)
+            q_nova = min(qtd_aberta_fisica, max(0, q_nova_bruta))
+
+            # Receita simulada: hedge fixo + parte do saldo ao novo preço + restante ao preço atual
+            rec_sim = receita_hedge + (q_nova * n_preco) + ((qtd_aberta_fisica - q_nova) * preco_mercado)
+
+            # Custos simulados (CAIXA)
+            custo_tot_sim = custo_total_caixa
+
+            lucro_sim = rec_sim - custo_tot_sim
+            margem_sim = (lucro_sim/rec_sim)*100 if rec_sim > 0 else 0
+            delta_m = margem_sim - margem_liquida_perc
+            st.metric("Nova Margem Estimada", fmt_pct(margem_sim, 2), delta=(('+' if delta_m>=0 else '') + fmt_pct(delta_m, 2)))
+    save_persisted_state()
+
+painel_what_if()
 
 st.markdown("---")
 
@@ -874,163 +702,236 @@ with col_left:
     st.subheader("🎯 Matriz de Risco")
     exposicao_perc = 100 - perc_comercializado
     
-    # Ajuste dinâmico do eixo Y para garantir visualização
-    y_min = min(-20, margem_liquida_perc - 15)
-    y_max = max(60, margem_liquida_perc + 15)
-
-    fig_rr = go.Figure()
-    # Zonas
-    fig_rr.add_shape(type="rect", x0=50, x1=100, y0=y_min, y1=margem_desejada, fillcolor="rgba(169, 74, 68, 0.10)", line_width=0)
-    fig_rr.add_shape(type="rect", x0=50, x1=100, y0=margem_desejada, y1=y_max, fillcolor="rgba(176, 141, 87, 0.12)", line_width=0)
-    fig_rr.add_shape(type="rect", x0=0, x1=50, y0=y_min, y1=margem_desejada, fillcolor="rgba(243, 235, 221, 0.25)", line_width=0)
-    fig_rr.add_shape(type="rect", x0=0, x1=50, y0=margem_desejada, y1=y_max, fillcolor="rgba(31, 90, 59, 0.10)", line_width=0)
-    
-    # CORREÇÃO VISUAL: Texto preto e negrito, posição ajustada
-    fig_rr.add_trace(go.Scatter(
-        x=[exposicao_perc], 
-        y=[margem_liquida_perc], 
-        mode='markers+text',
-        marker=dict(size=25, color='#1F5A3B', line=dict(width=3, color='white')), 
-        text=[f"<b>VOCÊ<br>{fmt_pct(margem_liquida_perc, 1)}</b>"], 
-        textposition="top center", 
-        textfont=dict(family="Inter", size=14, color="black") # Cor preta forçada
-    ))
-    
-    fig_rr.update_layout(xaxis_title="Exposição Spot (%)", yaxis_title="Margem Líquida (%)",
-        xaxis=dict(range=[0, 100]), yaxis=dict(range=[y_min, y_max]), height=350, template="plotly_white", margin=dict(l=20, r=20, t=20, b=20), font={'family': 'Inter'})
-    apply_plotly_theme(fig_rr, height=350)
+    def _fig_rr(exposicao, margem, meta):
+        # Ajuste dinâmico do eixo Y para garantir visualização
+        y_min = min(-20, margem - 15)
+        y_max = max(60, margem + 15)
+
+        fig = go.Figure()
+        # Zonas
+        fig.add_shape(type="rect", x0=50, x1=100, y0=y_min, y1=meta, fillcolor="rgba(169, 74, 68, 0.10)", line_width=0)
+        fig.add_shape(type="rect", x0=50, x1=100, y0=meta, y1=y_max, fillcolor="rgba(176, 141, 87, 0.12)", line_width=0)
+        fig.add_shape(type="rect", x0=0, x1=50, y0=y_min, y1=meta, fillcolor="rgba(243, 235, 221, 0.25)", line_width=0)
+        fig.add_shape(type="rect", x0=0, x1=50, y0=meta, y1=y_max, fillcolor="rgba(31, 90, 59, 0.10)", line_width=0)
+
+        # CORREÇÃO VISUAL: Texto preto e negrito, posição ajustada
+        fig.add_trace(go.Scatter(
+            x=[exposicao],
+            y=[margem],
+            mode='markers+text',
+            marker=dict(size=25, color='#1F5A3B', line=dict(width=3, color='white')),
+            text=[f"<b>VOCÊ<br>{fmt_pct(margem, 1)}</b>"],
+            textposition="top center",
+            textfont=dict(family="Inter", size=14, color="black") # Cor preta forçada
+        ))
+
+        fig.update_layout(xaxis_title="Exposição Spot (%)", yaxis_title="Margem Líquida (%)",
+            xaxis=dict(range=[0, 100]), yaxis=dict(range=[y_min, y_max]), height=350, template="plotly_white", margin=dict(l=20, r=20, t=20, b=20), font={'family': 'Inter'})
+        return apply_plotly_theme(fig, height=350)
+
+    fig_rr = figura("soja_rr", dict(exposicao=exposicao_perc, margem=margem_liquida_perc, meta=margem_desejada), _fig_rr)
     st.plotly_chart(fig_rr, use_container_width=True)
 
 with col_right:
-    st.subheader("📉 Sensibilidade (Preço)")
-    range_precos = np.linspace(preco_mercado * 0.75, preco_mercado * 1.25, 20)
-    margens_sim = []
-    
-    for p in range_precos:
-        # Receita Sim: Hedge + (Físico Aberto * p)
-        rec_sim = receita_hedge + (qtd_aberta_fisica * p)
-
-        # AUDITORIA: custos de caixa (arrendamento já está no volume líquido)
-        custo_tot_sim = custo_total_caixa
-        
-        m = ((rec_sim - custo_tot_sim) / rec_sim) * 100
-        margens_sim.append(m)
-        
-    fig_sens = go.Figure()
-    fig_sens.add_trace(go.Scatter(x=range_precos, y=margens_sim, mode='lines', line=dict(color='#1F5A3B', width=4), name='Margem'))
-    fig_sens.add_hline(y=margem_desejada, line_dash="dot", line_color="#B08D57", annotation_text="Meta")
-    
-    # Linha vertical no Breakeven de Saldo (Onde a curva cruza zero ou margem mínima)
-    fig_sens.add_vline(x=preco_breakeven_saldo, line_dash="dash", line_color="#8B6B4E", annotation_text=f"0x0: {fmt_brl(preco_breakeven_saldo)}")
-    
-    fig_sens.update_layout(xaxis_title="Preço Soja (R$)", yaxis_title="Margem Líquida (%)", height=350, template="plotly_white", font={'family': 'Inter'})
-    apply_plotly_theme(fig_sens, height=350)
+    st.subheader("📉 Sensibilidade (Drivers)")
+    sens_driver = st.selectbox("Driver", list(DRIVERS), format_func=lambda d: DRIVERS[d], key="soja_sens_driver", label_visibility="collapsed")
+    # Todos os drivers numa única passada vetorizada do motor (±25%, 500 pontos)
+    curvas_sens = aguardar(fut_sens)
+    range_driver, margens_sim = curvas_sens[sens_driver]
+
+    if sens_driver == "preco_mercado":
+        # Linha vertical no Breakeven de Saldo (Onde a curva cruza zero ou margem mínima)
+        linha_x, rotulo_x, titulo_x = preco_breakeven_saldo, f"0x0: {fmt_brl(preco_breakeven_saldo)}", "Preço Soja (R$)"
+    else:
+        linha_x, rotulo_x, titulo_x = base_sens[sens_driver], "Atual", DRIVERS[sens_driver]
+
+    def _fig_sens(x, y, meta, linha_x, rotulo_x, titulo_x):
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=x, y=y, mode='lines', line=dict(color='#1F5A3B', width=4), name='Margem'))
+        fig.add_hline(y=meta, line_dash="dot", line_color="#B08D57", annotation_text="Meta")
+        fig.add_vline(x=linha_x, line_dash="dash", line_color="#8B6B4E", annotation_text=rotulo_x)
+        fig.update_layout(xaxis_title=titulo_x, yaxis_title="Margem Líquida (%)", height=350, template="plotly_white", font={'family': 'Inter'})
+        return apply_plotly_theme(fig, height=350)
+
+    def _atualizar_sens(spec, x, y, meta, linha_x, rotulo_x, titulo_x):
+        spec["data"][0].update(x=x, y=y)
+        linha_meta, linha_vert = spec["layout"]["shapes"]
+        nota_meta, nota_vert = spec["layout"]["annotations"]
+        linha_meta.update(y0=meta, y1=meta)
+        nota_meta["y"] = meta
+        linha_vert.update(x0=linha_x, x1=linha_x)
+        nota_vert.update(x=linha_x, text=rotulo_x)
+        spec["layout"]["xaxis"]["title"]["text"] = titulo_x
+
+    fig_sens = figura(
+        "soja_sens",
+        dict(x=range_driver, y=margens_sim, meta=margem_desejada, linha_x=linha_x, rotulo_x=rotulo_x, titulo_x=titulo_x),
+        _fig_sens, _atualizar_sens,
+    )
     st.plotly_chart(fig_sens, use_container_width=True)
 
+# --- TORNADO (RANKING DE DRIVERS) ---
+with st.expander("🌪️ Tornado: quais drivers mais movem a margem?", expanded=False):
+    var_tornado = st.slider("Choque (±%)", 1, 50, 10, key="soja_tornado_var_pct")
+    ranking = tornado(base_sens, variacao=var_tornado / 100)[::-1]  # maior impacto no topo
+    nomes_t = [DRIVERS[d] for d, _, _ in ranking]
+    fig_tornado = go.Figure()
+    fig_tornado.add_trace(go.Bar(y=nomes_t, x=[lo - margem_liquida_perc for _, lo, _ in ranking], base=margem_liquida_perc, orientation='h', name=f"-{var_tornado}%", marker_color='rgba(169, 74, 68, 0.62)'))
+    fig_tornado.add_trace(go.Bar(y=nomes_t, x=[hi - margem_liquida_perc for _, _, hi in ranking], base=margem_liquida_perc, orientation='h', name=f"+{var_tornado}%", marker_color='rgba(31, 90, 59, 0.62)'))
+    fig_tornado.add_vline(x=margem_liquida_perc, line_dash="dot", line_color="#1F2937", annotation_text=f"Atual: {fmt_pct(margem_liquida_perc, 1)}")
+    fig_tornado.update_layout(barmode='overlay', xaxis_title="Margem Líquida (%)", height=360)
+    apply_plotly_theme(fig_tornado, height=360)
+    st.plotly_chart(fig_tornado, use_container_width=True)
+
+# --- METAS (SOLVER INVERSO) ---
+with st.expander("🧮 Metas: qual valor de cada driver atinge o objetivo?", expanded=False):
+    st.caption("Cada driver é ajustado sozinho (demais fixos). \"Caixa coberto\" = saldo acumulado ≥ 0 em todos os meses a partir da colheita. \"—\" = meta inatingível ajustando só esse driver.")
+    metas = aguardar(fut_metas)
+    fmt_var = {
+        "preco_mercado": fmt_brl,
+        "perc_comercializado": lambda v: fmt_pct(v, 1),
+        "produtividade": lambda v: fmt_dec(v, " sc/ha", dec=1),
+        "taxa_juros_ano": lambda v: fmt_pct(v, 2),
+    }
+    fmt_meta = lambda v, var: "—" if not np.isfinite(v) else fmt_var[var](float(v))
+    df_metas = pd.DataFrame([
+        {
+            "Driver": VARIAVEIS[v],
+            "Atual": fmt_var[v](base_sens[v]),
+            "Lucro Zero (0x0)": fmt_meta(m["lucro_zero"], v),
+            f"Margem {fmt_pct(margem_desejada, 0)}": fmt_meta(m["margem_meta"], v),
+            "Caixa Coberto": fmt_meta(m["caixa_coberto"], v),
+        }
+        for v, m in metas.items()
+    ])
+    st.dataframe(df_metas, use_container_width=True, hide_index=True)
+
+# --- COMPARAR CENÁRIOS (BIBLIOTECA) ---
+with st.expander("📚 Comparar Cenários Salvos", expanded=False):
+    if not versoes_cenarios:
+        st.caption("Salve versões em 📚 Cenários salvos (barra lateral) para compará-las aqui.")
+    else:
+        opcoes_cmp = ["Tela atual", *versoes_cenarios]
+        col_ca, col_cb = st.columns(2)
+        cen_a = col_ca.selectbox("Cenário A", opcoes_cmp, index=1, key="_soja_cenario_cmp_a")
+        cen_b = col_cb.selectbox("Cenário B", opcoes_cmp, index=0, key="_soja_cenario_cmp_b")
+        # Tela atual = o plano que a página está mostrando: barra lateral aplicada + demais campos de SOJA_DEFAULTS
+        tela_atual = {**{k: st.session_state[k] for k in SOJA_DEFAULTS if k in st.session_state}, **plano_barra}
+        estado_cmp = lambda rot: tela_atual if rot not in versoes_cenarios else biblioteca.carregar(*versoes_cenarios[rot])
+        estado_a, estado_b = estado_cmp(cen_a), estado_cmp(cen_b)
+
+        # KPIs dos dois lados numa única chamada do motor
+        df_cmp = diferencas_kpis(estado_a, estado_b, "soja_", SOJA_DEFAULTS)
+        fmt_unidade = {"brl": fmt_brl, "pct": lambda v: fmt_pct(v, 1), "sc": lambda v: fmt_dec(v, " sc", dec=0)}
+        cols_cmp = ["A", "B", "Δ (B − A)"]
+        for c in cols_cmp:
+            df_cmp[c] = [fmt_unidade[u](v) for u, v in zip(df_cmp["unidade"], df_cmp[c])]
+        df_cmp = df_cmp.drop(columns="unidade")
+        exibir_tabela(
+            df_cmp, mascara_sinais(df_cmp, ["Δ (B − A)"]),
+            alinhar_direita=cols_cmp, use_container_width=True, hide_index=True,
+        )
+
+        df_campos_cmp = diferencas_campos(estado_a, estado_b, "soja_", SOJA_DEFAULTS)
+        if df_campos_cmp.empty:
+            st.info("Os dois cenários têm os mesmos valores em todos os campos.")
+        else:
+            st.caption(f"{len(df_campos_cmp)} campo(s) diferente(s):")
+            st.dataframe(df_campos_cmp, use_container_width=True, hide_index=True)
+
 # --- FLUXO DE CAIXA INTELIGENTE (CORRIGIDO 50/25/25) ---
 st.markdown("### 💸 Fluxo de Caixa Projetado (Liquidez)")
 with st.expander("Ver Gráfico e Detalhes de Entradas/Saídas", expanded=True):
-    meses_fluxo = pd.date_range(start=date(2025, 9, 1), periods=12, freq='M')
-    nomes_meses = [d.strftime("%b/%y") for d in meses_fluxo]
-    entradas = np.zeros(12)
-    saidas = np.zeros(12) 
-    
-    # Custos Insumos
-    custo_insumos_total = custo_operacional_total * (perc_insumos/100)
-    # Parte financiada
-    valor_insumos_financiado = min(custo_insumos_total, valor_base_financiamento)
-    # Parte do bolso
-    custo_insumos_proprio = custo_insumos_total - valor_insumos_financiado
+    fluxo, df_nec = aguardar(fut_fluxo)
+    nomes_meses = list(pd.to_datetime(fluxo["periodos"]).strftime("%b/%y"))
+    entradas = fluxo["entradas"][0]
+    saidas = fluxo["saidas"][0]
+    saldo_acumulado = fluxo["saldo_acumulado"][0]
     
-    # Saldo do financiamento disponível para outras coisas
-    saldo_financiamento = max(0, valor_base_financiamento - custo_insumos_total)
-    
-    # 1. Entrada Insumos (Mês Plantio ou Imediato) - Setembro/25 (Index 0)
-    idx_plantio = 0 # Setembro
-    saidas[idx_plantio] += custo_insumos_proprio * (pct_entrada_insumo/100)
-    
-    # 2. Parcelas Insumos (30/04 e 30/05)
-    for i, m in enumerate(meses_fluxo):
-        if m.month == data_parc2.month and m.year == data_parc2.year:
-            saidas[i] += custo_insumos_proprio * (pct_parc2/100)
-        if m.month == data_parc3.month and m.year == data_parc3.year:
-            saidas[i] += custo_insumos_proprio * (pct_parc3/100)
-
-    # Manutenção (Diluído)
-    custo_manut_total = custo_operacional_total * (perc_manutencao/100)
-    idx_colheita_arr = (mes_colheita - 9) if mes_colheita >= 9 else (mes_colheita + 3)
-    duracao = max(1, idx_colheita_arr - idx_plantio + 1)
-    mensal_manut = custo_manut_total / duracao
-    for i in range(idx_plantio, idx_plantio + duracao):
-        if 0 <= i < 12:
-            pago_banco = min(mensal_manut, saldo_financiamento)
-            pago_bolso = mensal_manut - pago_banco
-            saidas[i] += pago_bolso
-            saldo_financiamento -= pago_banco
-
-    # Colheita
-    custo_colheita_total = custo_operacional_total * (perc_colheita/100)
-    if 0 <= idx_colheita_arr < 12:
-        pago_banco = min(custo_colheita_total, saldo_financiamento)
-        pago_bolso = custo_colheita_total - pago_banco
-        saidas[idx_colheita_arr] += pago_bolso
-        saldo_financiamento -= pago_banco
-
-    # Pagamento Financiamento (Principal + Juros)
-    if valor_base_financiamento > 0:
-        mes_pg = data_pagamento.month
-        ano_pg = data_pagamento.year
-        for i, m in enumerate(meses_fluxo):
-            if m.month == mes_pg and m.year == ano_pg:
-                saidas[i] += (valor_base_financiamento + custo_financeiro_juros)
-                break
-    # Arrendamento (AUDITORIA): pago em SACAS (produto) -> já reduz a produção líquida e a receita de venda.
-    # Para fluxo de CAIXA, não há desembolso em R$ aqui (evita dupla contagem).
-    # Entradas
-    # Hedge (Liquidação Financeira)
-    if 0 <= idx_colheita_arr < 12:
-        entradas[idx_colheita_arr] += receita_hedge
-    
-    # Spot (Venda do Saldo)
-    idx_spot = min(11, idx_colheita_arr + 2)
-    entradas[idx_spot] += receita_spot
-
-    saldo_acumulado = np.cumsum(entradas - saidas)
-    
-    fig_fluxo = go.Figure()
-    fig_fluxo.add_trace(go.Bar(x=nomes_meses, y=entradas, name='Entradas (Vendas)', marker_color='rgba(31, 90, 59, 0.62)'))
-    fig_fluxo.add_trace(go.Bar(x=nomes_meses, y=-saidas, name='Saídas (Desembolso)', marker_color='rgba(169, 74, 68, 0.62)'))
-    fig_fluxo.add_trace(go.Scatter(x=nomes_meses, y=saldo_acumulado, name='Saldo Acumulado', mode='lines+markers', line=dict(color='#1F2937', width=3)))
-    fig_fluxo.add_shape(type="line", x0=-0.5, x1=11.5, y0=0, y1=0, line=dict(color="black", width=1))
-    fig_fluxo.update_layout(title="Fluxo de Caixa (Considerando Insumos 50/25/25)", barmode='relative', height=400, template="plotly_white", font={'family': 'Inter'})
-    apply_plotly_theme(fig_fluxo, height=400)
+    def _fig_fluxo(meses, entradas, saidas, saldo):
+        fig = go.Figure()
+        fig.add_trace(go.Bar(x=meses, y=entradas, name='Entradas (Vendas)', marker_color='rgba(31, 90, 59, 0.62)'))
+        fig.add_trace(go.Bar(x=meses, y=-saidas, name='Saídas (Desembolso)', marker_color='rgba(169, 74, 68, 0.62)'))
+        fig.add_trace(go.Scatter(x=meses, y=saldo, name='Saldo Acumulado', mode='lines+markers', line=dict(color='#1F2937', width=3)))
+        fig.add_shape(type="line", x0=-0.5, x1=len(meses) - 0.5, y0=0, y1=0, line=dict(color="black", width=1))
+        fig.update_layout(title="Fluxo de Caixa (Considerando Insumos 50/25/25)", barmode='relative', height=400, template="plotly_white", font={'family': 'Inter'})
+        return apply_plotly_theme(fig, height=400)
+
+    def _atualizar_fluxo(spec, meses, entradas, saidas, saldo):
+        for trace, y in zip(spec["data"], (entradas, -saidas, saldo)):
+            trace.update(x=meses, y=y)
+        spec["layout"]["shapes"][0]["x1"] = len(meses) - 0.5
+
+    fig_fluxo = figura(
+        "soja_fluxo", dict(meses=nomes_meses, entradas=entradas, saidas=saidas, saldo=saldo_acumulado),
+        _fig_fluxo, _atualizar_fluxo,
+    )
     st.plotly_chart(fig_fluxo, use_container_width=True)
     
     st.markdown("#### 📉 Necessidade de Venda para Cobertura de Caixa")
-    nec_venda = []
-    total_deficit = 0
-    total_sacas_nec = 0
-    
-    for i in range(12):
-        gap = saidas[i] - entradas[i]
-        if gap > 0:
-            sc_nec = gap / preco_mercado
-            perc = (sc_nec / producao_total) * 100 if producao_total > 0 else 0
-            nec_venda.append([nomes_meses[i], fmt_brl(gap), fmt_dec(sc_nec, " sc", dec=0), fmt_pct(perc, 1)])
-            total_deficit += gap
-            total_sacas_nec += sc_nec
-    
-    if nec_venda:
-        total_perc_safra = (total_sacas_nec / producao_total * 100) if producao_total > 0 else 0
-        nec_venda.append(["TOTAL ACUMULADO", fmt_brl(total_deficit), fmt_dec(total_sacas_nec, " sc", dec=0), fmt_pct(total_perc_safra, 1)])
-        df_nec = pd.DataFrame(nec_venda, columns=["Mês", "Déficit a Cobrir", "Sacas Necessárias", "% da Safra"])
-        def style_total_row(row):
-            if row.name == len(df_nec) - 1: return ['font-weight: bold; background-color: #E8F5E9; color: var(--primary); border-top: 2px solid var(--primary)'] * len(row)
-            return [''] * len(row)
-        st.dataframe(df_nec.style.apply(style_total_row, axis=1), use_container_width=True, hide_index=True)
+
+    if not df_nec.empty:
+        df_nec["Déficit a Cobrir"] = fmt_brl_col(df_nec["Déficit a Cobrir"])
+        df_nec["Sacas Necessárias"] = fmt_dec_col(df_nec["Sacas Necessárias"], " sc", dec=0)
+        df_nec["% da Safra"] = fmt_pct_col(df_nec["% da Safra"], 1)
+        # Linha TOTAL (a última) destacada
+        exibir_tabela(
+            df_nec, mascara_linhas(df_nec, [len(df_nec) - 1]),
+            alinhar_direita=["Déficit a Cobrir", "Sacas Necessárias", "% da Safra"],
+            use_container_width=True, hide_index=True,
+        )
     else:
         st.info("✅ Fluxo de caixa coberto. Nenhuma venda forçada necessária.")
 
+# --- OTIMIZADOR DE HEDGE (FRONTEIRA EXPOSIÇÃO × MARGEM) ---
+# Sazonalidade Histórica (Base Paranaguá) — usada aqui na agenda de venda do saldo e na aba 📅
+indices_sazonais = [1.03, 1.01, 0.95, 0.94, 0.97, 0.99, 1.01, 1.03, 1.05, 1.07, 1.08, 1.05]
+with st.expander("🛡️ Otimizador de Hedge (Exposição × Margem)", expanded=False):
+    n_preco = st.session_state.get("soja_nova_venda_preco", preco_mercado)  # preço da nova venda (What-If)
+    st.caption(f"Busca quanto vender agora a {fmt_brl(n_preco)} (preço do What-If) e em que mês vender o saldo (sazonalidade − armazenagem), maximizando a margem esperada com o déficit de caixa coberto pela nova venda e exposição spot limitada. O déficit é recalculado para cada mês de venda do saldo; preços e risco partem da data do desembolso do plano.")
+    col_h1, col_h2, col_h3 = st.columns(3)
+    exp_max = col_h1.slider("Exposição Spot Máx. (%)", 0, 100, 50, key="soja_hedge_exposicao_max_pct")
+    vol_hedge = col_h2.slider("Volatilidade do Preço (% a.a.)", 5, 60, 20, key="soja_hedge_vol_pct")
+    custo_arm_hedge = col_h3.number_input("Armazenagem (R$/sc/mês)", 0.0, 5.0, 0.80, format="%.2f", key="soja_hedge_custo_arm")
+
+    colheita_mes = primeiro_mes_apos(primeiro_mes_apos(data_tomada, mes_plantio), mes_colheita)[0]
+    agenda = agenda_precos(preco_mercado, indices_sazonais, data_tomada, colheita_mes)
+    precos_saldo = agenda["preco"] - custo_arm_hedge * np.arange(len(agenda["preco"]))
+    deficit_por_mes = _deficit_por_mes_venda(precos_saldo)
+    otm = otimizar_hedge(
+        base_sens, n_preco, agenda, deficit_caixa=deficit_por_mes, exposicao_max=exp_max,
+        vol_preco=vol_hedge / 100, custo_arm_mes=custo_arm_hedge,
+    )
+    front = otm["fronteira"]
+    mes_label = lambda m: pd.Timestamp(m).strftime("%b/%y")
+
+    if otm["melhor"] is None:
+        st.warning(f"Nenhum plano atende às restrições: cobrir o déficit de caixa (de {fmt_brl(float(deficit_por_mes.min()))} a {fmt_brl(float(deficit_por_mes.max()))}, conforme o mês de venda do saldo) com a nova venda e ficar com no máximo {exp_max}% exposto.")
+    else:
+        i, j = otm["melhor"]
+        h_otimo = otm["hedge_extra"][i]
+        ho1, ho2, ho3, ho4 = st.columns(4)
+        ho1.metric("Nova Venda Recomendada", fmt_pct(float(h_otimo), 1), delta=fmt_dec(float(h_otimo / 100 * producao_total), " sc", dec=0), delta_color="off")
+        ho2.metric("Vender o Saldo em", mes_label(agenda["mes"][j]), delta=fmt_brl(float(precos_saldo[j])) + " líq.", delta_color="off")
+        ho3.metric("Margem Esperada", fmt_pct(float(otm["margem"][i, j]), 1), delta=fmt_pct(float(otm["margem"][i, j] - margem_liquida_perc), 1))
+        ho4.metric("Margem no P5 do Preço", fmt_pct(float(otm["margem_p5"][i, j]), 1))
+        st.caption(f"Déficit de caixa com o saldo vendido em {mes_label(agenda['mes'][j])}: {fmt_brl(float(deficit_por_mes[j]))} (coberto pela nova venda).")
+
+    fig_front = go.Figure()
+    fig_front.add_vrect(x0=exp_max, x1=100, fillcolor="rgba(169, 74, 68, 0.08)", line_width=0)
+    fig_front.add_trace(go.Scatter(x=front["exposicao"], y=front["margem_p5"], mode='lines', name='Margem no P5', line=dict(color=C_DANGER, width=2, dash='dot')))
+    fig_front.add_trace(go.Scatter(x=front["exposicao"], y=front["margem"], mode='lines', name='Margem Esperada', line=dict(color=C_PRIMARY, width=3)))
+    fig_front.add_trace(go.Scatter(
+        x=front["exposicao"][front["eficiente"] & front["viavel"]], y=front["margem"][front["eficiente"] & front["viavel"]],
+        mode='markers', name='Fronteira Eficiente (viável)', marker=dict(size=6, color=C_GOLD),
+    ))
+    fig_front.add_trace(go.Scatter(x=[100 - perc_comercializado], y=[margem_liquida_perc], mode='markers+text', name='Atual', text=["Atual"], textposition="top center", marker=dict(size=12, color=C_GRAPHITE)))
+    if otm["melhor"] is not None:
+        fig_front.add_trace(go.Scatter(x=[otm["exposicao"][i]], y=[otm["margem"][i, j]], mode='markers+text', name='Ótimo', text=["Ótimo"], textposition="top center", marker=dict(size=14, color=C_GOLD, symbol='star')))
+    fig_front.update_layout(xaxis_title="Exposição Spot (%)", yaxis_title="Margem Líquida (%)", height=380)
+    apply_plotly_theme(fig_front, height=380)
+    st.plotly_chart(fig_front, use_container_width=True)
+
 st.markdown("---")
 
 # --- DRE GERENCIAL DETALHADO ---
@@ -1067,31 +968,19 @@ with st.expander("Ver Análise Vertical Detalhada (R$/ha e sc/ha)", expanded=Tru
 
     df_dre_pro = pd.DataFrame(dados_dre_pro)
     df_dre_pro = pd.DataFrame(dados_dre_pro)
-    
-    def style_rows_dre(v):
-        """Cores na DRE (apenas apresentação):
-        - Negativos: vermelho terroso
-        - Positivos: verde escuro
-        - Percentuais: verde escuro (se positivo)
-        """
-        if isinstance(v, (int, float)):
-            if v < 0: return 'color: #A94A44; font-weight: 800;'
-            if v > 0: return 'color: #164B2E; font-weight: 800;'
-            return ''
-        if isinstance(v, str):
-            vv = v.strip()
-            if vv.startswith('-'):
-                return 'color: #A94A44; font-weight: 800;'
-            if '%' in vv:
-                return 'color: #164B2E; font-weight: 900;'
-        return ''
-
-    st.dataframe(
-        df_dre_pro.style.format({
-            "Valor Total (R$)": lambda x: fmt_brl(x) if isinstance(x, (int, float)) else x,
-            "Indicador (R$/ha)": lambda x: fmt_brl(x) if isinstance(x, (int, float)) else x,
-            "Eqv. (sc/ha)": lambda x: fmt_dec(x, dec=1) if isinstance(x, (int, float)) else x
-        }).applymap(style_rows_dre, subset=["Valor Total (R$)", "Indicador (R$/ha)", "Eqv. (sc/ha)"]),
+
+    # Cores na DRE (apenas apresentação), calculadas dos valores brutos numa passada:
+    # negativos vermelho terroso, positivos verde escuro, percentuais verde escuro
+    cols_dre = ["Valor Total (R$)", "Indicador (R$/ha)", "Eqv. (sc/ha)"]
+    estilos_dre = mascara_sinais(df_dre_pro, cols_dre)
+    df_dre_fmt = df_dre_pro.assign(**{
+        "Valor Total (R$)": fmt_brl_col(df_dre_pro["Valor Total (R$)"]),
+        "Indicador (R$/ha)": fmt_brl_col(df_dre_pro["Indicador (R$/ha)"]),
+        "Eqv. (sc/ha)": fmt_dec_col(df_dre_pro["Eqv. (sc/ha)"], dec=1),
+    })
+    exibir_tabela(
+        df_dre_fmt, estilos_dre,
+        alinhar_direita=cols_dre, fixar=["Grupo"],
         use_container_width=True,
         hide_index=True,
         height=550
@@ -1154,94 +1043,225 @@ with col_adv3:
     """, unsafe_allow_html=True)
 
 st.markdown("### 🔥 Mapa de Sensibilidade: Margem Líquida (R$/ha)")
-prod_range = np.arange(40, 90, 5)
-preco_range = np.arange(90, 185, 5)
-z_data = np.zeros((len(prod_range), len(preco_range)))
-
-# Recalcular sensibilidade fixando custo fixo e variando receita e custo arr
-for i, p_prod in enumerate(prod_range):
-    for j, p_price in enumerate(preco_range):
-        rec_ha = p_prod * p_price
-        custo_arr_ha_cenario = (area_arrendada * arrendamento_sc_ha * p_price) / area_total
-        custo_fixo_ha = (custo_operacional_total + custo_financeiro_juros) / area_total
-        margem_ha = rec_ha - custo_fixo_ha - custo_arr_ha_cenario
-        z_data[i, j] = margem_ha
-
-fig_heat = go.Figure(data=go.Heatmap(z=z_data, x=preco_range, y=prod_range, colorscale=[[0.0, "#9B4A3C"],[0.5, "#F3EBDD"],[1.0, "#1F5A3B"]], colorbar=dict(title="R$/ha")))
-text_vals = [[fmt_dec(val, dec=0) for val in row] for row in z_data]
-fig_heat.add_trace(go.Scatter(x=np.repeat(preco_range, len(prod_range)), y=np.tile(prod_range, len(preco_range)), text=[v for r in text_vals for v in r], mode="text", textfont=dict(size=12, color="black"), hoverinfo="skip"))
-fig_heat.add_trace(go.Scatter(x=[preco_medio_blended], y=[produtividade], mode='markers', marker=dict(symbol='circle', size=12, color='#1F5A3B', line=dict(width=2, color='white')), name="Sua Posição", hoverinfo="text", hovertext=f"VOCÊ ESTÁ AQUI<br>Prod: {fmt_dec(produtividade, ' sc/ha', dec=1)}<br>Preço Médio: {fmt_brl(preco_medio_blended)}<br>Resultado: {fmt_brl(lucro_liquido/area_total)}/ha"))
-fig_heat.update_layout(title="Margem Líquida por Hectare (R$/ha)", xaxis_title="Preço (R$/sc)", yaxis_title="Produtividade (sc/ha)", height=600)
-apply_plotly_theme(fig_heat, height=600)
+with st.expander("⚙️ Faixas do mapa (zoom)", expanded=False):
+    col_h1, col_h2, col_h3, col_h4, col_h5, col_h6 = st.columns(6)
+    faixas = dict(
+        prod_min=col_h1.number_input("Prod. mín (sc/ha)", value=FAIXAS_HEAT["prod_min"], min_value=0.0, max_value=500.0, step=5.0, format="%.1f", key="soja_heat_prod_min"),
+        prod_max=col_h2.number_input("Prod. máx (sc/ha)", value=FAIXAS_HEAT["prod_max"], min_value=0.0, max_value=500.0, step=5.0, format="%.1f", key="soja_heat_prod_max"),
+        prod_passo=col_h3.number_input("Passo prod.", value=FAIXAS_HEAT["prod_passo"], min_value=0.01, max_value=100.0, step=1.0, format="%.2f", key="soja_heat_prod_passo"),
+        preco_min=col_h4.number_input("Preço mín (R$/sc)", value=FAIXAS_HEAT["preco_min"], min_value=0.0, max_value=1000.0, step=5.0, format="%.2f", key="soja_heat_preco_min"),
+        preco_max=col_h5.number_input("Preço máx (R$/sc)", value=FAIXAS_HEAT["preco_max"], min_value=0.0, max_value=1000.0, step=5.0, format="%.2f", key="soja_heat_preco_max"),
+        preco_passo=col_h6.number_input("Passo preço", value=FAIXAS_HEAT["preco_passo"], min_value=0.01, max_value=100.0, step=1.0, format="%.2f", key="soja_heat_preco_passo"),
+    )
+
+prod_range, preco_range, aviso_heat = _eixos_heat(**faixas)
+if aviso_heat:
+    st.warning(aviso_heat)
+# O mapa antecipado usou as faixas do início do rerun; se o widget devolveu outra (ex.: valor ajustado), recalcula
+z_data = aguardar(fut_heat) if faixas == faixas_heat else _mapa_heat(prod_range, preco_range)
+
+def _rotulos_heat(z, x, y):
+    # Rótulos só numa subgrade com espaço para o texto (formatação e payload limitados)
+    passo_y, passo_x = passo_rotulos(z.shape)
+    sub = z[::passo_y, ::passo_x]
+    return dict(
+        x=np.tile(x[::passo_x], sub.shape[0]).astype(np.float32),
+        y=np.repeat(y[::passo_y], sub.shape[1]).astype(np.float32),
+        text=[fmt_dec(val, dec=0) for val in sub.ravel()],
+    )
+
+def _posicao_heat(preco, prod, resultado_ha):
+    return dict(x=[preco], y=[prod], hovertext=f"VOCÊ ESTÁ AQUI<br>Prod: {fmt_dec(prod, ' sc/ha', dec=1)}<br>Preço Médio: {fmt_brl(preco)}<br>Resultado: {fmt_brl(resultado_ha)}/ha")
+
+def _fig_heat(z, x, y, preco, prod, resultado_ha):
+    # z em float32 (base64 tipado no JSON); o hover formata, então a precisão menor não aparece
+    fig = go.Figure(data=go.Heatmap(
+        z=z.astype(np.float32), x=x, y=y, colorscale=[[0.0, "#9B4A3C"],[0.5, "#F3EBDD"],[1.0, "#1F5A3B"]], colorbar=dict(title="R$/ha"),
+        hovertemplate="Preço: R$ %{x:,.2f}<br>Prod.: %{y:,.1f} sc/ha<br>Margem: R$ %{z:,.0f}/ha<extra></extra>",
+    ))
+    # Grades densas: texto e marcador em WebGL em vez de um nó SVG por ponto
+    Camada = go.Scattergl if z.size > LIMITE_SVG else go.Scatter
+    fig.add_trace(Camada(**_rotulos_heat(z, x, y), mode="text", textfont=dict(size=12, color="black"), hoverinfo="skip"))
+    fig.add_trace(Camada(**_posicao_heat(preco, prod, resultado_ha), mode='markers', marker=dict(symbol='circle', size=12, color='#1F5A3B', line=dict(width=2, color='white')), name="Sua Posição", hoverinfo="text"))
+    fig.update_layout(title="Margem Líquida por Hectare (R$/ha)", xaxis_title="Preço (R$/sc)", yaxis_title="Produtividade (sc/ha)", height=600, separators=",.")
+    return apply_plotly_theme(fig, height=600)
+
+def _atualizar_heat(spec, z, x, y, preco, prod, resultado_ha):
+    mapa, rotulos, posicao = spec["data"]
+    mapa.update(z=z.astype(np.float32), x=x, y=y)
+    rotulos.update(_rotulos_heat(z, x, y))
+    posicao.update(_posicao_heat(preco, prod, resultado_ha))
+
+# SVG e WebGL são traces de tipos diferentes: um nome para cada
+fig_heat = figura(
+    "soja_heat_gl" if z_data.size > LIMITE_SVG else "soja_heat",
+    dict(z=z_data, x=preco_range, y=prod_range, preco=preco_medio_blended, prod=produtividade, resultado_ha=lucro_liquido / area_total),
+    _fig_heat, _atualizar_heat,
+)
 st.plotly_chart(fig_heat, use_container_width=True)
 
 # --- INTELIGÊNCIA (ABAS ATUALIZADAS) ---
 st.markdown("### 🧠 Inteligência & Analytics")
-tab1, tab2, tab3 = st.tabs(["🔄 Barter & ROI", "📦 Decisão Armazenagem", "📅 Sazonalidade"])
-
-# (Monte Carlo removido por solicitação — mantém o app mais limpo e executivo)
+# Abas sob demanda: só a aba aberta é calculada e renderizada (as outras não custam nada)
+abas_intel = {
+    "🔄 Barter & ROI": ["soja_barter_valor_compra", "soja_barter_preco_base"],
+    "📦 Decisão Armazenagem": ["soja_carry_custo_arm", "soja_carry_taxa_opp_am", "soja_meses_carry", "soja_carry_preco_futuro_est"],
+    "📅 Sazonalidade": [],
+    "🎲 Monte Carlo": ["soja_mc_caminhos", "soja_mc_vol_preco_pct", "soja_mc_cv_prod_pct", "soja_mc_prob_quebra_pct", "soja_mc_seed"],
+}
+tab1, tab2, tab3, tab4 = st.tabs(list(abas_intel), key="_soja_aba_intel", on_change="rerun")
+for aba, chaves in zip((tab1, tab2, tab3, tab4), abas_intel.values()):
+    if not aba.open:
+        _manter_widgets(chaves)
 
 with tab1:
-    st.markdown("#### 📊 Eficiência Financeira (Barter & ROI)")
-    col_br1, col_br2 = st.columns(2)
-    with col_br1:
-        st.markdown("**ROI (Retorno Sobre Investimento)**")
-        st.metric("ROI Estimado", fmt_pct(roi_perc, 1), help="Para cada R$ 100,00 investidos, quanto retorna de lucro.")
-        if roi_perc > 15: st.success("🚀 ROI Excelente (>15%)")
-        elif roi_perc > 0: st.info("📈 ROI Positivo (Operação Saudável)")
-        else: st.error("📉 ROI Negativo (Atenção)")
-    with col_br2:
-        st.markdown("**Monitor de Barter (Relação de Troca)**")
-        st.metric("Custo Operacional (Barter)", fmt_dec(barter_operacional_sc_ha, " sc/ha", dec=1), help="Sacas necessárias para pagar apenas o custo operacional.")
-        st.metric("Custo Total (Barter)", fmt_dec(barter_total_sc_ha, " sc/ha", dec=1), help="Sacas necessárias para pagar TUDO (Op + Fin + Arr).")
+    if tab1.open:
+        st.markdown("#### 📊 Eficiência Financeira (Barter & ROI)")
+        col_br1, col_br2 = st.columns(2)
+        with col_br1:
+            st.markdown("**ROI (Retorno Sobre Investimento)**")
+            st.metric("ROI Estimado", fmt_pct(roi_perc, 1), help="Para cada R$ 100,00 investidos, quanto retorna de lucro.")
+            if roi_perc > 15: st.success("🚀 ROI Excelente (>15%)")
+            elif roi_perc > 0: st.info("📈 ROI Positivo (Operação Saudável)")
+            else: st.error("📉 ROI Negativo (Atenção)")
+        with col_br2:
+            st.markdown("**Monitor de Barter (Relação de Troca)**")
+            st.metric("Custo Operacional (Barter)", fmt_dec(barter_operacional_sc_ha, " sc/ha", dec=1), help="Sacas necessárias para pagar apenas o custo operacional.")
+            st.metric("Custo Total (Barter)", fmt_dec(barter_total_sc_ha, " sc/ha", dec=1), help="Sacas necessárias para pagar TUDO (Op + Fin + Arr).")
 
-    st.markdown("---")
+        st.markdown("---")
     
-    # --- CALCULADORA DE BARTER REFORMULADA ---
-    st.markdown("#### 🔢 Calculadora Rápida de Barter")
+        # --- CALCULADORA DE BARTER REFORMULADA ---
+        # Fragmento: só a calculadora reexecuta ao mudar valor/preço
+        @_fragment()
+        def calculadora_barter():
+            st.markdown("#### 🔢 Calculadora Rápida de Barter")
     
-    col_calc1, col_calc2, col_calc3 = st.columns([1.5, 1, 1])
+            col_calc1, col_calc2, col_calc3 = st.columns([1.5, 1, 1])
     
-    with col_calc1:
-        valor_compra = st.number_input("Valor da Compra/Insumo (R$)", value=930000.00, format="%.2f", key="soja_barter_valor_compra")
+            with col_calc1:
+                valor_compra = st.number_input("Valor da Compra/Insumo (R$)", value=930000.00, format="%.2f", key="soja_barter_valor_compra")
     
-    with col_calc2:
-        preco_base_barter = st.number_input("Preço Mercado (Atual) R$/sc", value=preco_mercado, format="%.2f", key="soja_barter_preco_base")
+            with col_calc2:
+                preco_base_barter = st.number_input("Preço Mercado (Atual) R$/sc", value=preco_mercado, format="%.2f", key="soja_barter_preco_base")
     
-    with col_calc3:
-        sacas_necessarias = valor_compra / preco_base_barter if preco_base_barter > 0 else 0
-        st.metric("Custo em Sacas", fmt_dec(sacas_necessarias, " sc"), f"Base: {fmt_brl(preco_base_barter)}")
+            with col_calc3:
+                sacas_necessarias = valor_compra / preco_base_barter if preco_base_barter > 0 else 0
+                st.metric("Custo em Sacas", fmt_dec(sacas_necessarias, " sc"), f"Base: {fmt_brl(preco_base_barter)}")
+            save_persisted_state()
+
+        calculadora_barter()
 
 with tab2:
-    st.markdown("#### 📉 Calculadora de Carry (Vender Agora vs. Segurar)")
-    col_c1, col_c2, col_c3 = st.columns(3)
-    custo_arm = col_c1.number_input("Custo Armazém (R$/sc/mês)", 0.0, 5.0, 0.80, format="%.2f", key="soja_carry_custo_arm")
-    taxa_opp = col_c2.number_input("Custo Oportunidade (% a.m.)", 0.0, 5.0, 1.0, help="Quanto seu dinheiro renderia no banco (CDI)", format="%.2f", key="soja_carry_taxa_opp_am")
-    meses_carry = col_c3.slider("Meses Guardado", 1, 12, 4, key="soja_meses_carry")
-    preco_futuro_est = st.number_input(f"Preço Estimado Daqui a {meses_carry} Meses (R$/sc)", value=preco_mercado + 12.0, format="%.2f", key="soja_carry_preco_futuro_est")
-    custo_fisico = custo_arm * meses_carry
-    custo_financeiro = preco_mercado * (taxa_opp/100) * meses_carry
-    custo_total_carry = custo_fisico + custo_financeiro
-    preco_net_futuro = preco_futuro_est - custo_total_carry
-    resultado_carry = preco_net_futuro - preco_mercado
-    st.markdown("---")
-    cm1, cm2, cm3 = st.columns(3)
-    cm1.metric("Custo Total de Carregar", fmt_brl(custo_total_carry) + "/sc", delta="Armazém + Juros", delta_color="inverse")
-    cm2.metric("Preço Net Futuro", fmt_brl(preco_net_futuro) + "/sc", help="Preço Futuro - Custo de Carregar")
-    if resultado_carry > 0:
-        cm3.metric("Resultado da Decisão", f"GANHO DE {fmt_brl(resultado_carry)}", delta="✅ Segurar Compensa")
-        st.success(f"**Recomendação:** O mercado futuro paga o custo de carregar e sobra **{fmt_brl(resultado_carry)}** por saca.")
-    else:
-        cm3.metric("Resultado da Decisão", f"PERDA DE {fmt_brl(abs(resultado_carry))}", delta="❌ Venda Agora", delta_color="inverse")
-        st.error(f"**Recomendação:** Não compensa guardar. O custo de carregar ({fmt_brl(custo_total_carry)}) é maior que a valorização esperada.")
+    if tab2.open:
+        # Fragmento: a Calculadora de Carry reexecuta sozinha
+        @_fragment()
+        def calculadora_carry():
+            st.markdown("#### 📉 Calculadora de Carry (Vender Agora vs. Segurar)")
+            col_c1, col_c2, col_c3 = st.columns(3)
+            custo_arm = col_c1.number_input("Custo Armazém (R$/sc/mês)", 0.0, 5.0, 0.80, format="%.2f", key="soja_carry_custo_arm")
+            taxa_opp = col_c2.number_input("Custo Oportunidade (% a.m.)", 0.0, 5.0, 1.0, help="Quanto seu dinheiro renderia no banco (CDI)", format="%.2f", key="soja_carry_taxa_opp_am")
+            meses_carry = col_c3.slider("Meses Guardado", 1, 12, 4, key="soja_meses_carry")
+            preco_futuro_est = st.number_input(f"Preço Estimado Daqui a {meses_carry} Meses (R$/sc)", value=preco_mercado + 12.0, format="%.2f", key="soja_carry_preco_futuro_est")
+            custo_fisico = custo_arm * meses_carry
+            custo_financeiro = preco_mercado * (taxa_opp/100) * meses_carry
+            custo_total_carry = custo_fisico + custo_financeiro
+            preco_net_futuro = preco_futuro_est - custo_total_carry
+            resultado_carry = preco_net_futuro - preco_mercado
+            st.markdown("---")
+            cm1, cm2, cm3 = st.columns(3)
+            cm1.metric("Custo Total de Carregar", fmt_brl(custo_total_carry) + "/sc", delta="Armazém + Juros", delta_color="inverse")
+            cm2.metric("Preço Net Futuro", fmt_brl(preco_net_futuro) + "/sc", help="Preço Futuro - Custo de Carregar")
+            if resultado_carry > 0:
+                cm3.metric("Resultado da Decisão", f"GANHO DE {fmt_brl(resultado_carry)}", delta="✅ Segurar Compensa")
+                st.success(f"**Recomendação:** O mercado futuro paga o custo de carregar e sobra **{fmt_brl(resultado_carry)}** por saca.")
+            else:
+                cm3.metric("Resultado da Decisão", f"PERDA DE {fmt_brl(abs(resultado_carry))}", delta="❌ Venda Agora", delta_color="inverse")
+                st.error(f"**Recomendação:** Não compensa guardar. O custo de carregar ({fmt_brl(custo_total_carry)}) é maior que a valorização esperada.")
+            save_persisted_state()
+
+        calculadora_carry()
 
 with tab3:
-    st.markdown("**Sazonalidade Histórica (Base Paranaguá)**")
-    meses = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
-    indices_sazonais = [1.03, 1.01, 0.95, 0.94, 0.97, 0.99, 1.01, 1.03, 1.05, 1.07, 1.08, 1.05]
-    fator_ajuste = preco_mercado / indices_sazonais[datetime.now().month - 1]
-    precos_projetados = [idx * fator_ajuste for idx in indices_sazonais]
-    st.plotly_chart(go.Figure([go.Bar(x=meses, y=precos_projetados, marker_color='#556B2F')]).update_layout(height=300), use_container_width=True)
+    if tab3.open:
+        st.markdown("**Sazonalidade Histórica (Base Paranaguá)**")
+        meses = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+        fator_ajuste = preco_mercado / indices_sazonais[datetime.now().month - 1]
+        precos_projetados = [idx * fator_ajuste for idx in indices_sazonais]
+        fig_sazonal = figura(
+            "soja_sazonal", dict(meses=meses, precos=precos_projetados),
+            lambda meses, precos: go.Figure([go.Bar(x=meses, y=precos, marker_color='#556B2F')]).update_layout(height=300),
+            lambda spec, meses, precos: spec["data"][0].update(x=meses, y=precos),
+        )
+        st.plotly_chart(fig_sazonal, use_container_width=True)
+
+with tab4:
+    if tab4.open:
+        st.markdown("#### 🎲 Monte Carlo: Preço × Produtividade × Quebra")
+        st.caption("Simulação em segundo plano (lotes vetorizados, semente fixa). A página continua utilizável enquanto roda.")
+        col_mc1, col_mc2, col_mc3, col_mc4, col_mc5 = st.columns(5)
+        mc_caminhos = col_mc1.selectbox("Caminhos", [10_000, 100_000, 1_000_000], index=1, format_func=lambda n: fmt_dec(n, dec=0), key="soja_mc_caminhos")
+        mc_vol = col_mc2.number_input("Volatilidade Preço (%)", 0.0, 100.0, 20.0, step=1.0, key="soja_mc_vol_preco_pct")
+        mc_cv = col_mc3.number_input("Incerteza Produtiv. (%)", 0.0, 100.0, 10.0, step=1.0, key="soja_mc_cv_prod_pct")
+        mc_prob_quebra = col_mc4.number_input("Prob. Quebra (%)", 0.0, 100.0, 10.0, step=1.0, key="soja_mc_prob_quebra_pct")
+        mc_seed = col_mc5.number_input("Semente", 0, 10**9, 42, step=1, key="soja_mc_seed")
+
+        job_key = "_soja_mc_job"
+        col_b1, col_b2 = st.columns(2)
+        if col_b1.button("▶️ Rodar Simulação", use_container_width=True, key="_soja_mc_run_btn"):
+            if st.session_state.get(job_key) is not None:
+                st.session_state[job_key].cancelar()
+            st.session_state[job_key] = SimulacaoMonteCarlo(
+                {**entradas_cenario, "dias_financiamento": dias_financiamento},
+                n_caminhos=mc_caminhos,
+                seed=int(mc_seed),
+                vol_preco=mc_vol / 100,
+                cv_produtividade=mc_cv / 100,
+                prob_quebra=mc_prob_quebra / 100,
+            ).iniciar()
+        if col_b2.button("⏹️ Cancelar", use_container_width=True, key="_soja_mc_cancel_btn") and st.session_state.get(job_key) is not None:
+            st.session_state[job_key].cancelar()
+
+        job = st.session_state.get(job_key)
+
+        def painel_monte_carlo():
+            job = st.session_state.get(job_key)
+            if job is None:
+                st.info("Defina os parâmetros e clique em **Rodar Simulação**.")
+                return
+            if job.erro is not None:
+                st.error(f"Falha na simulação: {job.erro}")
+                return
+            res = job.resultados()
+            st.progress(min(1.0, job.progresso), text=f"{fmt_dec(job.feitos, dec=0)} de {fmt_dec(job.n_caminhos, dec=0)} caminhos")
+            if res["lucro_liquido"].n == 0:
+                return
+            r_lucro = resumo(res["lucro_liquido"])
+            r_margem = resumo(res["margem_liquida_perc"])
+            cmc1, cmc2, cmc3, cmc4 = st.columns(4)
+            cmc1.metric("Lucro P5 (pessimista)", fmt_brl(r_lucro["p5"]))
+            cmc2.metric("Lucro P50 (mediano)", fmt_brl(r_lucro["p50"]))
+            cmc3.metric("Lucro P95 (otimista)", fmt_brl(r_lucro["p95"]))
+            cmc4.metric("Prob. Prejuízo", fmt_pct(r_lucro["prob_negativo"] * 100, 1))
+            st.caption(f"Margem líquida: P5 {fmt_pct(r_margem['p5'], 1)} · P50 {fmt_pct(r_margem['p50'], 1)} · P95 {fmt_pct(r_margem['p95'], 1)} · Média dos 5% piores cenários de lucro: {fmt_brl(r_lucro['cauda_5'])}")
+            # Histograma reconstruído do sketch (memória constante): n × ΔCDF por faixa
+            sk_margem = res["margem_liquida_perc"]
+            bordas = np.linspace(sk_margem.quantil(0.001), sk_margem.quantil(0.999), 61)
+            contagem = np.diff(sk_margem.cdf(bordas)) * sk_margem.n
+            fig_mc = go.Figure(go.Bar(x=(bordas[:-1] + bordas[1:]) / 2, y=contagem, marker_color='#556B2F'))
+            fig_mc.add_vline(x=margem_desejada, line_dash="dot", line_color="#B08D57", annotation_text="Meta")
+            fig_mc.update_layout(xaxis_title="Margem Líquida (%)", yaxis_title="Caminhos", bargap=0.02)
+            apply_plotly_theme(fig_mc, height=320)
+            st.plotly_chart(fig_mc, use_container_width=True)
+            if not job.rodando and st.session_state.pop(f"{job_key}_polling", False):
+                st.rerun()  # simulação terminou: para a atualização periódica
+
+        # Atualiza só este painel a cada 1s enquanto a simulação roda
+        if job is not None and job.rodando:
+            st.session_state[f"{job_key}_polling"] = True
+            _fragment(run_every=1.0)(painel_monte_carlo)()
+        else:
+            painel_monte_carlo()
 
 st.markdown("""
 <div class="footer">
@@ -1251,4 +1271,5 @@ st.markdown("""
 
 
 # Salvamento automático das entradas (sessão + JSON)
-save_persisted_state()
+if not aguardando_pausa:
+    save_persisted_state()
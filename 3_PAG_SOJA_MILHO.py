@@ -3,7 +3,7 @@
 # Objetivo: visão executiva AUTOMÁTICA (sem campos editáveis), consolidando tudo que o usuário
 # ajustou nas páginas SOJA e MILHO.
 #
-# Persistência: Session + JSON (agro_state.json)
+# Persistência: Session + estado salvo (agro_state.db por perfil/fazenda, ou agro_state.json)
 # - Qualquer alteração feita em SOJA/MILHO fica gravada e aparece aqui automaticamente.
 # - Se o app reiniciar, os últimos valores salvos são carregados.
 #
@@ -11,108 +11,26 @@
 # - Área Física (ha)  = MAIOR área ocupada em uma safra (max(área soja, área milho))
 # - Área Plantada no Ano (ha) = soma das duas (soja + milho), pois é 2ª safra (mesma área pode “rodar” 2x)
 
-import json
-import re
 from pathlib import Path
 from datetime import date
+from typing import NamedTuple
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
 
+from agro_cache import em_cache
+from agro_estado import destino_sessao, ler_estado
+from agro_estilo import aplicar_estilo
+from agro_formato import formatar_br
+
 # ============================================================
 # CONFIG + ESTILO GLOBAL (Premium Agro)
 # ============================================================
 st.set_page_config(page_title="SOJA + MILHO | Consolidado", layout="wide")
 
-CSS = """
-<style>
-@import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;600;700&display=swap');
-
-html, body, [class*="css"] { font-family: 'Inter', sans-serif; }
-.main { background: #f6f3ee; }
-
-.block-container { padding-top: 1.2rem; padding-bottom: 2rem; }
-
-.premium-header{
-  background: linear-gradient(135deg, #f7f3ea 0%, #ffffff 60%);
-  border: 1px solid rgba(42,61,47,0.12);
-  border-radius: 18px;
-  padding: 18px 18px;
-  box-shadow: 0 10px 26px rgba(0,0,0,0.06);
-  margin-bottom: 12px;
-}
-.premium-title{
-  font-size: 34px; font-weight: 800; color:#1e2a24; margin:0;
-}
-.premium-sub{
-  color:#4b5a52; margin-top:4px; font-size: 14px;
-}
-
-.kpi-grid{
-  display: grid;
-  grid-template-columns: repeat(6, minmax(160px, 1fr));
-  gap: 12px;
-  margin-top: 10px;
-}
-.kpi-card{
-  background: #ffffff;
-  border: 1px solid rgba(42,61,47,0.14);
-  border-left: 6px solid #1b5e20;
-  border-radius: 16px;
-  padding: 12px 14px;
-  box-shadow: 0 10px 18px rgba(0,0,0,0.06);
-  min-height: 92px;
-}
-.kpi-top{ display:flex; align-items:center; gap:8px; color:#3a4a41; font-size: 12px; font-weight:700; }
-.kpi-val{ font-size: 24px; font-weight: 900; color:#1e2a24; margin-top: 4px; }
-.kpi-hint{ color:#5a6a61; font-size: 12px; margin-top: 4px; }
-
-.section-card{
-  background:#fff;
-  border: 1px solid rgba(42,61,47,0.12);
-  border-radius: 18px;
-  padding: 14px 16px;
-  box-shadow: 0 10px 22px rgba(0,0,0,0.05);
-  margin-top: 12px;
-}
-.section-title{
-  font-size: 18px; font-weight: 900; color:#1e2a24; margin: 0 0 8px 0;
-}
-.badge{
-  display:inline-block;
-  font-size: 12px;
-  padding: 4px 10px;
-  border-radius: 999px;
-  border: 1px solid rgba(42,61,47,0.16);
-  background: #f7f3ea;
-  color:#2a3d2f;
-  font-weight: 700;
-}
-.divider{ height:1px; background: rgba(42,61,47,0.10); margin: 10px 0 12px 0; }
-
-.insight{
-  padding: 10px 12px;
-  border-radius: 14px;
-  border: 1px solid rgba(42,61,47,0.14);
-  background: #fbfaf7;
-}
-.insight b{ color:#1e2a24; }
-.positive{ color:#1b5e20; font-weight: 800; }
-.negative{ color:#8b2c2c; font-weight: 800; }
-
-.small{ font-size: 12px; color:#5a6a61; }
-
-.footer{
-  margin-top: 18px;
-  color:#6a7a70;
-  font-size: 12px;
-  text-align:center;
-}
-</style>
-"""
-
-st.markdown(CSS, unsafe_allow_html=True)
+aplicar_estilo("agro_consolidado.css")
 
 # ============================================================
 # PERSISTÊNCIA (SESSÃO + JSON)
@@ -130,25 +48,10 @@ def _root_dir() -> Path:
 STATE_FILE = _root_dir() / STATE_FILE_NAME
 
 
-def _parse_date_like(v):
-    if isinstance(v, str) and re.match(r"^\d{4}-\d{2}-\d{2}$", v):
-        try:
-            return date.fromisoformat(v)
-        except Exception:
-            return v
-    return v
-
-
 def load_persisted_state():
-    if STATE_FILE.exists():
-        try:
-            data = json.loads(STATE_FILE.read_text(encoding="utf-8"))
-            if isinstance(data, dict):
-                for k, v in data.items():
-                    if k not in st.session_state:
-                        st.session_state[k] = _parse_date_like(v)
-        except Exception:
-            pass
+    for k, v in ler_estado(destino_sessao(STATE_FILE)).items():
+        if k not in st.session_state:
+            st.session_state[k] = v
 load_persisted_state()
 
 # =======================
@@ -202,6 +105,19 @@ def fmt_pct(x: float) -> str:
         return "0,0%"
 
 
+# Versões por coluna (tabelas): mesma saída dos fmt_* acima, a coluna inteira de uma vez
+def fmt_brl_col(col: pd.Series) -> pd.Series:
+    return formatar_br(col, prefixo="R$ ", sinal_antes_do_prefixo=False)
+
+
+def fmt_int_col(col: pd.Series) -> pd.Series:
+    return formatar_br(col, dec=0)
+
+
+def fmt_pct_col(col: pd.Series) -> pd.Series:
+    return formatar_br(col, dec=1, sufixo="%", escala=100)
+
+
 def _safe_float(x, default=0.0) -> float:
     try:
         if x is None:
@@ -215,69 +131,181 @@ def get(k: str, default):
     return st.session_state.get(k, default)
 
 
+# ============================================================
+# REGISTROS TIPADOS (ENTRADA / RESULTADO POR CULTURA)
+# ============================================================
+# NamedTuple: campos fixos sem dict por registro (__slots__ vazio), imutáveis (variações via
+# _replace) e com hash canônico no agro_cache (tupla). Conversão/validação dos valores
+# acontece uma vez, nos construtores em bloco (from_state / from_rows / from_frame).
+
+class CropInput(NamedTuple):
+    cultura: str
+    simular_quebra: bool
+    perc_quebra: float
+    area_propria: float
+    area_arrendada: float
+    prod_sc_ha: float
+    custo_op_ha: float
+    pct_travado: float
+    preco_travado: float
+    preco_mercado: float
+    margem_alvo: float
+    fin_pct: float
+    juros_aa: float
+    data_desembolso: date
+    data_pagamento: date
+    arr_sc_ha: float
+    insumos_pct: float
+    colheita_pct: float
+    p_entrada_pct: float
+    p2_pct: float
+    p2_data: date
+    p3_pct: float
+    p3_data: date
+    mes_plantio: int
+    mes_colheita: int
+
+    @classmethod
+    def from_state(cls, state, prefix: str, cultura: str, defaults: dict) -> "CropInput":
+        """Lê `prefix` + chave de cada campo (session_state ou dict do JSON); ausentes vêm de `defaults`."""
+        return cls(cultura=cultura, **{
+            campo: converter(state.get(prefix + chave, defaults[chave]), defaults[chave])
+            for campo, (chave, converter) in CROP_STATE_KEYS.items()
+        })
+
+    @classmethod
+    def from_rows(cls, rows) -> list:
+        """Vários registros de uma vez (DataFrame ou lista de dicts com os campos já em fração).
+
+        Números inválidos viram 0 (como _safe_float), coluna a coluna, antes de montar as tuplas.
+        """
+        df = pd.DataFrame(rows, columns=list(cls._fields)).reset_index(drop=True)
+        for campo, tipo in cls.__annotations__.items():
+            if tipo is float:
+                df[campo] = pd.to_numeric(df[campo], errors="coerce").fillna(0.0).astype(float)
+            elif tipo is int:
+                df[campo] = pd.to_numeric(df[campo], errors="coerce").fillna(0).astype(int)
+            elif tipo is bool:
+                df[campo] = df[campo].fillna(False).astype(bool)
+        return [cls._make(linha) for linha in df.itertuples(index=False, name=None)]
+
+
+# campo do CropInput -> (chave no session_state sem o prefixo soja_/milho_, conversão(valor, padrão))
+_num = lambda v, padrao: _safe_float(v)
+_pct = lambda v, padrao: _safe_float(v) / 100.0
+_mes = lambda v, padrao: int(_safe_float(v, padrao))
+_bool = lambda v, padrao: bool(v)
+_data = lambda v, padrao: v
+
+CROP_STATE_KEYS = {
+    "simular_quebra": ("simular_quebra", _bool),
+    "perc_quebra": ("perc_quebra", _pct),
+    "area_propria": ("area_propria_ha", _num),
+    "area_arrendada": ("area_arrendada_ha", _num),
+    "prod_sc_ha": ("produtividade_sc_ha", _num),
+    "custo_op_ha": ("custo_operacional_ha", _num),
+    "pct_travado": ("perc_travado_pct", _pct),
+    "preco_travado": ("preco_travado", _num),
+    "preco_mercado": ("preco_mercado", _num),
+    "margem_alvo": ("margem_alvo_pct", _pct),
+    "fin_pct": ("perc_financiado_pct", _pct),
+    "juros_aa": ("taxa_juros_aa_pct", _pct),
+    "data_desembolso": ("data_desembolso", _data),
+    "data_pagamento": ("data_pagamento", _data),
+    "arr_sc_ha": ("arrendamento_sc_ha", _num),
+    "insumos_pct": ("perc_insumos_pct", _pct),
+    "colheita_pct": ("perc_colheita_pct", _pct),
+    "p_entrada_pct": ("pct_entrada_insumo_pct", _pct),
+    "p2_pct": ("pct_parc2_pct", _pct),
+    "p2_data": ("data_parc2", _data),
+    "p3_pct": ("pct_parc3_pct", _pct),
+    "p3_data": ("data_parc3", _data),
+    "mes_plantio": ("mes_plantio", _mes),
+    "mes_colheita": ("mes_colheita", _mes),
+}
+
+
+class CropResult(NamedTuple):
+    cultura: str
+    area_total: float
+    area_propria: float
+    area_arrendada: float
+    prod_sc_ha: float
+    producao_sc: float
+    preco_medio: float
+    receita: float
+    arr_sc_total: float
+    arr_custo: float
+    custo_op_total: float
+    custo_insumos: float
+    custo_colheita: float
+    custo_outros: float
+    principal_fin: float
+    juros: float
+    dias: int
+    custo_total: float
+    lucro: float
+    lucro_ha: float
+    margem: float
+    custo_sc: float
+    breakeven: float
+    preco_req_margem: float
+    pct_travado: float
+    pct_spot: float
+    preco_travado: float
+    preco_mercado: float
+    margem_alvo: float
+    data_desembolso: date
+    data_pagamento: date
+    mes_plantio: int
+    mes_colheita: int
+    p_entrada_pct: float
+    p2_pct: float
+    p2_data: date
+    p3_pct: float
+    p3_data: date
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> list:
+        """Um registro por linha do frame de compute_crops (colunas extras, ex.: "fazenda", ficam de fora)."""
+        return [cls._make(linha) for linha in df[list(cls._fields)].itertuples(index=False, name=None)]
+
+
 # ============================================================
 # LEITURA DE INPUTS (SOJA / MILHO) — SEM CAMPOS EDITÁVEIS AQUI
 # ============================================================
 
-def read_soja() -> dict:
-    return {
-        "cultura": "SOJA",
-        "simular_quebra": bool(get("soja_simular_quebra", False)),
-        "perc_quebra": _safe_float(get("soja_perc_quebra", 20)) / 100.0,
-        "area_propria": _safe_float(get("soja_area_propria_ha", 1000.0)),
-        "area_arrendada": _safe_float(get("soja_area_arrendada_ha", 500.0)),
-        "prod_sc_ha": _safe_float(get("soja_produtividade_sc_ha", 60.0)),
-        "custo_op_ha": _safe_float(get("soja_custo_operacional_ha", 6000.0)),
-        "pct_travado": _safe_float(get("soja_perc_travado_pct", 25.0)) / 100.0,
-        "preco_travado": _safe_float(get("soja_preco_travado", 115.0)),
-        "preco_mercado": _safe_float(get("soja_preco_mercado", 105.0)),
-        "margem_alvo": _safe_float(get("soja_margem_alvo_pct", 20.0)) / 100.0,
-        "fin_pct": _safe_float(get("soja_perc_financiado_pct", 30.0)) / 100.0,
-        "juros_aa": _safe_float(get("soja_taxa_juros_aa_pct", 12.0)) / 100.0,
-        "data_desembolso": get("soja_data_desembolso", date(2025, 8, 30)),
-        "data_pagamento": get("soja_data_pagamento", date(2026, 4, 30)),
-        "arr_sc_ha": _safe_float(get("soja_arrendamento_sc_ha", 15.0)),
-        "insumos_pct": _safe_float(get("soja_perc_insumos_pct", 60.0)) / 100.0,
-        "colheita_pct": _safe_float(get("soja_perc_colheita_pct", 20.0)) / 100.0,
-        "p_entrada_pct": _safe_float(get("soja_pct_entrada_insumo_pct", 50.0)) / 100.0,
-        "p2_pct": _safe_float(get("soja_pct_parc2_pct", 25.0)) / 100.0,
-        "p2_data": get("soja_data_parc2", date(2026, 4, 30)),
-        "p3_pct": _safe_float(get("soja_pct_parc3_pct", 25.0)) / 100.0,
-        "p3_data": get("soja_data_parc3", date(2026, 5, 30)),
-        "mes_plantio": int(_safe_float(get("soja_mes_plantio", 9), 9)),
-        "mes_colheita": int(_safe_float(get("soja_mes_colheita", 4), 4)),
-    }
+# Padrões no formato dos widgets das páginas (% como 0–100)
+SOJA_INPUT_DEFAULTS = {
+    "simular_quebra": False, "perc_quebra": 20, "area_propria_ha": 1000.0, "area_arrendada_ha": 500.0,
+    "produtividade_sc_ha": 60.0, "custo_operacional_ha": 6000.0, "perc_travado_pct": 25.0,
+    "preco_travado": 115.0, "preco_mercado": 105.0, "margem_alvo_pct": 20.0, "perc_financiado_pct": 30.0,
+    "taxa_juros_aa_pct": 12.0, "data_desembolso": date(2025, 8, 30), "data_pagamento": date(2026, 4, 30),
+    "arrendamento_sc_ha": 15.0, "perc_insumos_pct": 60.0, "perc_colheita_pct": 20.0,
+    "pct_entrada_insumo_pct": 50.0, "pct_parc2_pct": 25.0, "data_parc2": date(2026, 4, 30),
+    "pct_parc3_pct": 25.0, "data_parc3": date(2026, 5, 30), "mes_plantio": 9, "mes_colheita": 4,
+}
 
+MILHO_INPUT_DEFAULTS = {
+    **SOJA_INPUT_DEFAULTS,
+    "produtividade_sc_ha": 105.0, "custo_operacional_ha": 5400.0, "preco_travado": 60.0, "preco_mercado": 55.0,
+    "data_desembolso": date(2026, 1, 30), "data_pagamento": date(2026, 8, 30),
+    # No milho, normalmente arrendamento = 0 (já pago na soja/ano). Campo existe, mas default 0.
+    "arrendamento_sc_ha": 0.0,
+    "data_parc2": date(2026, 7, 30), "data_parc3": date(2026, 8, 30), "mes_plantio": 2, "mes_colheita": 7,
+}
+
+
+def read_soja() -> CropInput:
+    return CropInput.from_state(st.session_state, "soja_", "SOJA", SOJA_INPUT_DEFAULTS)
+
+
+def read_milho() -> CropInput:
+    return CropInput.from_state(st.session_state, "milho_", "MILHO SAFRINHA", MILHO_INPUT_DEFAULTS)
 
-def read_milho() -> dict:
-    return {
-        "cultura": "MILHO SAFRINHA",
-        "simular_quebra": bool(get("milho_simular_quebra", False)),
-        "perc_quebra": _safe_float(get("milho_perc_quebra", 20)) / 100.0,
-        "area_propria": _safe_float(get("milho_area_propria_ha", 1000.0)),
-        "area_arrendada": _safe_float(get("milho_area_arrendada_ha", 500.0)),
-        "prod_sc_ha": _safe_float(get("milho_produtividade_sc_ha", 105.0)),
-        "custo_op_ha": _safe_float(get("milho_custo_operacional_ha", 5400.0)),
-        "pct_travado": _safe_float(get("milho_perc_travado_pct", 25.0)) / 100.0,
-        "preco_travado": _safe_float(get("milho_preco_travado", 60.0)),
-        "preco_mercado": _safe_float(get("milho_preco_mercado", 55.0)),
-        "margem_alvo": _safe_float(get("milho_margem_alvo_pct", 20.0)) / 100.0,
-        "fin_pct": _safe_float(get("milho_perc_financiado_pct", 30.0)) / 100.0,
-        "juros_aa": _safe_float(get("milho_taxa_juros_aa_pct", 12.0)) / 100.0,
-        "data_desembolso": get("milho_data_desembolso", date(2026, 1, 30)),
-        "data_pagamento": get("milho_data_pagamento", date(2026, 8, 30)),
-        # No milho, normalmente arrendamento = 0 (já pago na soja/ano). Campo existe, mas default 0.
-        "arr_sc_ha": _safe_float(get("milho_arrendamento_sc_ha", 0.0)),
-        "insumos_pct": _safe_float(get("milho_perc_insumos_pct", 60.0)) / 100.0,
-        "colheita_pct": _safe_float(get("milho_perc_colheita_pct", 20.0)) / 100.0,
-        "p_entrada_pct": _safe_float(get("milho_pct_entrada_insumo_pct", 50.0)) / 100.0,
-        "p2_pct": _safe_float(get("milho_pct_parc2_pct", 25.0)) / 100.0,
-        "p2_data": get("milho_data_parc2", date(2026, 7, 30)),
-        "p3_pct": _safe_float(get("milho_pct_parc3_pct", 25.0)) / 100.0,
-        "p3_data": get("milho_data_parc3", date(2026, 8, 30)),
-        "mes_plantio": int(_safe_float(get("milho_mes_plantio", 2), 2)),
-        "mes_colheita": int(_safe_float(get("milho_mes_colheita", 7), 7)),
-    }
+
+# Campos de CropInput / CropResult (entrada e saída de compute_crops)
+CROP_INPUT_COLUMNS = list(CropInput._fields)
 
 
 # ============================================================
@@ -296,50 +324,70 @@ def days_between(d1: date, d2: date) -> int:
         return 0
 
 
-def compute_crop(inp: dict) -> dict:
-    area_total = max(0.0, inp["area_propria"] + inp["area_arrendada"])
+# Colunas de saída de compute_crops (mesma ordem dos campos de CropResult)
+CROP_RESULT_COLUMNS = list(CropResult._fields)
+
+
+def _col(df: pd.DataFrame, k: str) -> np.ndarray:
+    return df[k].to_numpy(dtype=float)
+
+
+def _safe_div(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    out = np.zeros_like(num, dtype=float)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+
+def _days_between_cols(d1: pd.Series, d2: pd.Series) -> np.ndarray:
+    # Mesmo comportamento de days_between: datas inválidas -> 0 dias; negativos -> 0
+    t1 = pd.to_datetime(d1, errors="coerce")
+    t2 = pd.to_datetime(d2, errors="coerce")
+    return (t2 - t1).dt.days.fillna(0).clip(lower=0).astype(int).to_numpy()
+
+
+@em_cache  # mesmas entradas SOJA/MILHO -> resultado compartilhado entre sessões
+def compute_crops(inp: pd.DataFrame) -> pd.DataFrame:
+    """Versão colunar de compute_crop: uma linha por fazenda×cultura, todas as colunas vetorizadas.
 
-    prod_sc_ha = max(0.0, inp["prod_sc_ha"])
-    if inp["simular_quebra"]:
-        prod_sc_ha = prod_sc_ha * (1.0 - max(0.0, min(0.95, inp["perc_quebra"])))
+    Colunas extras da entrada (ex.: "fazenda") são preservadas à esquerda do resultado.
+    """
+    inp = inp.reset_index(drop=True)
+    area_propria = _col(inp, "area_propria")
+    area_arrendada = _col(inp, "area_arrendada")
+    area_total = np.maximum(0.0, area_propria + area_arrendada)
+
+    prod_sc_ha = np.maximum(0.0, _col(inp, "prod_sc_ha"))
+    quebra = np.clip(_col(inp, "perc_quebra"), 0.0, 0.95)
+    prod_sc_ha = np.where(inp["simular_quebra"].astype(bool).to_numpy(), prod_sc_ha * (1.0 - quebra), prod_sc_ha)
 
     producao_sc = area_total * prod_sc_ha
 
-    preco_med = blended_price(inp["pct_travado"], inp["preco_travado"], inp["preco_mercado"])
+    pct_travado = _col(inp, "pct_travado")
+    pct_trav_clip = np.clip(pct_travado, 0.0, 1.0)
+    preco_med = pct_trav_clip * _col(inp, "preco_travado") + (1.0 - pct_trav_clip) * _col(inp, "preco_mercado")
     receita = producao_sc * preco_med
 
     # Arrendamento (econômico) em reais (sc/ha * área arrendada * preço médio)
-    arr_sc_total = max(0.0, inp["area_arrendada"]) * max(0.0, inp["arr_sc_ha"])
+    arr_sc_total = np.maximum(0.0, area_arrendada) * np.maximum(0.0, _col(inp, "arr_sc_ha"))
     arr_custo = arr_sc_total * preco_med
 
-    custo_op_total = area_total * max(0.0, inp["custo_op_ha"])
-    custo_insumos = custo_op_total * max(0.0, min(1.0, inp["insumos_pct"]))
-    custo_colheita = custo_op_total * max(0.0, min(1.0, inp["colheita_pct"]))
-    custo_outros = max(0.0, custo_op_total - custo_insumos - custo_colheita)
+    custo_op_total = area_total * np.maximum(0.0, _col(inp, "custo_op_ha"))
+    custo_insumos = custo_op_total * np.clip(_col(inp, "insumos_pct"), 0.0, 1.0)
+    custo_colheita = custo_op_total * np.clip(_col(inp, "colheita_pct"), 0.0, 1.0)
+    custo_outros = np.maximum(0.0, custo_op_total - custo_insumos - custo_colheita)
 
-    # Financiamento (custeio) — base simplificada: % do custo operacional
-    principal_fin = custo_op_total * max(0.0, min(1.0, inp["fin_pct"]))
-    dias = days_between(inp["data_desembolso"], inp["data_pagamento"])
-    juros = principal_fin * max(0.0, inp["juros_aa"]) * (dias / 365.0)
+    principal_fin = custo_op_total * np.clip(_col(inp, "fin_pct"), 0.0, 1.0)
+    dias = _days_between_cols(inp["data_desembolso"], inp["data_pagamento"])
+    juros = principal_fin * np.maximum(0.0, _col(inp, "juros_aa")) * (dias / 365.0)
 
     custo_total = custo_op_total + arr_custo + juros
     lucro = receita - custo_total
 
-    margem = (lucro / receita) if receita > 0 else 0.0
-    lucro_ha = (lucro / area_total) if area_total > 0 else 0.0
-
-    custo_sc = (custo_total / producao_sc) if producao_sc > 0 else 0.0
-    breakeven = custo_sc  # R$/sc para ficar 0x0
-
-    # Preço necessário para atingir a margem alvo
-    m_alvo = max(0.0, min(0.8, inp["margem_alvo"]))
-    receita_req = custo_total / max(1e-9, (1.0 - m_alvo))
-    preco_req = (receita_req / producao_sc) if producao_sc > 0 else 0.0
-
-    # Exposição spot
-    pct_spot = max(0.0, 1.0 - max(0.0, min(1.0, inp["pct_travado"])))
+    custo_sc = _safe_div(custo_total, producao_sc)
+    m_alvo = np.clip(_col(inp, "margem_alvo"), 0.0, 0.8)
+    receita_req = custo_total / np.maximum(1e-9, 1.0 - m_alvo)
 
-    return {
+    out = pd.DataFrame({
         "cultura": inp["cultura"],
         "area_total": area_total,
         "area_propria": inp["area_propria"],
@@ -359,34 +407,68 @@ def compute_crop(inp: dict) -> dict:
         "dias": dias,
         "custo_total": custo_total,
         "lucro": lucro,
-        "lucro_ha": lucro_ha,
-        "margem": margem,
+        "lucro_ha": _safe_div(lucro, area_total),
+        "margem": _safe_div(lucro, receita),
         "custo_sc": custo_sc,
-        "breakeven": breakeven,
-        "preco_req_margem": preco_req,
+        "breakeven": custo_sc,  # R$/sc para ficar 0x0
+        "preco_req_margem": _safe_div(receita_req, producao_sc),
         "pct_travado": inp["pct_travado"],
-        "pct_spot": pct_spot,
-        "preco_travado": inp["preco_travado"],
-        "preco_mercado": inp["preco_mercado"],
-        "margem_alvo": inp["margem_alvo"],
-        "data_desembolso": inp["data_desembolso"],
-        "data_pagamento": inp["data_pagamento"],
-        "mes_plantio": inp["mes_plantio"],
-        "mes_colheita": inp["mes_colheita"],
-        "p_entrada_pct": inp["p_entrada_pct"],
-        "p2_pct": inp["p2_pct"],
-        "p2_data": inp["p2_data"],
-        "p3_pct": inp["p3_pct"],
-        "p3_data": inp["p3_data"],
+        "pct_spot": np.maximum(0.0, 1.0 - pct_trav_clip),
+    })
+    for k in CROP_RESULT_COLUMNS[len(out.columns):]:
+        out[k] = inp[k]
+
+    extras = [c for c in inp.columns if c not in CROP_RESULT_COLUMNS and c not in CROP_INPUT_COLUMNS]
+    if extras:
+        out = pd.concat([inp[extras], out], axis=1)
+    return out
+
+
+def compute_crop(inp: CropInput) -> CropResult:
+    """Versão escalar (um CropInput de read_soja/read_milho) — delega para compute_crops."""
+    return CropResult.from_frame(compute_crops(pd.DataFrame([inp])))[0]
+
+
+def consolidate_crops(res: pd.DataFrame) -> dict:
+    """Totais consolidados a partir do frame de compute_crops (qualquer nº de fazendas/culturas)."""
+    receita_total = float(res["receita"].sum())
+    producao_total = float(res["producao_sc"].sum())
+    custo_total = float(res["custo_total"].sum())
+    lucro_total = float(res["lucro"].sum())
+    juros_total = float(res["juros"].sum())
+
+    # Área física: maior área ocupada em uma safra, por fazenda (mesma área roda 2x no ano)
+    if "fazenda" in res.columns:
+        area_fisica = float(res.groupby("fazenda")["area_total"].max().sum())
+    else:
+        area_fisica = float(res["area_total"].max()) if len(res) else 0.0
+
+    return {
+        "area_fisica": area_fisica,
+        "area_plantada_ano": float(res["area_total"].sum()),
+        "producao_total": producao_total,
+        "receita_total": receita_total,
+        "arr_total": float(res["arr_custo"].sum()),
+        "custo_op_total": float(res["custo_op_total"].sum()),
+        "juros_total": juros_total,
+        "custo_total": custo_total,
+        "lucro_total": lucro_total,
+        "margem_total": (lucro_total / receita_total) if receita_total > 0 else 0.0,
+        "preco_medio_pond": (receita_total / producao_total) if producao_total > 0 else 0.0,
+        "roi_sobre_custo": (lucro_total / custo_total) if custo_total > 0 else 0.0,
+        "juros_pct_receita": (juros_total / receita_total) if receita_total > 0 else 0.0,
+        # Meta consolidada (ponderada por receita)
+        "meta_margem_pond": float((res["margem_alvo"] * res["receita"]).sum() / receita_total) if receita_total > 0 else 0.0,
     }
 
 
-def build_dre_table(res: dict) -> pd.DataFrame:
-    receita = res["receita"]
-    custo_op = res["custo_op_total"]
-    arr = res["arr_custo"]
-    juros = res["juros"]
-    lucro = res["lucro"]
+@em_cache  # só roda quando a aba da DRE é aberta; reabrir a aba não recalcula
+def build_dre_table(res: CropResult) -> pd.DataFrame:
+    receita = res.receita
+    custo_op = res.custo_op_total
+    arr = res.arr_custo
+    juros = res.juros
+    lucro = res.lucro
 
     # DRE Caixa (contábil simplificado)
     dre = [
@@ -434,35 +516,33 @@ def insight_box(title: str, body_html: str):
 inp_soja = read_soja()
 inp_milho = read_milho()
 
-res_soja = compute_crop(inp_soja)
-res_milho = compute_crop(inp_milho)
+# Uma linha por fazenda×cultura (hoje: SOJA e MILHO da sessão) — tudo calculado em bloco
+df_res = compute_crops(pd.DataFrame([inp_soja, inp_milho]))
+res_soja, res_milho = CropResult.from_frame(df_res)
 
-# Consolidado
-area_fisica = max(res_soja["area_total"], res_milho["area_total"])
-area_plantada_ano = res_soja["area_total"] + res_milho["area_total"]
+# Consolidado (agregado a partir do frame)
+cons = consolidate_crops(df_res)
+area_fisica = cons["area_fisica"]
+area_plantada_ano = cons["area_plantada_ano"]
 
-producao_total = res_soja["producao_sc"] + res_milho["producao_sc"]
-receita_total = res_soja["receita"] + res_milho["receita"]
-arr_total = res_soja["arr_custo"] + res_milho["arr_custo"]
+producao_total = cons["producao_total"]
+receita_total = cons["receita_total"]
+arr_total = cons["arr_total"]
 
-custo_op_total = res_soja["custo_op_total"] + res_milho["custo_op_total"]
-juros_total = res_soja["juros"] + res_milho["juros"]
-custo_total = res_soja["custo_total"] + res_milho["custo_total"]
-lucro_total = res_soja["lucro"] + res_milho["lucro"]
+custo_op_total = cons["custo_op_total"]
+juros_total = cons["juros_total"]
+custo_total = cons["custo_total"]
+lucro_total = cons["lucro_total"]
 
-margem_total = (lucro_total / receita_total) if receita_total > 0 else 0.0
-preco_medio_pond = (receita_total / producao_total) if producao_total > 0 else 0.0
+margem_total = cons["margem_total"]
+preco_medio_pond = cons["preco_medio_pond"]
 
 # Métricas adicionais
-roi_sobre_custo = (lucro_total / custo_total) if custo_total > 0 else 0.0
-juros_pct_receita = (juros_total / receita_total) if receita_total > 0 else 0.0
+roi_sobre_custo = cons["roi_sobre_custo"]
+juros_pct_receita = cons["juros_pct_receita"]
 
 # Meta consolidada (ponderada por receita)
-meta_margem_pond = 0.0
-if receita_total > 0:
-    meta_margem_pond = (
-        res_soja["margem_alvo"] * res_soja["receita"] + res_milho["margem_alvo"] * res_milho["receita"]
-    ) / receita_total
+meta_margem_pond = cons["meta_margem_pond"]
 
 # ============================================================
 # HEADER
@@ -492,7 +572,7 @@ with r1c1:
     kpi_card(
         "📍 Área Física (máx.)",
         fmt_ha(area_fisica),
-        f"Soja: {fmt_ha(res_soja['area_total'])} | Milho: {fmt_ha(res_milho['area_total'])}",
+        f"Soja: {fmt_ha(res_soja.area_total)} | Milho: {fmt_ha(res_milho.area_total)}",
     )
 with r1c2:
     kpi_card("🧾 Área Plantada no Ano", fmt_ha(area_plantada_ano), "Soja + Milho (2ª safra)", "#2a3d2f")
@@ -500,7 +580,7 @@ with r1c3:
     kpi_card(
         "🌾 Produção Total",
         f"{fmt_int(producao_total)} sc",
-        f"Soja: {fmt_int(res_soja['producao_sc'])} | Milho: {fmt_int(res_milho['producao_sc'])}",
+        f"Soja: {fmt_int(res_soja.producao_sc)} | Milho: {fmt_int(res_milho.producao_sc)}",
         "#1b5e20",
     )
 
@@ -511,7 +591,7 @@ with r2c2:
     kpi_card(
         "📈 Receita Bruta",
         f"R$ {fmt_brl(receita_total)}",
-        f"Soja: R$ {fmt_brl(res_soja['receita'])} | Milho: R$ {fmt_brl(res_milho['receita'])}",
+        f"Soja: R$ {fmt_brl(res_soja.receita)} | Milho: R$ {fmt_brl(res_milho.receita)}",
         "#1f7a1f",
     )
 with r2c3:
@@ -533,55 +613,36 @@ st.markdown('<div class="section-card">', unsafe_allow_html=True)
 st.markdown('<div class="section-title">📌 KPIs por Cultura</div>', unsafe_allow_html=True)
 st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
 
-kpi_df = pd.DataFrame([
-    {
-        "Cultura": res_soja["cultura"],
-        "Área (ha)": res_soja["area_total"],
-        "Produtividade (sc/ha)": res_soja["prod_sc_ha"],
-        "Produção (sc)": res_soja["producao_sc"],
-        "Preço Médio (R$/sc)": res_soja["preco_medio"],
-        "Receita (R$)": res_soja["receita"],
-        "Custo Operacional (R$)": res_soja["custo_op_total"],
-        "Arrendamento (R$)": res_soja["arr_custo"],
-        "Juros (R$)": res_soja["juros"],
-        "Custo Total (R$)": res_soja["custo_total"],
-        "Lucro (R$)": res_soja["lucro"],
-        "Lucro/ha (R$/ha)": res_soja["lucro_ha"],
-        "Margem": res_soja["margem"],
-        "Breakeven 0x0 (R$/sc)": res_soja["breakeven"],
-        "Preço p/ Meta (R$/sc)": res_soja["preco_req_margem"],
-        "% Travado": res_soja["pct_travado"],
-    },
-    {
-        "Cultura": res_milho["cultura"],
-        "Área (ha)": res_milho["area_total"],
-        "Produtividade (sc/ha)": res_milho["prod_sc_ha"],
-        "Produção (sc)": res_milho["producao_sc"],
-        "Preço Médio (R$/sc)": res_milho["preco_medio"],
-        "Receita (R$)": res_milho["receita"],
-        "Custo Operacional (R$)": res_milho["custo_op_total"],
-        "Arrendamento (R$)": res_milho["arr_custo"],
-        "Juros (R$)": res_milho["juros"],
-        "Custo Total (R$)": res_milho["custo_total"],
-        "Lucro (R$)": res_milho["lucro"],
-        "Lucro/ha (R$/ha)": res_milho["lucro_ha"],
-        "Margem": res_milho["margem"],
-        "Breakeven 0x0 (R$/sc)": res_milho["breakeven"],
-        "Preço p/ Meta (R$/sc)": res_milho["preco_req_margem"],
-        "% Travado": res_milho["pct_travado"],
-    },
-])
+KPI_COLUMNS = {
+    "cultura": "Cultura",
+    "area_total": "Área (ha)",
+    "prod_sc_ha": "Produtividade (sc/ha)",
+    "producao_sc": "Produção (sc)",
+    "preco_medio": "Preço Médio (R$/sc)",
+    "receita": "Receita (R$)",
+    "custo_op_total": "Custo Operacional (R$)",
+    "arr_custo": "Arrendamento (R$)",
+    "juros": "Juros (R$)",
+    "custo_total": "Custo Total (R$)",
+    "lucro": "Lucro (R$)",
+    "lucro_ha": "Lucro/ha (R$/ha)",
+    "margem": "Margem",
+    "breakeven": "Breakeven 0x0 (R$/sc)",
+    "preco_req_margem": "Preço p/ Meta (R$/sc)",
+    "pct_travado": "% Travado",
+}
+kpi_df = df_res[list(KPI_COLUMNS)].rename(columns=KPI_COLUMNS)
 
 # Format friendly
 show_df = kpi_df.copy()
 for c in ["Área (ha)", "Produtividade (sc/ha)", "Produção (sc)"]:
-    show_df[c] = show_df[c].apply(lambda v: fmt_int(v))
+    show_df[c] = fmt_int_col(show_df[c])
 for c in ["Preço Médio (R$/sc)", "Breakeven 0x0 (R$/sc)", "Preço p/ Meta (R$/sc)"]:
-    show_df[c] = show_df[c].apply(lambda v: fmt_brl(v))
+    show_df[c] = fmt_brl_col(show_df[c])
 for c in ["Receita (R$)", "Custo Operacional (R$)", "Arrendamento (R$)", "Juros (R$)", "Custo Total (R$)", "Lucro (R$)", "Lucro/ha (R$/ha)"]:
-    show_df[c] = show_df[c].apply(lambda v: fmt_brl(v))
-show_df["Margem"] = show_df["Margem"].apply(fmt_pct)
-show_df["% Travado"] = show_df["% Travado"].apply(fmt_pct)
+    show_df[c] = fmt_brl_col(show_df[c])
+show_df["Margem"] = fmt_pct_col(show_df["Margem"])
+show_df["% Travado"] = fmt_pct_col(show_df["% Travado"])
 
 st.dataframe(show_df, use_container_width=True, hide_index=True)
 
@@ -590,7 +651,7 @@ col_a, col_b = st.columns(2)
 
 with col_a:
     fig = go.Figure(data=[
-        go.Bar(name="Lucro/ha", x=["SOJA", "MILHO"], y=[res_soja["lucro_ha"], res_milho["lucro_ha"]]),
+        go.Bar(name="Lucro/ha", x=df_res["cultura"], y=df_res["lucro_ha"]),
     ])
     fig.update_layout(title="Comparativo: Lucro Líquido por Hectare (R$/ha)", height=360, margin=dict(l=10,r=10,t=50,b=10))
     fig.update_yaxes(title="R$/ha")
@@ -598,7 +659,7 @@ with col_a:
 
 with col_b:
     fig2 = go.Figure(data=[
-        go.Bar(name="Margem", x=["SOJA", "MILHO"], y=[res_soja["margem"]*100, res_milho["margem"]*100]),
+        go.Bar(name="Margem", x=df_res["cultura"], y=df_res["margem"] * 100),
     ])
     fig2.update_layout(title="Comparativo: Margem Líquida (%)", height=360, margin=dict(l=10,r=10,t=50,b=10))
     fig2.update_yaxes(title="%")
@@ -633,7 +694,7 @@ row = [
 
 df_dre = pd.DataFrame(row, columns=["Linha", "Valor (R$)"])
 show_dre = df_dre.copy()
-show_dre["Valor (R$)"] = show_dre["Valor (R$)"].apply(fmt_brl)
+show_dre["Valor (R$)"] = fmt_brl_col(show_dre["Valor (R$)"])
 
 c1, c2 = st.columns([1.2, 1])
 
@@ -658,16 +719,14 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-# DRE por cultura (tabs)
-t1, t2 = st.tabs(["DRE SOJA", "DRE MILHO"])
-with t1:
-    df = build_dre_table(res_soja).copy()
-    df["Valor (R$)"] = df["Valor (R$)"].apply(fmt_brl)
-    st.dataframe(df, use_container_width=True, hide_index=True)
-with t2:
-    df = build_dre_table(res_milho).copy()
-    df["Valor (R$)"] = df["Valor (R$)"].apply(fmt_brl)
-    st.dataframe(df, use_container_width=True, hide_index=True)
+# DRE por cultura (tabs sob demanda: só a aba aberta monta a tabela; a DRE fica em cache)
+t1, t2 = st.tabs(["DRE SOJA", "DRE MILHO"], key="_sm_aba_dre", on_change="rerun")
+for aba, res in ((t1, res_soja), (t2, res_milho)):
+    with aba:
+        if aba.open:
+            df = build_dre_table(res).copy()
+            df["Valor (R$)"] = fmt_brl_col(df["Valor (R$)"])
+            st.dataframe(df, use_container_width=True, hide_index=True)
 
 st.markdown('</div>', unsafe_allow_html=True)
 
@@ -679,34 +738,26 @@ st.markdown('<div class="section-card">', unsafe_allow_html=True)
 st.markdown('<div class="section-title">🏦 Financeiro & Liquidez (Custeio + Insumos)</div>', unsafe_allow_html=True)
 st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
 
-fin_df = pd.DataFrame([
-    {
-        "Cultura": res_soja["cultura"],
-        "Principal (base)": res_soja["principal_fin"],
-        "Juros": res_soja["juros"],
-        "Dias": res_soja["dias"],
-        "Desembolso": res_soja["data_desembolso"].isoformat() if isinstance(res_soja["data_desembolso"], date) else str(res_soja["data_desembolso"]),
-        "Pagamento": res_soja["data_pagamento"].isoformat() if isinstance(res_soja["data_pagamento"], date) else str(res_soja["data_pagamento"]),
-        "% Travado": res_soja["pct_travado"],
-        "Spot (exposição)": res_soja["pct_spot"],
-    },
-    {
-        "Cultura": res_milho["cultura"],
-        "Principal (base)": res_milho["principal_fin"],
-        "Juros": res_milho["juros"],
-        "Dias": res_milho["dias"],
-        "Desembolso": res_milho["data_desembolso"].isoformat() if isinstance(res_milho["data_desembolso"], date) else str(res_milho["data_desembolso"]),
-        "Pagamento": res_milho["data_pagamento"].isoformat() if isinstance(res_milho["data_pagamento"], date) else str(res_milho["data_pagamento"]),
-        "% Travado": res_milho["pct_travado"],
-        "Spot (exposição)": res_milho["pct_spot"],
-    },
-])
+def _fmt_date_col(col: pd.Series) -> pd.Series:
+    return col.apply(lambda d: d.isoformat() if isinstance(d, date) else str(d))
+
+
+fin_df = pd.DataFrame({
+    "Cultura": df_res["cultura"],
+    "Principal (base)": df_res["principal_fin"],
+    "Juros": df_res["juros"],
+    "Dias": df_res["dias"],
+    "Desembolso": _fmt_date_col(df_res["data_desembolso"]),
+    "Pagamento": _fmt_date_col(df_res["data_pagamento"]),
+    "% Travado": df_res["pct_travado"],
+    "Spot (exposição)": df_res["pct_spot"],
+})
 
 show_fin = fin_df.copy()
-show_fin["Principal (base)"] = show_fin["Principal (base)"].apply(fmt_brl)
-show_fin["Juros"] = show_fin["Juros"].apply(fmt_brl)
-show_fin["% Travado"] = show_fin["% Travado"].apply(fmt_pct)
-show_fin["Spot (exposição)"] = show_fin["Spot (exposição)"].apply(fmt_pct)
+show_fin["Principal (base)"] = fmt_brl_col(show_fin["Principal (base)"])
+show_fin["Juros"] = fmt_brl_col(show_fin["Juros"])
+show_fin["% Travado"] = fmt_pct_col(show_fin["% Travado"])
+show_fin["Spot (exposição)"] = fmt_pct_col(show_fin["Spot (exposição)"])
 
 st.dataframe(show_fin, use_container_width=True, hide_index=True)
 
@@ -718,24 +769,24 @@ def add_event(events, cultura, tipo, data_evt, valor):
     events.append({"Data": data_evt, "Cultura": cultura, "Tipo": tipo, "Valor (R$)": valor})
 
 
-def build_events(res: dict) -> list:
+def build_events(res: CropResult) -> list:
     events = []
     # Insumos pagos em 3 parcelas sobre o custo de insumos (aproximação)
-    insumos_total = res["custo_insumos"]
+    insumos_total = res.custo_insumos
     # Entrada: usamos 1º dia do mês de plantio no ano do desembolso
     try:
-        ano_base = res["data_desembolso"].year if isinstance(res["data_desembolso"], date) else date.today().year
-        data_plantio = date(ano_base, int(res["mes_plantio"]), 1)
+        ano_base = res.data_desembolso.year if isinstance(res.data_desembolso, date) else date.today().year
+        data_plantio = date(ano_base, int(res.mes_plantio), 1)
     except Exception:
         data_plantio = None
 
-    add_event(events, res["cultura"], "Insumos - Entrada", data_plantio, insumos_total * res["p_entrada_pct"])
-    add_event(events, res["cultura"], "Insumos - P2", res["p2_data"], insumos_total * res["p2_pct"])
-    add_event(events, res["cultura"], "Insumos - P3", res["p3_data"], insumos_total * res["p3_pct"])
+    add_event(events, res.cultura, "Insumos - Entrada", data_plantio, insumos_total * res.p_entrada_pct)
+    add_event(events, res.cultura, "Insumos - P2", res.p2_data, insumos_total * res.p2_pct)
+    add_event(events, res.cultura, "Insumos - P3", res.p3_data, insumos_total * res.p3_pct)
 
     # Custeio: pagamento (principal + juros) na data de pagamento
-    add_event(events, res["cultura"], "Custeio - Principal", res["data_pagamento"], res["principal_fin"])
-    add_event(events, res["cultura"], "Custeio - Juros", res["data_pagamento"], res["juros"])
+    add_event(events, res.cultura, "Custeio - Principal", res.data_pagamento, res.principal_fin)
+    add_event(events, res.cultura, "Custeio - Juros", res.data_pagamento, res.juros)
 
     return events
 
@@ -746,7 +797,7 @@ df_evt = pd.DataFrame(events)
 if not df_evt.empty:
     df_evt = df_evt.sort_values("Data")
     df_evt["Data"] = df_evt["Data"].apply(lambda d: d.strftime("%d/%m/%Y") if isinstance(d, date) else str(d))
-    df_evt["Valor (R$)"] = df_evt["Valor (R$)"].apply(fmt_brl)
+    df_evt["Valor (R$)"] = fmt_brl_col(df_evt["Valor (R$)"])
     st.markdown("<div class='small'>Calendário aproximado de saídas (insumos + custeio). Serve como visão macro; detalhes finos permanecem nas páginas individuais.</div>", unsafe_allow_html=True)
     st.dataframe(df_evt, use_container_width=True, hide_index=True)
 else:
@@ -763,13 +814,13 @@ st.markdown('<div class="section-title">🧠 Inteligência & Analytics (insights
 st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
 
 # Ranking por rentabilidade
-melhor = res_soja if res_soja["lucro_ha"] >= res_milho["lucro_ha"] else res_milho
+melhor = res_soja if res_soja.lucro_ha >= res_milho.lucro_ha else res_milho
 pior = res_milho if melhor is res_soja else res_soja
 
 # Drivers
 msg_rank = (
-    f"<b>Produto mais rentável por hectare:</b> <span class='positive'>{melhor['cultura']}</span><br/>"
-    f"Diferença aproximada: <b>{fmt_brl(melhor['lucro_ha'] - pior['lucro_ha'])}/ha</b>."
+    f"<b>Produto mais rentável por hectare:</b> <span class='positive'>{melhor.cultura}</span><br/>"
+    f"Diferença aproximada: <b>{fmt_brl(melhor.lucro_ha - pior.lucro_ha)}/ha</b>."
 )
 
 # Alertas consolidados
@@ -781,30 +832,30 @@ if juros_pct_receita > 0.03:
     alerts.append(f"Juros relevantes ({fmt_pct(juros_pct_receita)} da receita). Avalie prazo/volume financiado.")
 
 # Break-even vs mercado
-if res_soja["breakeven"] > res_soja["preco_medio"]:
-    alerts.append(f"SOJA: preço médio ({fmt_brl(res_soja['preco_medio'])}/sc) abaixo do 0x0 ({fmt_brl(res_soja['breakeven'])}/sc).")
-if res_milho["breakeven"] > res_milho["preco_medio"]:
-    alerts.append(f"MILHO: preço médio ({fmt_brl(res_milho['preco_medio'])}/sc) abaixo do 0x0 ({fmt_brl(res_milho['breakeven'])}/sc).")
+if res_soja.breakeven > res_soja.preco_medio:
+    alerts.append(f"SOJA: preço médio ({fmt_brl(res_soja.preco_medio)}/sc) abaixo do 0x0 ({fmt_brl(res_soja.breakeven)}/sc).")
+if res_milho.breakeven > res_milho.preco_medio:
+    alerts.append(f"MILHO: preço médio ({fmt_brl(res_milho.preco_medio)}/sc) abaixo do 0x0 ({fmt_brl(res_milho.breakeven)}/sc).")
 
 # Exposição spot
-if res_soja["pct_spot"] > 0.6:
-    alerts.append(f"SOJA: alta exposição ao spot ({fmt_pct(res_soja['pct_spot'])}).")
-if res_milho["pct_spot"] > 0.6:
-    alerts.append(f"MILHO: alta exposição ao spot ({fmt_pct(res_milho['pct_spot'])}).")
+if res_soja.pct_spot > 0.6:
+    alerts.append(f"SOJA: alta exposição ao spot ({fmt_pct(res_soja.pct_spot)}).")
+if res_milho.pct_spot > 0.6:
+    alerts.append(f"MILHO: alta exposição ao spot ({fmt_pct(res_milho.pct_spot)}).")
 
 alert_html = "<ul>" + "".join([f"<li>{a}</li>" for a in alerts]) + "</ul>" if alerts else "<span class='positive'>Sem alertas críticos nos indicadores principais.</span>"
 
 # Stress rápido: choque de preço -5% e produtividade -5%
 
-def stress(res: dict, choque_preco=-0.05, choque_prod=-0.05):
+def stress(res: CropResult, choque_preco=-0.05, choque_prod=-0.05):
     # aplica choques em preço médio e produtividade/produção (mantendo custos)
-    receita_stress = res["receita"] * (1.0 + choque_preco) * (1.0 + choque_prod)
-    lucro_stress = receita_stress - res["custo_total"]
+    receita_stress = res.receita * (1.0 + choque_preco) * (1.0 + choque_prod)
+    lucro_stress = receita_stress - res.custo_total
     return lucro_stress
 
-lucro_stress_p = stress({**res_soja, "receita": receita_total, "custo_total": custo_total}, -0.05, 0.0)
+lucro_stress_p = stress(res_soja._replace(receita=receita_total, custo_total=custo_total), -0.05, 0.0)
 # acima: consolidado (apenas preço), depois preço+prod
-lucro_stress_pp = stress({**res_soja, "receita": receita_total, "custo_total": custo_total}, -0.05, -0.05)
+lucro_stress_pp = stress(res_soja._replace(receita=receita_total, custo_total=custo_total), -0.05, -0.05)
 
 insights_left, insights_right = st.columns([1.2, 1])
 
@@ -832,7 +883,7 @@ with insights_right:
 
 delta_preco_1 = producao_total * 1.0
 avg_price = preco_medio_pond
-avg_area = area_fisica if area_fisica > 0 else (res_soja["area_total"] + res_milho["area_total"])
+avg_area = area_fisica if area_fisica > 0 else (res_soja.area_total + res_milho.area_total)
 delta_prod_1 = avg_area * avg_price
 
 st.markdown(
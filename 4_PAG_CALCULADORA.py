@@ -1,5 +1,7 @@
 import streamlit as st
 
+from agro_estilo import aplicar_estilo
+
 st.set_page_config(page_title="Calculadora Premium", layout="wide", page_icon="🧮")
 
 st.title("🧮 Calculadora Premium")
@@ -8,109 +10,7 @@ st.caption("Página carregou corretamente ✅")
 # ==============================================================================
 # ESTILIZAÇÃO CSS (DESIGN SYSTEM PREMIUM)
 # ==============================================================================
-st.markdown("""
-    <style>
-    /* Fundo geral e container */
-    .main { background-color: #f4f6f8; }
-    .block-container { padding: 1.5rem 1rem !important; }
-    
-    /* Cabeçalho de Mês (Estilo Cartão Robusto) */
-    .month-header {
-        background: linear-gradient(135deg, #1b5e20 0%, #2e7d32 100%);
-        color: white; 
-        padding: 10px; 
-        text-align: center; 
-        font-weight: 700; 
-        font-size: 0.95rem; 
-        border-radius: 6px; 
-        box-shadow: 0 4px 6px rgba(0,0,0,0.15); 
-        margin-bottom: 12px;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-    }
-    
-    /* Rótulos (Labels) - Ajustados para não cortar */
-    .field-label { 
-        font-size: 10.5px; 
-        font-weight: 700; 
-        color: #37474f; 
-        display: flex; 
-        align-items: center; 
-        height: 32px; /* Alinha verticalmente com o input */
-        white-space: nowrap; /* Impede quebra de linha feia */
-    }
-    
-    /* Seções com divisórias e Ícones */
-    .section-tag {
-        font-size: 10px; 
-        font-weight: 800; 
-        color: #1b5e20;
-        border-bottom: 2px solid #e0e0e0; 
-        margin: 15px 0 8px 0;
-        padding-bottom: 4px; 
-        display: flex; 
-        align-items: center; 
-        gap: 6px;
-        text-transform: uppercase;
-    }
-    
-    /* Inputs (Caixas de número) */
-    div[data-testid="stNumberInput"] { margin-bottom: -16px !important; }
-    div[data-testid="stNumberInput"] input { 
-        height: 32px !important; 
-        font-size: 12px !important; 
-        border-radius: 4px !important;
-        border: 1px solid #cfd8dc;
-        background-color: #fff;
-        font-weight: 600;
-        color: #263238;
-    }
-    div[data-testid="stNumberInput"] input:focus {
-        border-color: #2e7d32;
-        box-shadow: 0 0 0 1px #2e7d32;
-    }
-    
-    /* Cards de Resultado (Rodapé) */
-    .result-card {
-        background: white; 
-        border-radius: 6px; 
-        padding: 10px 12px; 
-        margin-top: 10px; 
-        border: 1px solid #eceff1; 
-        border-left: 5px solid #1b5e20; 
-        box-shadow: 0 2px 5px rgba(0,0,0,0.05);
-        transition: transform 0.2s;
-    }
-    .result-card:hover { transform: translateY(-2px); box-shadow: 0 5px 10px rgba(0,0,0,0.1); }
-    
-    .res-title { 
-        font-size: 9px; 
-        color: #78909c; 
-        text-transform: uppercase; 
-        font-weight: 700; 
-        margin-bottom: 4px;
-        letter-spacing: 0.5px;
-    }
-    .res-value { 
-        font-size: 15px; 
-        font-weight: 800; 
-        color: #1b5e20; 
-        display: flex; 
-        justify-content: space-between; 
-        align-items: center;
-    }
-    .res-unit {
-        font-size: 10px;
-        color: #546e7a;
-        background: #eceff1;
-        padding: 2px 4px;
-        border-radius: 4px;
-    }
-
-    /* Ajuste fino de colunas do Streamlit */
-    [data-testid="column"] { padding: 0 5px !important; }
-    </style>
-    """, unsafe_allow_html=True)
+aplicar_estilo("agro_calculadora.css")
 
 # Título
 st.markdown("<h2 style='color: #1b5e20; margin-bottom: 25px; border-bottom: 1px solid #ddd; padding-bottom: 10px;'>🍃 Calculadora <span style='font-weight: 300; color: #555;'>Premium</span></h2>", unsafe_allow_html=True)
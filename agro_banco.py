@@ -0,0 +1,262 @@
+# agro_banco.py
+# AgroExposure — Estado dos usuários em SQLite (WAL), por perfil e fazenda
+#
+# Todas as sessões liam e gravavam o mesmo agro_state.json: com vários agrônomos conectados,
+# a sidebar de um sobrescrevia a do outro. Aqui o estado fica num banco SQLite embutido:
+# - gravar só acrescenta ao diário (tabela diario) uma linha por chave alterada: chave, valor
+#   anterior, valor novo, momento e sessão — custo proporcional à alteração, não ao estado;
+# - a tabela estado é o retrato compactado: a cada COMPACTAR_APOS linhas novas de um perfil/
+#   fazenda, o diário é dobrado nela (último valor de cada chave) e a leitura passa a ser
+#   retrato + cauda do diário. O diário nunca é apagado: historico() devolve a evolução do
+#   plano ao longo da safra, pronta para ser reproduzida;
+# - modo WAL: leituras não bloqueiam a escrita (e vice-versa), inclusive entre processos;
+# - uma conexão por arquivo por processo (banco()), compartilhada pelas sessões sob um lock;
+# - versao(): muda a cada gravação (deste processo ou de outro), para quem guarda o estado lido;
+# - biblioteca de cenários (agro_cenarios): versões nomeadas e imutáveis. O índice (nome,
+#   versão, data, nº de campos) fica numa tabela e o corpo JSON noutra, então listar não lê
+#   nenhum corpo e carregar é uma busca pela chave.
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS estado (
+    perfil     TEXT NOT NULL,
+    fazenda    TEXT NOT NULL,
+    chave      TEXT NOT NULL,
+    valor      TEXT NOT NULL,
+    atualizado REAL NOT NULL,
+    PRIMARY KEY (perfil, fazenda, chave)
+) WITHOUT ROWID
+"""
+
+_ESQUEMA_CENARIOS = """
+CREATE TABLE IF NOT EXISTS cenario (
+    id       INTEGER PRIMARY KEY,
+    perfil   TEXT NOT NULL,
+    fazenda  TEXT NOT NULL,
+    cultura  TEXT NOT NULL,
+    nome     TEXT NOT NULL,
+    versao   INTEGER NOT NULL,
+    criado   REAL NOT NULL,
+    n_chaves INTEGER NOT NULL,
+    UNIQUE (perfil, fazenda, cultura, nome, versao)
+);
+CREATE TABLE IF NOT EXISTS cenario_corpo (
+    id    INTEGER PRIMARY KEY,
+    corpo TEXT NOT NULL
+);
+"""
+
+_ESQUEMA_DIARIO = """
+CREATE TABLE IF NOT EXISTS diario (
+    seq     INTEGER PRIMARY KEY,
+    perfil  TEXT NOT NULL,
+    fazenda TEXT NOT NULL,
+    chave   TEXT NOT NULL,
+    antes   TEXT,
+    depois  TEXT NOT NULL,
+    momento REAL NOT NULL,
+    sessao  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS diario_chave ON diario (perfil, fazenda, chave, seq);
+CREATE INDEX IF NOT EXISTS diario_seq ON diario (perfil, fazenda, seq);
+CREATE TABLE IF NOT EXISTS compactado (
+    perfil  TEXT NOT NULL,
+    fazenda TEXT NOT NULL,
+    ate_seq INTEGER NOT NULL,
+    PRIMARY KEY (perfil, fazenda)
+) WITHOUT ROWID;
+"""
+
+# Linhas do diário por perfil/fazenda que disparam a compactação
+COMPACTAR_APOS = 500
+
+# Valor anterior = última linha do diário para a chave (ou o retrato, em bancos de antes do
+# diário); chaves que não mudaram de fato não geram linha
+_ANEXAR = """
+INSERT INTO diario (perfil, fazenda, chave, antes, depois, momento, sessao)
+SELECT :perfil, :fazenda, :chave, atual.valor, :valor, :momento, :sessao
+FROM (SELECT COALESCE(
+    (SELECT depois FROM diario WHERE perfil = :perfil AND fazenda = :fazenda AND chave = :chave ORDER BY seq DESC LIMIT 1),
+    (SELECT valor FROM estado WHERE perfil = :perfil AND fazenda = :fazenda AND chave = :chave)
+) AS valor) AS atual
+WHERE atual.valor IS NOT :valor
+"""
+
+_UPSERT = """
+INSERT INTO estado (perfil, fazenda, chave, valor, atualizado) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (perfil, fazenda, chave) DO UPDATE SET valor = excluded.valor, atualizado = excluded.atualizado
+"""
+
+
+class BancoEstado:
+    """Conexão única (por processo) a um banco de estado; todos os métodos são thread-safe."""
+
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+        self._lock = threading.Lock()
+        self._gravacoes = {}
+        self._con = sqlite3.connect(self.caminho, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=NORMAL")
+        self._con.execute(_ESQUEMA)
+        self._con.executescript(_ESQUEMA_CENARIOS)
+        self._con.executescript(_ESQUEMA_DIARIO)
+        self._migrar_para_diario()
+
+    def _migrar_para_diario(self) -> None:
+        """Banco criado antes do diário: o estado vira a primeira linha de cada chave, já compactada."""
+        with self._con:
+            self._con.execute("BEGIN IMMEDIATE")
+            if self._con.execute("SELECT 1 FROM diario LIMIT 1").fetchone() is None:
+                self._con.execute(
+                    "INSERT INTO diario (perfil, fazenda, chave, antes, depois, momento, sessao) "
+                    "SELECT perfil, fazenda, chave, NULL, valor, atualizado, '' FROM estado ORDER BY atualizado"
+                )
+                self._con.execute(
+                    "INSERT OR REPLACE INTO compactado SELECT perfil, fazenda, MAX(seq) FROM diario GROUP BY perfil, fazenda"
+                )
+
+    def _ate_seq(self, perfil: str, fazenda: str) -> int:
+        linha = self._con.execute(
+            "SELECT ate_seq FROM compactado WHERE perfil = ? AND fazenda = ?", (perfil, fazenda)
+        ).fetchone()
+        return linha[0] if linha else 0
+
+    def ler(self, perfil: str, fazenda: str) -> dict:
+        """Chaves gravadas de (perfil, fazenda) — retrato + cauda do diário —, valores já decodificados."""
+        with self._lock:
+            with self._con:
+                self._con.execute("BEGIN")  # retrato e cauda da mesma versão do banco
+                dados = dict(self._con.execute(
+                    "SELECT chave, valor FROM estado WHERE perfil = ? AND fazenda = ?", (perfil, fazenda)
+                ).fetchall())
+                dados.update(self._con.execute(
+                    "SELECT chave, depois FROM diario WHERE perfil = ? AND fazenda = ? AND seq > ? ORDER BY seq",
+                    (perfil, fazenda, self._ate_seq(perfil, fazenda)),
+                ).fetchall())
+        return {k: json.loads(v) for k, v in dados.items()}
+
+    def gravar(self, perfil: str, fazenda: str, alteracoes: dict, sessao: str = "") -> None:
+        """Acrescenta ao diário uma linha por chave de `alteracoes`, numa única transação."""
+        agora = time.time()
+        # Serializa antes da transação: um valor inválido não deixa a transação pela metade
+        linhas = [
+            {"perfil": perfil, "fazenda": fazenda, "chave": str(k), "valor": json.dumps(v, ensure_ascii=False),
+             "momento": agora, "sessao": sessao}
+            for k, v in alteracoes.items()
+        ]
+        with self._lock:
+            with self._con:
+                self._con.execute("BEGIN IMMEDIATE")
+                self._con.executemany(_ANEXAR, linhas)
+                cauda = self._con.execute(
+                    "SELECT COUNT(*) FROM diario WHERE perfil = ? AND fazenda = ? AND seq > ?",
+                    (perfil, fazenda, self._ate_seq(perfil, fazenda)),
+                ).fetchone()[0]
+                if cauda >= COMPACTAR_APOS:
+                    self._compactar(perfil, fazenda)
+            self._gravacoes[(perfil, fazenda)] = self._gravacoes.get((perfil, fazenda), 0) + 1
+
+    def _compactar(self, perfil: str, fazenda: str) -> None:
+        # Dentro de uma transação, com o lock: dobra a cauda no retrato (a última linha de cada chave vence)
+        ultimos = {}
+        for seq, chave, depois, momento in self._con.execute(
+            "SELECT seq, chave, depois, momento FROM diario WHERE perfil = ? AND fazenda = ? AND seq > ? ORDER BY seq",
+            (perfil, fazenda, self._ate_seq(perfil, fazenda)),
+        ):
+            ultimos[chave] = (perfil, fazenda, chave, depois, momento)
+        if not ultimos:
+            return
+        self._con.executemany(_UPSERT, list(ultimos.values()))
+        self._con.execute(
+            "INSERT OR REPLACE INTO compactado (perfil, fazenda, ate_seq) VALUES (?, ?, ?)", (perfil, fazenda, seq)
+        )
+
+    def compactar(self, perfil: str, fazenda: str) -> None:
+        """Dobra agora o diário de (perfil, fazenda) no retrato (o estado lido não muda)."""
+        with self._lock:
+            with self._con:
+                self._con.execute("BEGIN IMMEDIATE")
+                self._compactar(perfil, fazenda)
+
+    def historico(self, perfil: str, fazenda: str, chave: str = None) -> list:
+        """Linhas do diário em ordem: (momento, sessão, chave, antes, depois), valores decodificados."""
+        sql = "SELECT momento, sessao, chave, antes, depois FROM diario WHERE perfil = ? AND fazenda = ?"
+        args = [perfil, fazenda]
+        if chave is not None:
+            sql += " AND chave = ?"
+            args.append(chave)
+        with self._lock:
+            linhas = self._con.execute(sql + " ORDER BY seq", args).fetchall()
+        return [
+            (momento, sessao, k, None if antes is None else json.loads(antes), json.loads(depois))
+            for momento, sessao, k, antes, depois in linhas
+        ]
+
+    def versao(self, perfil: str, fazenda: str) -> tuple:
+        """Muda quando este processo grava (perfil, fazenda) ou outro processo grava no banco.
+
+        PRAGMA data_version só acusa commits de outras conexões; os desta ficam no contador.
+        """
+        with self._lock:
+            externo = self._con.execute("PRAGMA data_version").fetchone()[0]
+            return externo, self._gravacoes.get((perfil, fazenda), 0)
+
+    def vazio(self, perfil: str, fazenda: str) -> bool:
+        with self._lock:
+            return self._con.execute(
+                "SELECT 1 FROM diario WHERE perfil = ? AND fazenda = ? LIMIT 1", (perfil, fazenda)
+            ).fetchone() is None
+
+    def salvar_cenario(self, perfil: str, fazenda: str, cultura: str, nome: str, corpo: dict) -> int:
+        """Grava `corpo` como a próxima versão do cenário `nome`; devolve o nº da versão."""
+        texto = json.dumps(corpo, ensure_ascii=False, sort_keys=True)
+        with self._lock:
+            with self._con:
+                self._con.execute("BEGIN IMMEDIATE")
+                versao = self._con.execute(
+                    "SELECT COALESCE(MAX(versao), 0) + 1 FROM cenario WHERE perfil = ? AND fazenda = ? AND cultura = ? AND nome = ?",
+                    (perfil, fazenda, cultura, nome),
+                ).fetchone()[0]
+                id_ = self._con.execute(
+                    "INSERT INTO cenario (perfil, fazenda, cultura, nome, versao, criado, n_chaves) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (perfil, fazenda, cultura, nome, versao, time.time(), len(corpo)),
+                ).lastrowid
+                self._con.execute("INSERT INTO cenario_corpo (id, corpo) VALUES (?, ?)", (id_, texto))
+        return versao
+
+    def indice_cenarios(self, perfil: str, fazenda: str, cultura: str) -> list:
+        """(nome, versão, criado, nº de campos) de cada versão salva, sem ler os corpos."""
+        with self._lock:
+            return self._con.execute(
+                "SELECT nome, versao, criado, n_chaves FROM cenario WHERE perfil = ? AND fazenda = ? AND cultura = ? ORDER BY nome, versao DESC",
+                (perfil, fazenda, cultura),
+            ).fetchall()
+
+    def ler_cenario(self, perfil: str, fazenda: str, cultura: str, nome: str, versao: int):
+        """Corpo (dict) de uma versão, ou None se não existir."""
+        with self._lock:
+            linha = self._con.execute(
+                "SELECT c.corpo FROM cenario AS i JOIN cenario_corpo AS c ON c.id = i.id "
+                "WHERE i.perfil = ? AND i.fazenda = ? AND i.cultura = ? AND i.nome = ? AND i.versao = ?",
+                (perfil, fazenda, cultura, nome, int(versao)),
+            ).fetchone()
+        return json.loads(linha[0]) if linha else None
+
+
+_BANCOS = {}
+_LOCK = threading.Lock()
+
+
+def banco(caminho) -> BancoEstado:
+    """BancoEstado de `caminho`, criado uma vez por processo."""
+    chave = str(Path(caminho).resolve())
+    with _LOCK:
+        if chave not in _BANCOS:
+            _BANCOS[chave] = BancoEstado(chave)
+        return _BANCOS[chave]
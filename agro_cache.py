@@ -0,0 +1,205 @@
+# agro_cache.py
+# AgroExposure — Cache de resultados por hash das entradas (compartilhado no processo)
+#
+# Trocar de página (SOJA -> MILHO -> Consolidado) refaz todas as contas, mesmo sem mudar
+# nenhum soja_*/milho_*. Aqui cada chamada cacheada vira uma chave = hash canônico da função
+# + argumentos (dicts ordenados, números como float, datas ISO, arrays por dtype/shape/bytes).
+# - LRU limitado (OrderedDict) por nº de itens e por tamanho aproximado em bytes (arrays por
+#   nbytes, DataFrames por memory_usage(deep=True)) — os mais recentes ficam, os antigos
+#   saem; grades de mapa de calor, Monte Carlo e curvas não levam o processo a centenas de MB;
+# - Um único cache por processo: todas as sessões do Streamlit compartilham (o plano padrão
+#   aberto por todo mundo de manhã é calculado uma vez);
+# - Contadores de acertos/faltas para acompanhar a eficácia.
+#
+# Resultados em cache são compartilhados: arrays NumPy são congelados (somente leitura) e
+# em_cache entrega a cada chamada uma cópia dos contêineres (dicts, listas, DataFrames) —
+# quem recebe pode alterá-los sem mexer no que as outras sessões leem.
+
+import functools
+import hashlib
+import struct
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+
+class _NaoCacheavel(TypeError):
+    pass
+
+
+def _alimentar(h, obj) -> None:
+    """Escreve `obj` no hash de forma canônica (independe da ordem de dicts e de int vs float)."""
+    if obj is None:
+        h.update(b"N")
+    elif isinstance(obj, (bool, np.bool_)):
+        h.update(b"B1" if obj else b"B0")
+    elif isinstance(obj, (int, float, np.integer, np.floating)):
+        h.update(b"F" + struct.pack("<d", float(obj) + 0.0))
+    elif isinstance(obj, str):
+        h.update(b"S" + obj.encode("utf-8") + b"\0")
+    elif isinstance(obj, (date, datetime, np.datetime64)):
+        h.update(b"D" + str(np.datetime64(obj)).encode() + b"\0")
+    elif isinstance(obj, dict):
+        h.update(b"{%d" % len(obj))
+        for k in sorted(obj, key=str):
+            _alimentar(h, str(k))
+            _alimentar(h, obj[k])
+    elif isinstance(obj, (list, tuple)):
+        h.update(b"[%d" % len(obj))
+        for v in obj:
+            _alimentar(h, v)
+    elif isinstance(obj, np.ndarray):
+        arr = np.ascontiguousarray(obj)
+        h.update(b"A" + str(arr.dtype).encode() + str(arr.shape).encode())
+        h.update(arr.view(np.uint8) if arr.dtype != object else repr(arr.tolist()).encode())
+    elif isinstance(obj, pd.DataFrame):
+        h.update(b"P")
+        _alimentar(h, [str(c) for c in obj.columns])
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    else:
+        raise _NaoCacheavel(type(obj).__name__)
+
+
+def chave_canonica(*partes, **nomeados) -> str:
+    """Hash estável (blake2b) de argumentos posicionais e nomeados."""
+    h = hashlib.blake2b(digest_size=20)
+    _alimentar(h, list(partes))
+    _alimentar(h, nomeados)
+    return h.hexdigest()
+
+
+def _congelar(obj):
+    """Torna arrays NumPy do resultado somente leitura (o objeto é compartilhado entre sessões)."""
+    if isinstance(obj, np.ndarray):
+        obj.setflags(write=False)
+    elif isinstance(obj, dict):
+        for v in obj.values():
+            _congelar(v)
+    elif isinstance(obj, (list, tuple)):
+        for v in obj:
+            _congelar(v)
+    return obj
+
+
+def _copia(obj):
+    """Cópia do que é mutável no resultado (dicts, listas, DataFrames/Series); arrays NumPy
+    congelados continuam compartilhados."""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return obj.copy()
+    if isinstance(obj, dict):
+        return {k: _copia(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_copia(v) for v in obj]
+    if isinstance(obj, tuple):
+        itens = [_copia(v) for v in obj]
+        return type(obj)(*itens) if hasattr(obj, "_fields") else tuple(itens)
+    return obj
+
+
+def tamanho_aproximado(obj) -> int:
+    """Bytes aproximados de um resultado (arrays e DataFrames dominam; o resto é estimado)."""
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(tamanho_aproximado(k) + tamanho_aproximado(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(tamanho_aproximado(v) for v in obj)
+    if hasattr(obj, "__dict__") and not isinstance(obj, type):
+        return sys.getsizeof(obj) + tamanho_aproximado(vars(obj))
+    return sys.getsizeof(obj)
+
+
+class CacheResultados:
+    """LRU thread-safe de resultados, limitado em itens e em bytes, com contadores de acertos
+    e faltas. Um resultado maior que o orçamento inteiro é devolvido sem entrar no cache."""
+
+    def __init__(self, max_itens: int = 256, max_bytes: int = 32 * 2**20):
+        self.max_itens = int(max_itens)
+        self.max_bytes = int(max_bytes)
+        self._itens = OrderedDict()
+        self._tamanhos = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+
+    def obter_ou_calcular(self, chave: str, calcular):
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._itens[chave]
+            self.faltas += 1
+        # Calcula fora do lock (duas sessões podem calcular o mesmo item; o resultado é igual)
+        valor = _congelar(calcular())
+        tamanho = tamanho_aproximado(valor)
+        if tamanho > self.max_bytes:
+            return valor
+        with self._lock:
+            if chave in self._itens:
+                self._bytes -= self._tamanhos[chave]
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            self._tamanhos[chave] = tamanho
+            self._bytes += tamanho
+            while len(self._itens) > self.max_itens or self._bytes > self.max_bytes:
+                antiga, _ = self._itens.popitem(last=False)
+                self._bytes -= self._tamanhos.pop(antiga)
+        return valor
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._itens.clear()
+            self._tamanhos.clear()
+            self._bytes = 0
+            self.acertos = self.faltas = 0
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            total = self.acertos + self.faltas
+            return {
+                "acertos": self.acertos,
+                "faltas": self.faltas,
+                "itens": len(self._itens),
+                "max_itens": self.max_itens,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "taxa_acerto": self.acertos / total if total else 0.0,
+            }
+
+
+# Cache único do processo (todas as sessões/páginas)
+CACHE = CacheResultados(max_itens=256, max_bytes=128 * 2**20)
+
+
+def em_cache(funcao=None, *, cache: CacheResultados = None):
+    """Envolve `funcao` para reutilizar resultados com as mesmas entradas.
+
+    Uso: `@em_cache` ou `calc = em_cache(calc)`. Argumentos que não têm hash canônico
+    (ex.: funções) desativam o cache só naquela chamada. Cada chamada recebe sua própria
+    cópia de dicts/listas/DataFrames do resultado (arrays vêm somente leitura).
+    """
+    if funcao is None:
+        return lambda f: em_cache(f, cache=cache)
+
+    # Páginas do Streamlit rodam todas como "__main__": o arquivo entra na identidade da função
+    origem = [funcao.__module__, funcao.__qualname__, getattr(getattr(funcao, "__code__", None), "co_filename", "")]
+
+    @functools.wraps(funcao)
+    def envolvida(*args, **kwargs):
+        alvo = cache or CACHE
+        try:
+            chave = chave_canonica(origem, *args, **kwargs)
+        except _NaoCacheavel:
+            return funcao(*args, **kwargs)
+        return _copia(alvo.obter_ou_calcular(chave, lambda: funcao(*args, **kwargs)))
+
+    return envolvida
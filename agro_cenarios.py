@@ -0,0 +1,145 @@
+# agro_cenarios.py
+# AgroExposure — Biblioteca de cenários nomeados (versões, índice e comparação)
+#
+# A página guardava só um retrato soja_*/milho_* (mais o reset para os padrões). Aqui cada
+# cenário ("safra 25/26 base", "com quebra 20%", "hedge 50%") é salvo com nome e versão:
+# - salvar: retrato dos campos do plano (as chaves dos *_DEFAULTS da página; configurações de
+#   tela como modo em lote ou eixos do heatmap ficam de fora), no mesmo formato do estado
+#   salvo, como nova versão imutável no banco (agro_banco), por perfil e fazenda;
+# - indice: lista nomes/versões sem ler nenhum corpo;
+# - carregar: busca pela chave; versões nunca mudam, então o corpo lido fica num cache do
+#   processo e as próximas leituras não vão ao banco;
+# - comparar: campos diferentes entre duas versões (ou a tela) e KPIs de todas de uma vez
+#   numa única chamada vetorizada de agro_engine.calcular_kpis.
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from agro_banco import banco
+from agro_cache import CacheResultados
+from agro_engine import calcular_kpis, dias_entre
+from agro_estado import FAZENDA_PADRAO, PERFIL_PADRAO, de_json, destino_sessao, para_json
+
+# Corpos já lidos (versões são imutáveis: nunca precisam ser invalidados)
+_CORPOS = CacheResultados(max_itens=256)
+
+# Argumento de calcular_kpis -> chave do estado (sem o prefixo soja_/milho_)
+CAMPOS_MOTOR = {
+    "area_propria": "area_propria_ha",
+    "area_arrendada": "area_arrendada_ha",
+    "produtividade": "produtividade_sc_ha",
+    "custo_ha_operacional": "custo_operacional_ha",
+    "perc_comercializado": "perc_travado_pct",
+    "preco_medio_venda": "preco_travado",
+    "preco_mercado": "preco_mercado",
+    "margem_desejada": "margem_alvo_pct",
+    "perc_financiado": "perc_financiado_pct",
+    "taxa_juros_ano": "taxa_juros_aa_pct",
+    "arrendamento_sc_ha": "arrendamento_sc_ha",
+}
+
+# KPIs comparados: nome no motor -> (rótulo, unidade: "brl" | "pct" | "sc")
+KPIS_COMPARADOS = {
+    "receita_bruta_total": ("Receita Bruta", "brl"),
+    "custo_total_caixa": ("Custo Total (Caixa)", "brl"),
+    "lucro_liquido": ("Lucro Líquido", "brl"),
+    "margem_liquida_perc": ("Margem Líquida", "pct"),
+    "roi_perc": ("ROI", "pct"),
+    "producao_liquida_sacas": ("Produção Líquida", "sc"),
+    "preco_breakeven_saldo": ("Breakeven do Saldo (R$/sc)", "brl"),
+}
+
+
+class BibliotecaCenarios:
+    """Cenários de uma cultura (`prefixo` = "soja_" / "milho_") de um perfil e fazenda.
+
+    `campos`: chaves do plano que entram num cenário (as dos *_DEFAULTS da página).
+    """
+
+    def __init__(self, caminho_banco, perfil: str, fazenda: str, prefixo: str, campos):
+        self.caminho = Path(caminho_banco)
+        self.perfil = perfil
+        self.fazenda = fazenda
+        self.prefixo = prefixo
+        self.campos = frozenset(campos)
+
+    def _args(self):
+        return self.perfil, self.fazenda, self.prefixo.rstrip("_")
+
+    def salvar(self, nome: str, estado) -> int:
+        """Nova versão de `nome` com os campos do plano em `estado` (ex.: st.session_state)."""
+        corpo = {k: para_json(v) for k, v in estado.items() if k in self.campos}
+        return banco(self.caminho).salvar_cenario(*self._args(), nome, corpo)
+
+    def indice(self) -> pd.DataFrame:
+        """Uma linha por versão salva: nome, versão, data e nº de campos (sem ler os corpos)."""
+        linhas = banco(self.caminho).indice_cenarios(*self._args())
+        df = pd.DataFrame(linhas, columns=["nome", "versao", "criado", "campos"])
+        df["criado"] = pd.to_datetime(df["criado"], unit="s")
+        return df
+
+    def carregar(self, nome: str, versao: int) -> dict:
+        """Campos do plano da versão já no formato da sessão (datas como date); {} se não existir.
+
+        Versões antigas que guardaram configurações de tela têm essas chaves ignoradas.
+        """
+        def ler():
+            corpo = banco(self.caminho).ler_cenario(*self._args(), nome, versao)
+            if corpo is None:
+                raise KeyError(nome)  # inexistente: não entra no cache
+            return corpo
+
+        try:
+            corpo = _CORPOS.obter_ou_calcular(str((str(self.caminho), *self._args(), nome, int(versao))), ler)
+        except KeyError:
+            return {}
+        return {k: de_json(v) for k, v in corpo.items() if k in self.campos}
+
+
+def biblioteca_sessao(arquivo_json, prefixo: str, campos) -> BibliotecaCenarios:
+    """Biblioteca do perfil/fazenda desta sessão (o banco fica ao lado de `arquivo_json`)."""
+    destino = destino_sessao(arquivo_json)
+    perfil = getattr(destino, "perfil", PERFIL_PADRAO)
+    fazenda = getattr(destino, "fazenda", FAZENDA_PADRAO)
+    return BibliotecaCenarios(Path(arquivo_json).with_suffix(".db"), perfil, fazenda, prefixo, campos)
+
+
+def diferencas_campos(a: dict, b: dict, prefixo: str, campos) -> pd.DataFrame:
+    """Campos do plano (`campos`) com valor diferente entre `a` e `b` (ausente = "—")."""
+    chaves = sorted(k for k in set(a) | set(b) if k in campos)
+    mudou = [k for k in chaves if para_json(a.get(k)) != para_json(b.get(k))]
+    mostrar = lambda d, k: str(para_json(d[k])) if k in d else "—"
+    return pd.DataFrame({
+        "Campo": [k[len(prefixo):] for k in mudou],
+        "A": [mostrar(a, k) for k in mudou],
+        "B": [mostrar(b, k) for k in mudou],
+    })
+
+
+def kpis_cenarios(estados: list, prefixo: str, padroes: dict) -> dict:
+    """KPIs de N estados numa única passada do motor: {kpi: array (N,)}.
+
+    Campos ausentes num estado vêm de `padroes` (os *_DEFAULTS da página, com prefixo).
+    """
+    def coluna(chave):
+        k = prefixo + chave
+        valores = pd.to_numeric(pd.Series([e.get(k, padroes[k]) for e in estados], dtype=object), errors="coerce")
+        return valores.fillna(float(padroes[k])).to_numpy(dtype=float)
+
+    entradas = {arg: coluna(chave) for arg, chave in CAMPOS_MOTOR.items()}
+    quebra = np.array([bool(e.get(prefixo + "simular_quebra", padroes[prefixo + "simular_quebra"])) for e in estados])
+    entradas["fator_quebra"] = np.where(quebra, coluna("perc_quebra") / 100.0, 0.0)
+    datas = lambda chave: [e.get(prefixo + chave, padroes[prefixo + chave]) for e in estados]
+    entradas["dias_financiamento"] = dias_entre(datas("data_desembolso"), datas("data_pagamento"))
+    return calcular_kpis(**entradas)
+
+
+def diferencas_kpis(a: dict, b: dict, prefixo: str, padroes: dict) -> pd.DataFrame:
+    """KPIs de `a` e `b` lado a lado (valores numéricos) com a diferença B − A."""
+    kpis = kpis_cenarios([a, b], prefixo, padroes)
+    return pd.DataFrame([
+        {"KPI": rotulo, "unidade": unidade, "A": float(kpis[k][0]), "B": float(kpis[k][1]), "Δ (B − A)": float(kpis[k][1] - kpis[k][0])}
+        for k, (rotulo, unidade) in KPIS_COMPARADOS.items()
+    ])
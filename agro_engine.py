@@ -0,0 +1,202 @@
+# agro_engine.py
+# AgroExposure — Motor vetorizado dos "CÁLCULOS PRINCIPAIS" (SOJA / MILHO)
+#
+# Mesma economia das páginas 1_PAG_SOJA.py / 2_PAG_MILHO.py, mas:
+# - importável (sem Streamlit), então qualquer cenário pode ser avaliado sem rerun da página;
+# - vetorizado com NumPy: cada entrada pode ser escalar ou array (N cenários) e todas as
+#   saídas voltam como arrays do mesmo formato (broadcasting).
+#
+# AUDITORIA: as regras econômicas (arrendamento em SACAS, sem dupla contagem no lucro, divisões
+# protegidas "if x > 0 else 0") são idênticas às do script das páginas.
+
+from datetime import date
+
+import numpy as np
+
+
+def _div(num, den, cond=None):
+    """Divisão protegida: num / den onde `cond` (default: den > 0), senão 0."""
+    num, den = np.broadcast_arrays(np.asarray(num, dtype=float), np.asarray(den, dtype=float))
+    if cond is None:
+        cond = den > 0
+    out = np.zeros(np.broadcast(num, cond).shape, dtype=float)
+    np.divide(num, den, out=out, where=np.broadcast_to(cond, out.shape))
+    return out
+
+
+def dias_entre(data_inicio, data_fim):
+    """Dias corridos (>= 0) entre duas datas ou arrays de datas (date / datetime64 / ISO)."""
+    d0 = np.asarray(data_inicio, dtype="datetime64[D]")
+    d1 = np.asarray(data_fim, dtype="datetime64[D]")
+    return np.maximum(0, (d1 - d0).astype(np.int64))
+
+
+def calcular_kpis(
+    area_propria,
+    area_arrendada,
+    produtividade,
+    custo_ha_operacional,
+    perc_comercializado,
+    preco_medio_venda,
+    preco_mercado,
+    margem_desejada,
+    perc_financiado,
+    taxa_juros_ano,
+    dias_financiamento,
+    arrendamento_sc_ha,
+    fator_quebra=0.0,
+) -> dict:
+    """Calcula todos os KPIs da safra para N cenários de uma vez.
+
+    Percentuais seguem as páginas (0–100); `fator_quebra` é fração (0–1) aplicada sobre a
+    produtividade informada. Retorna um dict {nome_kpi: np.ndarray}.
+    """
+    f = lambda x: np.asarray(x, dtype=float)
+    area_propria, area_arrendada = f(area_propria), f(area_arrendada)
+    custo_ha_operacional, perc_comercializado = f(custo_ha_operacional), f(perc_comercializado)
+    preco_medio_venda, preco_mercado, margem_desejada = f(preco_medio_venda), f(preco_mercado), f(margem_desejada)
+    perc_financiado, taxa_juros_ano = f(perc_financiado), f(taxa_juros_ano)
+    arrendamento_sc_ha = f(arrendamento_sc_ha)
+
+    area_total = area_propria + area_arrendada
+    area_total = np.where(area_total == 0, 1.0, area_total)
+    produtividade = f(produtividade) * (1 - f(fator_quebra))
+    producao_total = area_total * produtividade
+
+    # A. Físico e Receita
+    # Arrendamento é em SACAS (produto) -> reduz o volume comercializável
+    vol_arrendamento_sacas = area_arrendada * arrendamento_sc_ha
+    producao_liquida_sacas = producao_total - vol_arrendamento_sacas
+
+    qtd_vendida = producao_total * (perc_comercializado / 100)
+    receita_hedge = qtd_vendida * preco_medio_venda
+    qtd_aberta_fisica = np.maximum(0, producao_liquida_sacas - qtd_vendida)
+    receita_spot = qtd_aberta_fisica * preco_mercado
+    receita_bruta_total = receita_hedge + receita_spot
+    preco_medio_blended = _div(receita_bruta_total, producao_liquida_sacas)
+
+    # B. Custos (Caixa) + Terra (Econômico)
+    custo_operacional_total = area_total * custo_ha_operacional
+    valor_base_financiamento = custo_operacional_total * (perc_financiado / 100)
+    dias_financiamento = np.maximum(0, f(dias_financiamento))
+    custo_financeiro_juros = valor_base_financiamento * ((taxa_juros_ano / 100) / 365) * dias_financiamento
+    custo_arrendamento_reais_hoje = vol_arrendamento_sacas * preco_mercado
+    custo_total_caixa = custo_operacional_total + custo_financeiro_juros
+    custo_total_safra = custo_total_caixa + custo_arrendamento_reais_hoje
+
+    # C. Resultados (arrendamento já descontado no volume vendido)
+    lucro_operacional = receita_bruta_total - custo_operacional_total
+    fluxo_caixa_operacional = lucro_operacional - custo_financeiro_juros
+    lucro_liquido = receita_bruta_total - custo_total_caixa
+    margem_liquida_perc = _div(lucro_liquido, receita_bruta_total) * 100
+
+    # D. ROI e Barter
+    roi_perc = _div(lucro_liquido, custo_total_safra) * 100
+    roi_caixa_perc = _div(lucro_liquido, custo_total_caixa) * 100
+    barter_operacional_sc_ha = _div(custo_ha_operacional, preco_mercado)
+    barter_total_sc_ha = _div(custo_total_safra / area_total, preco_mercado)
+
+    # Preços-chave (breakeven e meta)
+    saldo_a_cobrir = custo_total_caixa - receita_hedge
+    vol_disponivel_pgto = producao_liquida_sacas - qtd_vendida
+    preco_breakeven_saldo = _div(saldo_a_cobrir, vol_disponivel_pgto)
+
+    custo_op_fin_sc = _div(custo_total_caixa, preco_mercado)
+    breakeven_sc_total_conserv = custo_op_fin_sc + vol_arrendamento_sacas
+    breakeven_sc_ha_conservador = _div(breakeven_sc_total_conserv, area_total)
+
+    preco_medio_total_producao = (
+        (perc_comercializado / 100) * preco_medio_venda + (1 - (perc_comercializado / 100)) * preco_mercado
+    )
+    breakeven_sc_ha_plano = _div(
+        custo_total_caixa + custo_arrendamento_reais_hoje,
+        area_total * preco_medio_total_producao,
+        (area_total > 0) & (preco_medio_total_producao > 0),
+    )
+    breakeven_sc_ha = breakeven_sc_ha_plano
+
+    # Receita alvo: R * (1 - m) = custos_caixa => R = custos_caixa / (1 - m)
+    receita_alvo_total = np.where(
+        margem_desejada < 100,
+        _div(custo_total_caixa, 1 - (margem_desejada / 100), margem_desejada < 100),
+        custo_total_caixa * 1.5,
+    )
+    receita_faltante_para_meta = receita_alvo_total - receita_hedge
+    preco_alvo_restante_meta = _div(receita_faltante_para_meta, qtd_aberta_fisica)
+
+    margem_seguranca_sc_ha = produtividade - breakeven_sc_ha
+    custo_sc_liquida = _div(custo_total_caixa, producao_liquida_sacas)
+    custo_sc_total = _div(custo_total_safra, producao_liquida_sacas)
+
+    # KPIs por hectare
+    custo_ha_medio_op_fin = _div(custo_total_caixa, area_total)
+    custo_ha_area_arrendada = custo_ha_medio_op_fin + (arrendamento_sc_ha * preco_mercado)
+    custo_ha_area_propria = custo_ha_medio_op_fin
+
+    juros_por_saca_reais = _div(custo_financeiro_juros, producao_total)
+    juros_sc_ha = _div(
+        custo_financeiro_juros / area_total,
+        preco_medio_blended,
+        (area_total > 0) & (preco_medio_blended > 0),
+    )
+
+    out = {
+        "area_total": area_total,
+        "produtividade": produtividade,
+        "producao_total": producao_total,
+        "vol_propria": area_propria * produtividade,
+        "vol_arrendada": area_arrendada * produtividade,
+        "vol_arrendamento_sacas": vol_arrendamento_sacas,
+        "producao_liquida_sacas": producao_liquida_sacas,
+        "qtd_vendida": qtd_vendida,
+        "receita_hedge": receita_hedge,
+        "qtd_aberta_fisica": qtd_aberta_fisica,
+        "receita_spot": receita_spot,
+        "receita_bruta_total": receita_bruta_total,
+        "preco_medio_blended": preco_medio_blended,
+        "custo_operacional_total": custo_operacional_total,
+        "valor_base_financiamento": valor_base_financiamento,
+        "dias_financiamento": dias_financiamento,
+        "custo_financeiro_juros": custo_financeiro_juros,
+        "custo_arrendamento_reais_hoje": custo_arrendamento_reais_hoje,
+        "custo_total_caixa": custo_total_caixa,
+        "custo_total_safra": custo_total_safra,
+        "lucro_operacional": lucro_operacional,
+        "fluxo_caixa_operacional": fluxo_caixa_operacional,
+        "lucro_liquido": lucro_liquido,
+        "margem_liquida_perc": margem_liquida_perc,
+        "roi_perc": roi_perc,
+        "roi_caixa_perc": roi_caixa_perc,
+        "barter_operacional_sc_ha": barter_operacional_sc_ha,
+        "barter_total_sc_ha": barter_total_sc_ha,
+        "saldo_a_cobrir": saldo_a_cobrir,
+        "vol_disponivel_pgto": vol_disponivel_pgto,
+        "preco_breakeven_saldo": preco_breakeven_saldo,
+        "custo_op_fin_sc": custo_op_fin_sc,
+        "breakeven_sc_total_conserv": breakeven_sc_total_conserv,
+        "breakeven_sc_ha_conservador": breakeven_sc_ha_conservador,
+        "preco_medio_total_producao": preco_medio_total_producao,
+        "breakeven_sc_ha_plano": breakeven_sc_ha_plano,
+        "breakeven_sc_ha": breakeven_sc_ha,
+        "receita_alvo_total": receita_alvo_total,
+        "receita_faltante_para_meta": receita_faltante_para_meta,
+        "preco_alvo_restante_meta": preco_alvo_restante_meta,
+        "margem_seguranca_sc_ha": margem_seguranca_sc_ha,
+        "custo_sc_liquida": custo_sc_liquida,
+        "custo_sc_total": custo_sc_total,
+        "custo_ha_medio_op_fin": custo_ha_medio_op_fin,
+        "custo_ha_area_arrendada": custo_ha_area_arrendada,
+        "custo_ha_area_propria": custo_ha_area_propria,
+        "juros_por_saca_reais": juros_por_saca_reais,
+        "juros_sc_ha": juros_sc_ha,
+    }
+    shape = np.broadcast_shapes(*(v.shape for v in out.values()))
+    return {k: np.broadcast_to(v, shape) for k, v in out.items()}
+
+
+def calcular_cenario(data_tomada: date, data_pagamento: date, **entradas) -> dict:
+    """Versão escalar para as páginas: um cenário, KPIs como float Python."""
+    kpis = calcular_kpis(dias_financiamento=dias_entre(data_tomada, data_pagamento), **entradas)
+    out = {k: float(v) for k, v in kpis.items()}
+    out["dias_financiamento"] = int(out["dias_financiamento"])
+    return out
@@ -0,0 +1,463 @@
+# agro_estado.py
+# AgroExposure — Persistência do estado das páginas (gravação só do que mudou, agrupada e atômica)
+#
+# save_persisted_state() roda no fim de todo rerun das páginas SOJA/MILHO e reescrevia o JSON
+# inteiro, mesmo sem mudança nenhuma. Aqui:
+# - cada sessão guarda o retrato (já em formato JSON) do que gravou por último; só as chaves
+#   que mudaram desde então são enviadas para gravação;
+# - as alterações ficam pendentes por ATRASO_GRAVACAO segundos e são mescladas: uma rajada de
+#   edições (vários reruns seguidos, vários saves no mesmo rerun) vira uma única escrita. Um
+#   valor que não vira JSON fica de fora sozinho (as demais chaves seguem), e o retrato da
+#   sessão só é atualizado depois que a escrita acontece (falhou -> a chave é reenviada);
+# - gravar é acrescentar ao diário (chave, valor anterior, valor novo, momento, sessão), nunca
+#   reescrever o estado inteiro; de tempos em tempos (COMPACTAR_APOS linhas) o diário é dobrado
+#   no retrato. O diário fica guardado: historico()/estado_em() reproduzem a evolução do plano;
+# - o retrato é gravado de forma atômica: arquivo temporário na mesma pasta + fsync +
+#   os.replace. Uma queda no meio deixa o anterior inteiro, nunca um JSON pela metade;
+# - chaves de botões (…_btn, btn_…) nunca são gravadas nem carregadas: o Streamlit não aceita
+#   valor de botão vindo do session_state e a sessão seguinte quebrava.
+#
+# Destino do estado (um por sessão, destino_sessao):
+# - PerfilBanco (padrão): SQLite em WAL (agro_banco), separado por perfil e fazenda — vários
+#   usuários no mesmo servidor sem um sobrescrever o outro. Com login configurado ([auth] no
+#   secrets.toml), a página para até o usuário entrar (st.login) e perfil = e-mail do usuário
+#   logado (st.user); ?perfil= é ignorado. Sem login, ?perfil= da URL ou "padrao". Fazenda =
+#   ?fazenda= da URL, ou "principal". O agro_state.json antigo é importado uma vez para o
+#   perfil padrão (que, com login, nenhum usuário usa);
+# - ArquivoJson (AGRO_STATE_BACKEND=json): o arquivo único de antes, para uso individual, com
+#   o diário ao lado (agro_state.diario.jsonl, uma linha JSON por alteração).
+#
+# Leitura: o estado já decodificado e tipado (datas como date) fica num retrato por destino,
+# compartilhado pelo processo e invalidado pela versão do destino (mtime/tamanho/inode do
+# arquivo; contador de gravações + PRAGMA data_version no banco). Sessões recebem uma cópia
+# do retrato, sem reler o disco nem reconverter valor por valor a cada rerun.
+
+import atexit
+import json
+import os
+import re
+import tempfile
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+
+import streamlit as st
+
+from agro_banco import COMPACTAR_APOS, banco
+
+ATRASO_GRAVACAO = 0.5  # segundos
+
+BACKEND = os.environ.get("AGRO_STATE_BACKEND", "sqlite")
+PERFIL_PADRAO = "padrao"
+FAZENDA_PADRAO = "principal"
+
+_RE_DATA = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_RE_BOTAO = re.compile(r"(^|_)btn(_|$)")
+
+# Chave do retrato JSON com a posição (bytes) do diário já dobrada nele
+_POS_DIARIO = "_diario_pos"
+
+# Alterações ainda não gravadas, por (destino, sessão), e o timer que vai gravá-las
+_PENDENTES = {}
+_TIMERS = {}
+# Estado já lido e tipado, por destino: (versão, dados)
+_RETRATOS = {}
+# Estado já dobrado de cada ArquivoJson: chave -> (versão dos arquivos, dados, fim do diário lido,
+# linhas ainda não dobradas no retrato). Gravar não relê o estado enquanto ninguém mexer nos arquivos.
+_DOBRADOS = {}
+# _LOCK protege só os dicionários do processo (filas, retratos); a escrita em disco de cada
+# destino usa o lock dele (_lock_destino), para um disco lento não travar as outras sessões
+_LOCK = threading.RLock()
+_LOCKS_DESTINO = {}
+
+
+def chave_persistida(chave, prefixos) -> bool:
+    """`chave` vai para o JSON: começa com um dos `prefixos` e não é de botão."""
+    k = str(chave)
+    return k.startswith(tuple(prefixos)) and not _RE_BOTAO.search(k)
+
+
+def para_json(valor):
+    """Valor do session_state no formato gravado (datas como AAAA-MM-DD)."""
+    return valor.isoformat() if isinstance(valor, date) else valor
+
+
+def de_json(valor):
+    """Inverso de para_json: textos AAAA-MM-DD voltam a ser date."""
+    if isinstance(valor, str) and _RE_DATA.match(valor):
+        try:
+            return date.fromisoformat(valor)
+        except ValueError:
+            return valor
+    return valor
+
+
+def _ler_arquivo(caminho: Path) -> dict:
+    try:
+        dados = json.loads(Path(caminho).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return dados if isinstance(dados, dict) else {}
+
+
+def _sem_botoes(dados: dict) -> dict:
+    return {k: v for k, v in dados.items() if not _RE_BOTAO.search(str(k))}
+
+
+def gravar_atomico(caminho, dados: dict) -> None:
+    """Escreve `dados` em `caminho` via temporário + os.replace (o arquivo nunca fica pela metade)."""
+    caminho = Path(caminho)
+    fd, tmp = tempfile.mkstemp(prefix=f".{caminho.name}.", suffix=".tmp", dir=caminho.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(dados, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, caminho)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _ler_diario(caminho: Path, inicio: int = 0):
+    """Linhas do diário a partir do byte `inicio` e a posição final. Uma última linha
+    incompleta (queda no meio da escrita) é ignorada."""
+    try:
+        with open(caminho, "rb") as f:
+            f.seek(inicio)
+            bruto = f.read()
+    except OSError:
+        return [], inicio
+    linhas = []
+    for texto in bruto.split(b"\n"):
+        try:
+            linhas.append(json.loads(texto))
+        except ValueError:
+            continue
+    return linhas, inicio + len(bruto)
+
+
+def _versao_arquivo(caminho: Path):
+    try:
+        s = caminho.stat()
+    except OSError:
+        return None
+    return s.st_mtime_ns, s.st_size, s.st_ino
+
+
+class ArquivoJson:
+    """Destino: um único arquivo JSON (o retrato) + o diário de alterações ao lado."""
+
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+        self.diario = self.caminho.with_name(f"{self.caminho.stem}.diario.jsonl")
+        self.chave = str(self.caminho)
+
+    def versao(self):
+        return _versao_arquivo(self.caminho), _versao_arquivo(self.diario)
+
+    def _ler(self):
+        # (estado, posição do diário no fim da leitura, nº de linhas ainda não dobradas); da
+        # memória enquanto a versão dos arquivos for a mesma
+        versao = self.versao()
+        with _LOCK:
+            memoria = _DOBRADOS.get(self.chave)
+        if memoria is not None and memoria[0] == versao:
+            return memoria[1:]
+        dados = _ler_arquivo(self.caminho)
+        inicio = dados.pop(_POS_DIARIO, 0)
+        cauda, fim = _ler_diario(self.diario, inicio if isinstance(inicio, int) else 0)
+        for linha in cauda:
+            dados[linha["chave"]] = linha["depois"]
+        dados = _sem_botoes(dados)
+        with _LOCK:
+            _DOBRADOS[self.chave] = (versao, dados, fim, len(cauda))
+        return dados, fim, len(cauda)
+
+    def ler(self) -> dict:
+        return dict(self._ler()[0])
+
+    def gravar(self, alteracoes: dict, sessao: str = "") -> None:
+        dados, _, cauda = self._ler()
+        agora = time.time()
+        novas = [
+            json.dumps({"momento": agora, "sessao": sessao, "chave": k, "antes": dados.get(k), "depois": v}, ensure_ascii=False)
+            for k, v in alteracoes.items()
+            if k not in dados or dados[k] != v
+        ]
+        if not novas:
+            return
+        if not self.diario.exists():
+            # Primeiro diário de um arquivo antigo: o retrato atual abre o histórico
+            novas[:0] = [
+                json.dumps({"momento": agora, "sessao": "", "chave": k, "antes": None, "depois": v}, ensure_ascii=False)
+                for k, v in dados.items()
+            ]
+        texto = ("\n".join(novas) + "\n").encode("utf-8")
+        with open(self.diario, "ab+") as f:
+            # Última linha cortada (queda no meio de uma escrita): começa numa linha nova para não
+            # emendar a primeira alteração no fragmento
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    texto = b"\n" + texto
+            f.write(texto)
+            f.flush()
+            os.fsync(f.fileno())
+            fim = f.tell()
+        # Dict novo: o retrato anterior pode estar sendo copiado por um ler() de outra sessão
+        dados = {**dados, **alteracoes}
+        cauda += len(novas)
+        if cauda >= COMPACTAR_APOS:
+            gravar_atomico(self.caminho, {**dados, _POS_DIARIO: fim})
+            cauda = 0
+        with _LOCK:
+            _DOBRADOS[self.chave] = (self.versao(), dados, fim, cauda)
+
+    def historico(self) -> list:
+        return [
+            (l["momento"], l["sessao"], l["chave"], l["antes"], l["depois"])
+            for l in _ler_diario(self.diario)[0]
+        ]
+
+
+class PerfilBanco:
+    """Destino: estado de (perfil, fazenda) no banco SQLite `caminho`.
+
+    Com `legado` (o agro_state.json antigo), o perfil/fazenda padrão ainda vazio é preenchido
+    com o conteúdo do arquivo na primeira leitura.
+    """
+
+    def __init__(self, caminho, perfil: str, fazenda: str, legado=None):
+        self.caminho = Path(caminho)
+        self.perfil = perfil
+        self.fazenda = fazenda
+        self.legado = legado
+        self.chave = f"{self.caminho}#{perfil}#{fazenda}"
+
+    def versao(self):
+        return banco(self.caminho).versao(self.perfil, self.fazenda)
+
+    def ler(self) -> dict:
+        b = banco(self.caminho)
+        padrao = (self.perfil, self.fazenda) == (PERFIL_PADRAO, FAZENDA_PADRAO)
+        if padrao and self.legado is not None and b.vazio(self.perfil, self.fazenda):
+            antigo = _sem_botoes(_ler_arquivo(self.legado))
+            if antigo:
+                b.gravar(self.perfil, self.fazenda, antigo)
+        return b.ler(self.perfil, self.fazenda)
+
+    def gravar(self, alteracoes: dict, sessao: str = "") -> None:
+        banco(self.caminho).gravar(self.perfil, self.fazenda, alteracoes, sessao)
+
+    def historico(self) -> list:
+        return banco(self.caminho).historico(self.perfil, self.fazenda)
+
+
+def _login_configurado() -> bool:
+    try:
+        return "auth" in st.secrets
+    except Exception:  # sem secrets.toml
+        return False
+
+
+def _usuario_logado():
+    """E-mail do usuário logado (st.user), ou None."""
+    try:
+        return st.user.get("email") if st.user.get("is_logged_in") else None
+    except Exception:  # login indisponível nesta versão/ambiente
+        return None
+
+
+def exigir_login() -> None:
+    """Com login configurado, para a página (st.stop) até o usuário entrar; sem login, nada."""
+    if not _login_configurado() or _usuario_logado():
+        return
+    st.info("🔒 Entre com sua conta para abrir o seu plano.")
+    st.button("Entrar", on_click=st.login, key="_agro_login_btn")
+    st.stop()
+
+
+def identidade() -> tuple:
+    """(perfil, fazenda) da sessão atual.
+
+    Com login configurado o perfil é sempre o do usuário logado (a página para antes, em
+    exigir_login, se ninguém entrou): ?perfil= na URL não dá acesso ao plano de outra pessoa.
+    Só sem login o perfil vem da URL (ou é o padrão).
+    """
+    if _login_configurado():
+        exigir_login()
+        perfil = _usuario_logado()
+    else:
+        perfil = st.query_params.get("perfil")
+    fazenda = st.query_params.get("fazenda")
+    return (perfil or PERFIL_PADRAO).strip().lower(), (fazenda or FAZENDA_PADRAO).strip().lower()
+
+
+def sessao_atual() -> str:
+    """Identificador curto desta sessão do navegador (gravado em cada linha do diário)."""
+    return st.session_state.setdefault("_agro_sessao", uuid.uuid4().hex[:12])
+
+
+def destino_sessao(arquivo_json):
+    """Destino do estado desta sessão, fixado na primeira chamada (trocar a URL no meio da
+    sessão não mistura perfis). O banco fica ao lado de `arquivo_json` (agro_state.db).
+
+    Com login configurado, nada é lido nem gravado antes de o usuário entrar (exigir_login),
+    e o destino fixado vale só para aquele usuário: outro login monta o destino dele.
+    """
+    exigir_login()
+    dono = _usuario_logado()
+    fixado = st.session_state.get("_agro_destino")
+    if fixado is None or fixado[0] != dono:
+        arquivo_json = Path(arquivo_json)
+        if BACKEND == "json":
+            destino = ArquivoJson(arquivo_json)
+        else:
+            destino = PerfilBanco(arquivo_json.with_suffix(".db"), *identidade(), legado=arquivo_json)
+        fixado = st.session_state["_agro_destino"] = (dono, destino)
+    return fixado[1]
+
+
+def _destino(destino):
+    return ArquivoJson(destino) if isinstance(destino, (str, Path)) else destino
+
+
+def _copiar(valor):
+    """Cópia das listas/dicts do retrato (a sessão pode alterar o que recebe)."""
+    if isinstance(valor, dict):
+        return {k: _copiar(v) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_copiar(v) for v in valor]
+    return valor
+
+
+def ler_estado(destino) -> dict:
+    """Estado gravado em `destino` (ou num caminho de JSON) já no formato da sessão (datas como
+    date), sem chaves de botão. Alterações pendentes desse destino são gravadas antes da leitura.
+
+    Só lê o disco quando a versão do destino mudou; senão copia o retrato do processo.
+    """
+    destino = _destino(destino)
+    descarregar(destino)
+    # Versão tomada antes da leitura: uma gravação no meio deixa o retrato já vencido, nunca o contrário
+    versao = destino.versao()
+    with _LOCK:
+        retrato = _RETRATOS.get(destino.chave)
+    if retrato is None or retrato[0] != versao:
+        retrato = (versao, {k: de_json(v) for k, v in _sem_botoes(destino.ler()).items()})
+        with _LOCK:
+            _RETRATOS[destino.chave] = retrato
+    return _copiar(retrato[1])
+
+
+def _serializaveis(alteracoes: dict) -> dict:
+    """Só as chaves cujo valor vira JSON (uma chave inválida não derruba as outras)."""
+    validas = {}
+    for k, v in alteracoes.items():
+        try:
+            json.dumps(v)
+        except (TypeError, ValueError):
+            continue
+        validas[k] = v
+    return validas
+
+
+def agendar_gravacao(destino, alteracoes: dict, imediato: bool = False, sessao: str = None,
+                     gravadas: dict = None) -> None:
+    """Mescla `alteracoes` (chave -> valor JSON) nas pendentes de `destino` e agenda a escrita.
+
+    Com `imediato=True` grava já (ex.: botão "Salvar"), junto com o que estava pendente.
+    `sessao` vai para o diário (padrão: a sessão atual do Streamlit). `gravadas` (ex.: o
+    retrato salvo da sessão) recebe as chaves só depois que elas forem de fato gravadas.
+    Valores que não viram JSON são ignorados.
+    """
+    destino = _destino(destino)
+    sessao = sessao_atual() if sessao is None else sessao
+    chave = (destino.chave, sessao)
+    with _LOCK:
+        _, pendentes, confirmar = _PENDENTES.setdefault(chave, (destino, {}, []))
+        pendentes.update(_serializaveis(alteracoes))
+        if gravadas is not None and all(g is not gravadas for g in confirmar):
+            confirmar.append(gravadas)
+        if not imediato and chave not in _TIMERS:
+            timer = threading.Timer(ATRASO_GRAVACAO, descarregar, args=(destino,))
+            timer.daemon = True
+            _TIMERS[chave] = timer
+            timer.start()
+    if imediato:
+        descarregar(destino)
+
+
+def _lock_destino(chave: str) -> threading.Lock:
+    with _LOCK:
+        return _LOCKS_DESTINO.setdefault(chave, threading.Lock())
+
+
+def descarregar(destino=None) -> None:
+    """Grava agora as alterações pendentes de `destino` (de todas as sessões) ou de todos os destinos.
+
+    Os lotes saem da fila sob o _LOCK, mas são gravados fora dele, com o lock do destino: uma
+    gravação por destino por vez, na ordem em que saíram da fila.
+    """
+    if destino is None:
+        with _LOCK:
+            destinos = {c[0]: d for c, (d, _, _) in _PENDENTES.items()}
+        for d in destinos.values():
+            descarregar(d)
+        return
+    destino = _destino(destino)
+    with _lock_destino(destino.chave):
+        with _LOCK:
+            lotes = []
+            for chave in [c for c in _PENDENTES if c[0] == destino.chave]:
+                timer = _TIMERS.pop(chave, None)
+                if timer is not None:
+                    timer.cancel()
+                lotes.append((chave, *_PENDENTES.pop(chave)))
+        for chave, destino_p, pendentes, confirmar in lotes:
+            if not pendentes:
+                continue
+            try:
+                destino_p.gravar(pendentes, chave[1])
+            except (OSError, sqlite3.Error):
+                # Disco/banco indisponível: nada foi gravado pela metade; o lote volta para a fila
+                # (por baixo do que chegou enquanto isso) e a próxima gravação tenta de novo
+                with _LOCK:
+                    _, novas, confirmar_novas = _PENDENTES.get(chave, (destino_p, {}, []))
+                    confirmar += [g for g in confirmar_novas if all(g is not c for c in confirmar)]
+                    _PENDENTES[chave] = (destino_p, {**pendentes, **novas}, confirmar)
+                continue
+            for gravadas in confirmar:
+                gravadas.update(pendentes)
+
+
+def historico(destino, chave: str = None) -> list:
+    """Diário de `destino` em ordem, como dicts {momento (datetime), sessao, chave, antes, depois}
+    com valores no formato da sessão. Com `chave`, só as alterações dela."""
+    destino = _destino(destino)
+    descarregar(destino)
+    return [
+        {"momento": datetime.fromtimestamp(m), "sessao": s, "chave": k, "antes": de_json(a), "depois": de_json(d)}
+        for m, s, k, a, d in destino.historico()
+        if (chave is None or k == chave) and not _RE_BOTAO.search(str(k))
+    ]
+
+
+def estado_em(destino, momento: datetime) -> dict:
+    """Estado de `destino` como estava em `momento`, reproduzindo o diário até lá."""
+    estado = {}
+    for linha in historico(destino):
+        if linha["momento"] > momento:
+            break
+        estado[linha["chave"]] = linha["depois"]
+    return estado
+
+
+atexit.register(descarregar)
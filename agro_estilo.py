@@ -0,0 +1,45 @@
+# agro_estilo.py
+# AgroExposure — Design system como arquivos estáticos (static/css)
+#
+# Antes cada rerun reenviava ~350 linhas de <style> e um @import do Google Fonts (que trava a
+# renderização sem internet). Agora:
+# - o CSS de cada página mora em static/css/ e é servido pelo Streamlit (enableStaticServing);
+# - o <link> leva ?v=<hash do conteúdo>: o navegador guarda o arquivo e só baixa de novo
+#   quando o CSS muda; o rerun envia apenas a tag (~100 bytes);
+# - a fonte nunca vem da internet: os CSS pedem 'Inter' (usada se instalada no sistema) e
+#   caem na sans-serif padrão.
+# Sem servidor estático (ex.: config ausente), o CSS é lido do disco uma única vez e embutido.
+
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+
+import streamlit as st
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+
+
+@lru_cache(maxsize=None)
+def _ler(rel: str, mtime: float) -> str:
+    # `mtime` entra só na chave do cache: arquivo editado -> relido
+    return (STATIC_DIR / rel).read_text(encoding="utf-8")
+
+
+def _conteudo(rel: str) -> str:
+    return _ler(rel, (STATIC_DIR / rel).stat().st_mtime)
+
+
+def url_versionada(rel: str) -> str:
+    """URL relativa do arquivo em static/ com a versão (hash do conteúdo) na query."""
+    versao = hashlib.sha1(_conteudo(rel).encode("utf-8")).hexdigest()[:10]
+    return f"app/static/{rel}?v={versao}"
+
+
+def aplicar_estilo(*folhas: str) -> None:
+    """Aplica as folhas de estilo de static/css (ex.: "agro_soja.css")."""
+    rels = [f"css/{f}" for f in folhas]
+    if st.get_option("server.enableStaticServing"):
+        html = "".join(f'<link rel="stylesheet" href="{url_versionada(r)}">' for r in rels)
+    else:
+        html = "<style>" + "\n".join(_conteudo(r) for r in rels) + "</style>"
+    st.markdown(html, unsafe_allow_html=True)
@@ -0,0 +1,90 @@
+# agro_figuras.py
+# AgroExposure — Cache de figuras Plotly pelos dados de cada gráfico
+#
+# Todo rerun remontava todas as figuras (go.Figure + validação de cada propriedade + tema +
+# to_dict) mesmo quando nada do gráfico tinha mudado. Aqui cada figura tem um nome e uma chave
+# = hash canônico (agro_cache.chave_canonica) exatamente dos dados que ela desenha:
+# - mesmos dados: devolve o spec já montado e validado (nada é reconstruído);
+# - dados novos num gráfico já montado: copia o último spec desse nome e troca só os arrays
+#   de dados (função `atualizar`) — layout, tema e estilos dos traces são reaproveitados;
+# - primeira vez (ou gráfico sem `atualizar`): monta a figura completa com `construir`.
+# O spec (dict) vai direto para o st.plotly_chart, que aceita dicts.
+#
+# Specs em cache são compartilhados entre sessões: `atualizar` sempre recebe uma cópia. O
+# spec atualizado passa por go.Figure(spec).to_dict() (só na falta do cache), que codifica os
+# arrays NumPy em base64 tipado como numa figura montada do zero.
+
+import math
+import threading
+
+import plotly.graph_objects as go
+
+from agro_cache import CacheResultados, chave_canonica
+
+# Cache único do processo (todas as sessões/páginas)
+CACHE_FIGURAS = CacheResultados(max_itens=128)
+
+# Último spec montado de cada gráfico (base para atualizar só os dados)
+_ULTIMOS = {}
+_LOCK = threading.Lock()
+
+# Acima deste nº de células, camadas de pontos/texto do heatmap vão para WebGL (scattergl)
+LIMITE_SVG = 600
+
+
+def _copiar(obj):
+    """Cópia dos dicts/listas do spec (os valores em si são imutáveis)."""
+    if isinstance(obj, dict):
+        return {k: _copiar(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_copiar(v) for v in obj]
+    return obj
+
+
+def _copiar_spec(spec: dict) -> dict:
+    # O template (grande e nunca alterado) é compartilhado
+    layout = {k: (v if k == "template" else _copiar(v)) for k, v in spec.get("layout", {}).items()}
+    return {"data": _copiar(spec["data"]), "layout": layout}
+
+
+def figura(nome: str, dados: dict, construir, atualizar=None) -> dict:
+    """Spec (dict, para o st.plotly_chart) do gráfico `nome` para `dados`, reaproveitando o
+    que já foi montado. O dict é compartilhado: não deve ser alterado.
+
+    `construir(**dados)` monta a go.Figure completa (com tema). `atualizar(spec, **dados)`,
+    opcional, ajusta uma cópia do último spec de `nome` trocando só o que depende dos dados;
+    precisa deixar o spec igual ao que `construir` geraria. Gráficos com estrutura variável
+    (nº de traces) devem usar um `nome` por estrutura.
+    """
+    try:
+        chave = chave_canonica("figura", nome, dados)
+    except TypeError:  # dados sem hash canônico: monta sem cache
+        return construir(**dados).to_dict()
+
+    def montar():
+        with _LOCK:
+            anterior = _ULTIMOS.get(nome)
+        if anterior is not None and atualizar is not None:
+            spec = _copiar_spec(anterior)
+            atualizar(spec, **dados)
+            return go.Figure(spec).to_dict()
+        return construir(**dados).to_dict()
+
+    spec = CACHE_FIGURAS.obter_ou_calcular(chave, montar)
+    with _LOCK:
+        _ULTIMOS[nome] = spec
+    return spec
+
+
+def passo_rotulos(forma, largura_px=1100, altura_px=500, celula_min_px=(18, 48)) -> tuple:
+    """Passo (linhas, colunas) da subgrade de células que recebem rótulo num heatmap.
+
+    `forma` = (linhas, colunas) da grade; `largura_px`/`altura_px` = área do gráfico. Cada
+    rótulo precisa de ~`celula_min_px` (altura, largura) em pixels: em grades densas só
+    1 a cada k células tem texto, e o nº de rótulos fica limitado ao que cabe na tela.
+    """
+    linhas, colunas = forma
+    return (
+        max(1, math.ceil(celula_min_px[0] * linhas / altura_px)),
+        max(1, math.ceil(celula_min_px[1] * colunas / largura_px)),
+    )
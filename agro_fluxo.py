@@ -0,0 +1,176 @@
+# agro_fluxo.py
+# AgroExposure — Fluxo de Caixa por livro de eventos (event ledger)
+#
+# Cada pagamento/recebimento da safra vira um evento datado. O fluxo em qualquer resolução
+# (mensal "M" ou diária "D") e em qualquer horizonte é só a soma dos eventos por período,
+# feita com np.bincount — sem loops por mês e para N cenários de uma vez.
+#
+# Regras (iguais às da seção "Fluxo de Caixa Projetado" das páginas):
+# - Insumos: parte financiada sai do custeio; a parte própria é paga em Entrada (mês de plantio), P2 e P3;
+# - Manutenção: diluída mês a mês do plantio à colheita; Colheita & Frete no mês da colheita;
+#   ambas consomem primeiro o saldo do custeio não usado nos insumos, depois o bolso;
+# - Custeio: principal + juros na data de pagamento;
+# - Entradas: hedge na colheita, spot (saldo) `meses_ate_venda_spot` meses depois;
+# - Arrendamento é pago em SACAS -> não gera desembolso em R$ (evita dupla contagem).
+
+import numpy as np
+import pandas as pd
+
+
+def _mes(d) -> np.ndarray:
+    return np.atleast_1d(np.asarray(d, dtype="datetime64[D]")).astype("datetime64[M]")
+
+
+def primeiro_mes_apos(data_ref, mes) -> np.ndarray:
+    """Primeira ocorrência (datetime64[M]) do mês-calendário `mes` (1–12) a partir de `data_ref`."""
+    ref = _mes(data_ref)
+    mes_ref = ref.astype(np.int64) % 12 + 1
+    return ref + ((np.asarray(mes, dtype=np.int64) - mes_ref) % 12).astype("timedelta64[M]")
+
+
+def eventos_safra(
+    custo_operacional_total,
+    valor_base_financiamento,
+    custo_financeiro_juros,
+    perc_insumos,
+    perc_colheita,
+    pct_entrada_insumo,
+    pct_parc2,
+    data_parc2,
+    pct_parc3,
+    data_parc3,
+    data_tomada,
+    data_pagamento,
+    mes_plantio,
+    mes_colheita,
+    receita_hedge,
+    receita_spot,
+    meses_ate_venda_spot=2,
+) -> dict:
+    """Monta o livro de eventos de S cenários (entradas escalares ou arrays de tamanho S,
+    inclusive `meses_ate_venda_spot`: um cenário por mês de venda do saldo).
+
+    Retorna {"data": datetime64[D] (S, E), "valor": float (S, E) — positivo = entrada,
+    negativo = saída —, "tipo": lista de E rótulos}.
+    """
+    f = lambda x: np.atleast_1d(np.asarray(x, dtype=float))
+    cot = f(custo_operacional_total)
+    vbf = f(valor_base_financiamento)
+    juros = f(custo_financeiro_juros)
+    perc_manutencao = 100 - f(perc_insumos) - f(perc_colheita)
+
+    plantio = primeiro_mes_apos(data_tomada, mes_plantio)
+    colheita = primeiro_mes_apos(plantio, mes_colheita)
+    meses_spot = np.atleast_1d(np.asarray(meses_ate_venda_spot, dtype=np.int64))
+    S = np.broadcast_shapes(cot.shape, vbf.shape, plantio.shape, colheita.shape, f(receita_spot).shape, meses_spot.shape)[0]
+    b = lambda x: np.broadcast_to(x, (S,))
+
+    # Insumos: financiado primeiro, parte própria escalonada
+    custo_insumos_total = cot * (f(perc_insumos) / 100)
+    custo_insumos_proprio = custo_insumos_total - np.minimum(custo_insumos_total, vbf)
+    saldo_financiamento = np.maximum(0, vbf - custo_insumos_total)
+
+    # Manutenção (mensal, plantio..colheita) + Colheita, consumindo o saldo do custeio em ordem
+    duracao = np.maximum(1, (colheita - plantio).astype(np.int64) + 1)
+    d_max = int(duracao.max())
+    k = np.arange(d_max)[None, :]
+    ativo = k < b(duracao)[:, None]
+    mensal_manut = (cot * (perc_manutencao / 100)) / duracao
+    pagtos = np.concatenate(
+        [np.where(ativo, b(mensal_manut)[:, None], 0.0), b(cot * (f(perc_colheita) / 100))[:, None]], axis=1
+    )
+    pago_antes = np.cumsum(pagtos, axis=1) - pagtos
+    pago_banco = np.clip(b(saldo_financiamento)[:, None] - pago_antes, 0, pagtos)
+    pago_bolso = pagtos - pago_banco
+
+    datas_manut = (b(plantio)[:, None] + k.astype("timedelta64[M]")).astype("datetime64[D]")
+    m = lambda d: b(_mes(d)).astype("datetime64[D]")
+    d_pag = b(np.atleast_1d(np.asarray(data_pagamento, dtype="datetime64[D]")))
+
+    datas = np.column_stack([
+        m(plantio), b(np.atleast_1d(np.asarray(data_parc2, dtype="datetime64[D]"))),
+        b(np.atleast_1d(np.asarray(data_parc3, dtype="datetime64[D]"))),
+        datas_manut, m(colheita), d_pag, m(colheita),
+        m(colheita + meses_spot.astype("timedelta64[M]")),
+    ])
+    valores = np.column_stack([
+        -b(custo_insumos_proprio * (f(pct_entrada_insumo) / 100)),
+        -b(custo_insumos_proprio * (f(pct_parc2) / 100)),
+        -b(custo_insumos_proprio * (f(pct_parc3) / 100)),
+        -pago_bolso,
+        -b(np.where(vbf > 0, vbf + juros, 0.0)),
+        b(f(receita_hedge)),
+        b(f(receita_spot)),
+    ])
+    tipos = (
+        ["Insumos - Entrada", "Insumos - P2", "Insumos - P3"]
+        + [f"Manutenção {i + 1}" for i in range(d_max)]
+        + ["Colheita & Frete", "Custeio (Principal + Juros)", "Hedge (Liquidação)", "Spot (Venda do Saldo)"]
+    )
+    return {"data": datas, "valor": valores, "tipo": tipos}
+
+
+def consolidar_fluxo(ledger: dict, inicio=None, fim=None, resolucao="M", periodos_min=1) -> dict:
+    """Agrega o livro de eventos por período (mensal "M" ou diário "D").
+
+    Sem `inicio`/`fim`, o horizonte cobre todos os eventos não nulos (mínimo de `periodos_min`
+    períodos). Eventos fora do horizonte explícito são ignorados.
+    Retorna {"periodos", "entradas", "saidas", "saldo_acumulado"} com arrays (S, P).
+    """
+    unidade = "datetime64[%s]" % resolucao
+    datas = ledger["data"].astype(unidade)
+    valores = ledger["valor"]
+    relevantes = datas[valores != 0] if np.any(valores != 0) else datas.ravel()
+    ini = np.datetime64(inicio, resolucao) if inicio is not None else relevantes.min()
+    fim = np.datetime64(fim, resolucao) if fim is not None else max(relevantes.max(), ini + (periodos_min - 1))
+    P = int((fim - ini).astype(np.int64)) + 1
+    S = valores.shape[0]
+
+    idx = (datas - ini).astype(np.int64)
+    ok = (idx >= 0) & (idx < P)
+    flat = (np.arange(S)[:, None] * P + idx)[ok]
+    soma = lambda w: np.bincount(flat, weights=w[ok], minlength=S * P).reshape(S, P)
+    entradas = soma(np.where(valores > 0, valores, 0.0))
+    saidas = soma(np.where(valores < 0, -valores, 0.0))
+    return {
+        "periodos": np.arange(ini, fim + 1),
+        "entradas": entradas,
+        "saidas": saidas,
+        "saldo_acumulado": np.cumsum(entradas - saidas, axis=1),
+    }
+
+
+def necessidade_venda(entradas, saidas, preco_mercado, producao_total) -> dict:
+    """Déficit por período e sacas necessárias para cobri-lo, para S cenários (arrays (S, P))."""
+    preco = np.asarray(preco_mercado, dtype=float).reshape(-1, 1)
+    producao = np.asarray(producao_total, dtype=float).reshape(-1, 1)
+    gap = np.maximum(0, saidas - entradas)
+    sacas = np.divide(gap, preco, out=np.zeros_like(gap), where=preco > 0)
+    perc = np.divide(sacas * 100, producao, out=np.zeros_like(gap), where=producao > 0)
+    return {"deficit": gap, "sacas": sacas, "perc_safra": perc}
+
+
+def tabela_necessidade_venda(fluxo: dict, preco_mercado: float, producao_total: float, cenario: int = 0) -> pd.DataFrame:
+    """Tabela "Necessidade de Venda" (valores numéricos) de um cenário, com a linha TOTAL ACUMULADO.
+
+    Vazia quando o fluxo está coberto em todos os períodos.
+    """
+    nec = necessidade_venda(fluxo["entradas"][cenario:cenario + 1], fluxo["saidas"][cenario:cenario + 1], preco_mercado, producao_total)
+    com_gap = nec["deficit"][0] > 0
+    colunas = ["Mês", "Déficit a Cobrir", "Sacas Necessárias", "% da Safra"]
+    if not com_gap.any():
+        return pd.DataFrame(columns=colunas)
+    df = pd.DataFrame({
+        "Mês": pd.to_datetime(fluxo["periodos"][com_gap]).strftime("%b/%y"),
+        "Déficit a Cobrir": nec["deficit"][0][com_gap],
+        "Sacas Necessárias": nec["sacas"][0][com_gap],
+        "% da Safra": nec["perc_safra"][0][com_gap],
+    })
+    total_sacas = df["Sacas Necessárias"].sum()
+    total = {
+        "Mês": "TOTAL ACUMULADO",
+        "Déficit a Cobrir": df["Déficit a Cobrir"].sum(),
+        "Sacas Necessárias": total_sacas,
+        "% da Safra": (total_sacas / producao_total * 100) if producao_total > 0 else 0,
+    }
+    return pd.concat([df, pd.DataFrame([total])], ignore_index=True)
@@ -0,0 +1,92 @@
+# agro_formato.py
+# AgroExposure — Formatação pt-BR (R$ 1.234,56 / 12,5%) de colunas inteiras
+#
+# fmt_brl/fmt_dec/fmt_pct das páginas formatam um valor por vez (f-string + 3 replace) e eram
+# aplicados célula a célula (.apply / Styler.format). Aqui a coluna inteira é formatada numa
+# passada vetorizada:
+# - parte inteira/casas por aritmética inteira; cada grupo de linhas com o mesmo desenho
+#   (nº de dígitos e sinal) é escrito por fatias numa matriz de caracteres lida como str;
+# - mesmo arredondamento do f-string (empates, NaN/inf e números enormes vão para o Python);
+# - memo pequeno de colunas já formatadas: reruns com a mesma tabela não formatam de novo.
+# Valores não numéricos (texto, "-", None) passam inalterados, como nos fmt_* das páginas.
+
+import numpy as np
+import pandas as pd
+
+from agro_cache import CacheResultados, chave_canonica
+
+_TROCA_BR = str.maketrans(",.", ".,")
+_POT10 = 10 ** np.arange(19, dtype=np.int64)
+
+# Colunas já formatadas (mesmos valores + mesmo formato -> mesmo texto): reruns sem mudança
+_MEMO = CacheResultados(max_itens=64)
+
+
+def _codigos(texto: str) -> np.ndarray:
+    return np.frombuffer(texto.encode("utf-32-le"), dtype=np.uint32)
+
+
+def _numeros_br(x: np.ndarray, dec: int, prefixo: str, negativo: str, sufixo: str) -> np.ndarray:
+    """Textos de um array float, montados como matriz de caracteres (N, largura).
+
+    Linhas com o mesmo nº de dígitos e o mesmo sinal têm exatamente o mesmo desenho
+    ("R$ d.ddd,dd"), então cada grupo é preenchido por fatias de colunas, sem laço por valor.
+    Arredondamento igual ao do f-string: empates (…5 exato após as casas) e números fora da
+    precisão do float ficam para o formatador do Python, assim como NaN/inf.
+    """
+    a = np.abs(x)
+    finito = np.isfinite(a)
+    s = np.where(finito, a, 0.0) * 10.0 ** dec
+    fora = ~finito | (np.abs(s - np.floor(s) - 0.5) <= 4 * np.spacing(s)) | (s >= 2.0 ** 52)
+    ip, fr = np.divmod(np.where(fora, 0.0, np.rint(s)).astype(np.int64), _POT10[dec])
+    nd = np.searchsorted(_POT10[1:], ip, side="right") + 1   # dígitos da parte inteira
+    neg = x < 0
+
+    casas = 48 + (fr[:, None] // _POT10[dec - 1::-1][None, :]) % 10 if dec else None
+    W = max(len(prefixo), len(negativo)) + int(nd.max(initial=1)) * 4 // 3 + dec + 1 + len(sufixo)
+    m = np.zeros((x.size, W), dtype=np.uint32)
+    grupo = nd * 2 + neg
+    for g in np.unique(grupo):
+        n, pre = g // 2, (negativo if g % 2 else prefixo)
+        linhas = np.flatnonzero(grupo == g)
+        desenho = pre + f"{10 ** (n - 1):,}".replace(",", ".") + ("," + "0" * dec if dec else "") + sufixo
+        sub = np.broadcast_to(_codigos(desenho), (linhas.size, len(desenho))).copy()
+        col_dig = [j for j, c in enumerate(desenho[:len(pre) + n + (n - 1) // 3]) if j >= len(pre) and c.isdigit()]
+        sub[:, col_dig] = 48 + (ip[linhas, None] // _POT10[n - 1::-1][None, :]) % 10
+        if dec:
+            inicio = len(pre) + n + (n - 1) // 3 + 1
+            sub[:, inicio:inicio + dec] = casas[linhas]
+        m[linhas, :len(desenho)] = sub
+
+    # Lido como str, o NumPy descarta os NUL finais de cada linha
+    textos = m.view(f"<U{W}").ravel().astype(object)
+    for i in np.flatnonzero(fora):
+        v = float(x[i])
+        textos[i] = (negativo if v < 0 else prefixo) + f"{abs(v):,.{dec}f}".translate(_TROCA_BR) + sufixo
+    return textos
+
+
+def formatar_br(valores, dec=2, prefixo="", sufixo="", escala=1.0, sinal="-", sinal_antes_do_prefixo=True):
+    """Formata uma coluna (Series, array ou lista) no padrão BR: milhar com ponto, decimal com vírgula.
+
+    Cada número vira `sinal` (só negativos) + `prefixo` + valor absoluto × `escala` + `sufixo`;
+    com `sinal_antes_do_prefixo=False` o sinal vem depois do prefixo ("R$ -1.234,56").
+    Retorna Series (mesmo índice) para Series e array de objetos nos demais casos.
+    """
+    bruto = np.asarray(valores.to_numpy() if isinstance(valores, pd.Series) else valores)
+    if bruto.dtype.kind in "biuf":
+        numerico = np.ones(bruto.shape, dtype=bool)
+        saida = np.empty(bruto.shape, dtype=object)
+    else:
+        # Colunas mistas (ex.: DRE com "-" e textos): só as células numéricas são formatadas
+        numerico = np.fromiter((isinstance(v, (int, float, np.number)) for v in bruto.ravel()), dtype=bool, count=bruto.size).reshape(bruto.shape)
+        saida = bruto.astype(object).copy()
+
+    x = bruto[numerico].astype(float) * escala
+    negativo = sinal + prefixo if sinal_antes_do_prefixo else prefixo + sinal
+    chave = chave_canonica("formatar_br", x, dec, prefixo, negativo, sufixo)
+    saida[numerico] = _MEMO.obter_ou_calcular(chave, lambda: _numeros_br(x, dec, prefixo, negativo, sufixo))
+
+    if isinstance(valores, pd.Series):
+        return pd.Series(saida, index=valores.index, name=valores.name)
+    return saida
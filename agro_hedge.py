@@ -0,0 +1,106 @@
+# agro_hedge.py
+# AgroExposure — Otimizador de hedge (quanto travar agora × quando vender o saldo)
+#
+# Grade densa e vetorizada sobre agro_engine.calcular_kpis:
+# - eixo 1: % adicional da produção vendida agora ao preço da nova venda (What-If);
+# - eixo 2: mês de venda do saldo spot após a colheita (agenda de preços da sazonalidade,
+#   menos armazenagem por mês carregado).
+# Objetivo: maior margem esperada (lucro esperado / receita esperada). Restrições:
+# - caixa: a receita da nova venda cobre o déficit total de caixa ("Necessidade de Venda"),
+#   recalculado para cada mês de venda do saldo (vender mais tarde adia a entrada do spot);
+# - exposição: % spot (100 - % travado) <= exposição máxima.
+# O risco de cada ponto é a margem no P5 do preço (lognormal, volatilidade anual).
+
+import numpy as np
+
+from agro_engine import calcular_kpis
+
+Z_P5 = -1.6448536269514722
+
+
+def agenda_precos(preco_mercado, indices_sazonais, referencia, inicio_venda, n_meses=7) -> dict:
+    """Preço projetado do saldo em cada mês a partir de `inicio_venda` (mês da colheita).
+
+    `referencia` é a data do `preco_mercado` no plano (ex.: o desembolso do custeio), não o
+    relógio: o horizonte de risco de cada mês é medido a partir dela. Mesma projeção da aba
+    Sazonalidade: índice do mês × preço de referência / índice do mês de referência.
+    Retorna {"mes": datetime64[M] (M,), "preco": (M,), "horizonte": meses desde a referência (M,)}.
+    """
+    idx = np.asarray(indices_sazonais, dtype=float)
+    mes_ref = np.datetime64(referencia, "M")
+    meses = np.datetime64(inicio_venda, "M") + np.arange(n_meses)
+    cal = meses.astype(np.int64) % 12
+    fator = preco_mercado / idx[mes_ref.astype(np.int64) % 12]
+    return {
+        "mes": meses,
+        "preco": idx[cal] * fator,
+        "horizonte": np.maximum(0, (meses - mes_ref).astype(np.int64)),
+    }
+
+
+def otimizar_hedge(base: dict, preco_venda, agenda: dict, deficit_caixa=0.0, exposicao_max=100.0,
+                   vol_preco=0.20, custo_arm_mes=0.0, passo=0.5) -> dict:
+    """Busca em grade (% nova venda × mês de venda do saldo) da maior margem esperada viável.
+
+    `base` são os argumentos de calcular_kpis do cenário atual (escalares); `deficit_caixa` é
+    escalar ou (M,), o déficit com o saldo vendido em cada mês da agenda. Retorna arrays
+    (H, M) "margem" e "margem_p5", a máscara "viavel", os eixos "hedge_extra" (% da produção)
+    e "exposicao" (H,), o "melhor" ponto (i, j) ou None e a "fronteira" exposição × margem.
+    """
+    atual = calcular_kpis(**base)
+    perc0, pmv0 = float(base["perc_comercializado"]), float(base["preco_medio_venda"])
+    producao = float(atual["producao_total"])
+    limite = float(atual["qtd_aberta_fisica"] / producao * 100) if producao > 0 else 0.0
+
+    h = np.unique(np.clip(np.arange(0.0, limite + passo, passo), 0.0, limite))
+    perc = perc0 + h
+    pmv = np.where(perc > 0, (perc0 * pmv0 + h * preco_venda) / np.where(perc > 0, perc, 1.0), pmv0)
+
+    # Preço do saldo por mês: esperado e P5 (lognormal até o mês de venda), líquido de armazenagem
+    carrego = custo_arm_mes * np.arange(len(agenda["preco"]))
+    t = agenda["horizonte"] / 12
+    p5 = agenda["preco"] * np.exp(-0.5 * vol_preco ** 2 * t + Z_P5 * vol_preco * np.sqrt(t))
+    precos = np.stack([agenda["preco"], p5]) - carrego          # (2, M)
+
+    kpis = calcular_kpis(**{
+        **base,
+        "perc_comercializado": perc[None, :, None],
+        "preco_medio_venda": pmv[None, :, None],
+        "preco_mercado": precos[:, None, :],
+    })
+    margem, margem_p5 = kpis["margem_liquida_perc"]
+
+    exposicao = 100 - perc
+    deficit = np.broadcast_to(np.asarray(deficit_caixa, dtype=float), agenda["preco"].shape)
+    cobre_caixa = (h / 100 * producao * preco_venda)[:, None] >= deficit[None, :] - 1e-6
+    viavel = (exposicao <= exposicao_max)[:, None] & cobre_caixa
+
+    melhor = None
+    if viavel.any():
+        melhor = np.unravel_index(np.argmax(np.where(viavel, margem, -np.inf)), margem.shape)
+
+    # Fronteira: melhor mês (viável, quando houver) para cada nível de exposição; eficiente =
+    # não dominado (nenhum ponto com menos exposição tem margem maior ou igual)
+    j = np.where(viavel.any(axis=1), np.where(viavel, margem, -np.inf).argmax(axis=1), margem.argmax(axis=1))
+    m_front = margem[np.arange(h.size), j]
+    ordem = np.argsort(exposicao)
+    melhor_antes = np.maximum.accumulate(np.concatenate([[-np.inf], m_front[ordem][:-1]]))
+    eficiente = np.empty(h.size, dtype=bool)
+    eficiente[ordem] = m_front[ordem] > melhor_antes
+    fronteira = {
+        "exposicao": exposicao,
+        "margem": m_front,
+        "margem_p5": margem_p5[np.arange(h.size), j],
+        "mes": agenda["mes"][j],
+        "viavel": viavel[np.arange(h.size), j],
+        "eficiente": eficiente,
+    }
+    return {
+        "hedge_extra": h,
+        "exposicao": exposicao,
+        "margem": margem,
+        "margem_p5": margem_p5,
+        "viavel": viavel,
+        "melhor": melhor,
+        "fronteira": fronteira,
+    }
@@ -0,0 +1,138 @@
+# agro_montecarlo.py
+# AgroExposure — Monte Carlo (preço × produtividade × quebra) em lotes vetorizados
+#
+# - Cada lote sorteia N caminhos e avalia agro_engine.calcular_kpis de uma vez;
+# - Semente fixa: cada lote usa um filho de SeedSequence(seed), então o resultado não
+#   depende de quando a simulação é lida nem de quantos usuários estão rodando;
+# - SimulacaoMonteCarlo roda os lotes num pool de threads do processo, fora da thread do
+#   script Streamlit; a página só lê o resultado parcial (resultados()) enquanto roda;
+# - Os resultados são dobrados em SketchQuantis (memória constante, mesclável), então
+#   1M ou 100M caminhos ocupam o mesmo espaço.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from agro_engine import calcular_kpis
+from agro_quantis import SketchQuantis
+
+# Pool compartilhado por todas as sessões do processo (limita CPU em reuniões)
+_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="agro-mc")
+
+# KPIs guardados por caminho
+KPIS_MC = ("lucro_liquido", "margem_liquida_perc")
+
+
+def sortear_caminhos(rng, n, preco_mercado, produtividade, vol_preco, cv_produtividade, prob_quebra, quebra_max) -> dict:
+    """Sorteia `n` caminhos de preço (lognormal, média = preço atual), produtividade (normal, >= 0)
+    e quebra (com probabilidade `prob_quebra`, perda uniforme entre 0 e `quebra_max`)."""
+    z_preco = rng.standard_normal(n)
+    z_prod = rng.standard_normal(n)
+    preco = preco_mercado * np.exp(vol_preco * z_preco - 0.5 * vol_preco ** 2)
+    prod = produtividade * np.maximum(0.0, 1.0 + cv_produtividade * z_prod)
+    quebra = np.where(rng.random(n) < prob_quebra, rng.uniform(0.0, quebra_max, n), 0.0)
+    return {"preco_mercado": preco, "produtividade": prod, "fator_quebra": quebra}
+
+
+def simular_lotes(base: dict, n_caminhos=1_000_000, seed=42, tamanho_lote=100_000, vol_preco=0.20,
+                  cv_produtividade=0.10, prob_quebra=0.10, quebra_max=0.40):
+    """Gerador: avalia `n_caminhos` em lotes e devolve {kpi: array} por lote.
+
+    `base` são os argumentos de calcular_kpis do cenário atual (preço/produtividade viram sorteios).
+    """
+    n_lotes = -(-int(n_caminhos) // int(tamanho_lote))
+    for i, filho in enumerate(np.random.SeedSequence(seed).spawn(n_lotes)):
+        n = min(tamanho_lote, n_caminhos - i * tamanho_lote)
+        sorteio = sortear_caminhos(
+            np.random.default_rng(filho), n, base["preco_mercado"], base["produtividade"],
+            vol_preco, cv_produtividade, prob_quebra, quebra_max,
+        )
+        kpis = calcular_kpis(**{**base, **sorteio})
+        yield {k: kpis[k] for k in KPIS_MC}
+
+
+def simular_resumo(base: dict, n_caminhos=1_000_000, seed=42, tamanho_lote=100_000, **parametros) -> dict:
+    """Roda a simulação inteira e devolve {kpi: SketchQuantis}.
+
+    Função de módulo (picklable): pode ser distribuída num ProcessPoolExecutor com sementes
+    diferentes e os sketches combinados com SketchQuantis.combinar.
+    """
+    sketches = {k: SketchQuantis() for k in KPIS_MC}
+    for lote in simular_lotes(base, n_caminhos, seed, tamanho_lote, **parametros):
+        for k in KPIS_MC:
+            sketches[k].adicionar(lote[k])
+    return sketches
+
+
+def resumo(sketch: SketchQuantis) -> dict:
+    """P5/P50/P95, média, média dos 5% piores e probabilidade de valor negativo."""
+    p5, p50, p95 = (float(v) for v in sketch.quantil([0.05, 0.50, 0.95]))
+    return {
+        "p5": p5,
+        "p50": p50,
+        "p95": p95,
+        "media": sketch.media,
+        "desvio": sketch.desvio,
+        "cauda_5": sketch.media_cauda(0.05),
+        "prob_negativo": float(sketch.cdf(0.0)) if sketch.n else 0.0,
+    }
+
+
+class SimulacaoMonteCarlo:
+    """Simulação em segundo plano com leitura de resultados parciais.
+
+    Uso na página: criar, chamar iniciar(), guardar em st.session_state e ler
+    progresso / resultados() a cada atualização do painel.
+    """
+
+    def __init__(self, base: dict, n_caminhos=1_000_000, seed=42, tamanho_lote=100_000, **parametros):
+        self.base = dict(base)
+        self.n_caminhos = int(n_caminhos)
+        self.seed = seed
+        self.tamanho_lote = int(tamanho_lote)
+        self.parametros = parametros
+        self._lock = threading.Lock()
+        self._cancelar = threading.Event()
+        self._sketches = {k: SketchQuantis() for k in KPIS_MC}
+        self._feitos = 0
+        self._future = None
+        self.erro = None
+
+    def iniciar(self) -> "SimulacaoMonteCarlo":
+        if self._future is None:
+            self._future = _EXECUTOR.submit(self._rodar)
+        return self
+
+    def cancelar(self) -> None:
+        self._cancelar.set()
+
+    def _rodar(self) -> None:
+        try:
+            lotes = simular_lotes(self.base, self.n_caminhos, self.seed, self.tamanho_lote, **self.parametros)
+            for lote in lotes:
+                if self._cancelar.is_set():
+                    break
+                with self._lock:
+                    for k in KPIS_MC:
+                        self._sketches[k].adicionar(lote[k])
+                    self._feitos += len(lote[KPIS_MC[0]])
+        except Exception as e:  # a página mostra o erro em vez de travar
+            self.erro = e
+
+    @property
+    def feitos(self) -> int:
+        return self._feitos
+
+    @property
+    def progresso(self) -> float:
+        return self._feitos / self.n_caminhos if self.n_caminhos > 0 else 1.0
+
+    @property
+    def rodando(self) -> bool:
+        return self._future is not None and not self._future.done()
+
+    def resultados(self) -> dict:
+        """Snapshot dos caminhos já simulados: {kpi: SketchQuantis}."""
+        with self._lock:
+            return {k: v.copia() for k, v in self._sketches.items()}
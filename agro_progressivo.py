@@ -0,0 +1,42 @@
+# agro_progressivo.py
+# AgroExposure — Renderização progressiva (KPIs primeiro, seções pesadas em segundo plano)
+#
+# A página só aparecia inteira depois de calcular fluxo de caixa, curvas de sensibilidade,
+# metas e mapa de calor, um depois do outro, na thread do script. Aqui:
+# - logo após a conta dos KPIs, a página entrega os cálculos pesados (funções puras, em
+#   cache) a um pool de threads do processo com `antecipar`; KPIs e gauge são desenhados
+#   enquanto eles rodam;
+# - cada seção chama `aguardar` no ponto em que é desenhada: se o resultado ainda não
+#   chegou, um aviso ocupa o lugar da seção e é substituído pelo conteúdo quando termina.
+# Só a thread do script escreve na página (elementos do Streamlit não podem ser criados de
+# outras threads); os workers apenas calculam. Se o rerun for interrompido, o que já estiver
+# rodando termina e fica no cache (agro_cache) para o próximo rerun.
+
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import streamlit as st
+
+# Pool compartilhado por todas as sessões do processo
+_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="agro-secao")
+
+AVISO_CALCULANDO = "⏳ Calculando…"
+
+
+def antecipar(funcao, *args, **kwargs) -> Future:
+    """Começa `funcao(*args, **kwargs)` no pool e devolve o Future (a função não pode usar st.*)."""
+    return _EXECUTOR.submit(funcao, *args, **kwargs)
+
+
+def aguardar(futuro: Future, texto: str = AVISO_CALCULANDO):
+    """Resultado de `futuro`; enquanto não termina, `texto` fica no lugar da seção.
+
+    Exceções do cálculo são relançadas aqui, na thread do script.
+    """
+    if futuro.done():
+        return futuro.result()
+    aviso = st.empty()
+    aviso.caption(texto)
+    try:
+        return futuro.result()
+    finally:
+        aviso.empty()
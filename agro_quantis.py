@@ -0,0 +1,120 @@
+# agro_quantis.py
+# AgroExposure — Resumo de distribuições em memória constante (t-digest vetorizado)
+#
+# Para varreduras grandes / Monte Carlo não guardamos cada resultado: cada lote é dobrado
+# num conjunto pequeno de centróides (média, peso) com a escala k1 do t-digest (mais
+# resolução nas caudas, onde ficam P5/P95). Também mantém contagem, média e variância
+# exatas (fórmula de Chan) e mín/máx.
+#
+# Sketches são objetos simples (arrays NumPy) -> podem ser mesclados entre lotes, threads
+# ou processos (pickle) com mesclar().
+
+import numpy as np
+
+
+class SketchQuantis:
+    """Quantis, média, variância e médias de cauda de um fluxo de valores, em memória constante.
+
+    `compressao` controla o nº de centróides (~compressao/2) e a precisão dos quantis.
+    """
+
+    def __init__(self, compressao: float = 300.0):
+        self.compressao = float(compressao)
+        self.medias = np.empty(0)
+        self.pesos = np.empty(0)
+        self.n = 0
+        self.media = 0.0
+        self._m2 = 0.0
+        self.minimo = np.inf
+        self.maximo = -np.inf
+
+    # ---------------- atualização ----------------
+    def adicionar(self, valores) -> "SketchQuantis":
+        """Incorpora um lote de valores (array)."""
+        x = np.asarray(valores, dtype=float).ravel()
+        x = x[np.isfinite(x)]
+        if x.size == 0:
+            return self
+        media_lote = float(x.mean())
+        self._combinar_momentos(x.size, media_lote, float(((x - media_lote) ** 2).sum()), float(x.min()), float(x.max()))
+        self._comprimir(np.concatenate([self.medias, x]), np.concatenate([self.pesos, np.ones(x.size)]))
+        return self
+
+    def mesclar(self, outro: "SketchQuantis") -> "SketchQuantis":
+        """Mescla outro sketch (de outro lote, thread ou processo) neste."""
+        if outro.n == 0:
+            return self
+        self._combinar_momentos(outro.n, outro.media, outro._m2, outro.minimo, outro.maximo)
+        self._comprimir(np.concatenate([self.medias, outro.medias]), np.concatenate([self.pesos, outro.pesos]))
+        return self
+
+    @classmethod
+    def combinar(cls, sketches) -> "SketchQuantis":
+        sketches = list(sketches)
+        out = cls(sketches[0].compressao if sketches else 300.0)
+        for s in sketches:
+            out.mesclar(s)
+        return out
+
+    def copia(self) -> "SketchQuantis":
+        return SketchQuantis(self.compressao).mesclar(self)
+
+    def _combinar_momentos(self, n_b, media_b, m2_b, min_b, max_b) -> None:
+        n_a = self.n
+        n = n_a + n_b
+        delta = media_b - self.media
+        self.media += delta * n_b / n
+        self._m2 += m2_b + delta ** 2 * n_a * n_b / n
+        self.n = n
+        self.minimo = min(self.minimo, min_b)
+        self.maximo = max(self.maximo, max_b)
+
+    def _comprimir(self, medias, pesos) -> None:
+        ordem = np.argsort(medias, kind="mergesort")
+        medias, pesos = medias[ordem], pesos[ordem]
+        total = pesos.sum()
+        q = (np.cumsum(pesos) - pesos / 2) / total
+        # Escala k1: k(q) = δ/(2π)·asin(2q-1); cada centróide cobre no máx. ~1 unidade de k
+        k = np.floor(self.compressao / (2 * np.pi) * np.arcsin(2 * q - 1))
+        grupo = np.concatenate([[0], np.cumsum(np.diff(k) > 0)])
+        self.pesos = np.bincount(grupo, weights=pesos)
+        self.medias = np.bincount(grupo, weights=pesos * medias) / self.pesos
+
+    # ---------------- consultas ----------------
+    @property
+    def variancia(self) -> float:
+        return self._m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def desvio(self) -> float:
+        return float(np.sqrt(self.variancia))
+
+    def _pontos(self):
+        # Curva (posição acumulada, valor) passando pelo meio de cada centróide e pelos extremos
+        t = np.concatenate([[0.0], np.cumsum(self.pesos) - self.pesos / 2, [float(self.n)]])
+        x = np.concatenate([[self.minimo], self.medias, [self.maximo]])
+        return t, x
+
+    def quantil(self, q):
+        """Quantil(is) aproximado(s); `q` em [0, 1] (escalar ou array)."""
+        if self.n == 0:
+            return np.zeros_like(np.asarray(q, dtype=float))
+        t, x = self._pontos()
+        return np.interp(np.asarray(q, dtype=float) * self.n, t, x)
+
+    def cdf(self, valores):
+        """Fração aproximada de resultados <= `valores`."""
+        if self.n == 0:
+            return np.zeros_like(np.asarray(valores, dtype=float))
+        t, x = self._pontos()
+        return np.interp(valores, x, t) / self.n
+
+    def media_cauda(self, alfa: float = 0.05, inferior: bool = True) -> float:
+        """Média dos `alfa` piores (inferior=True) ou melhores resultados (CVaR / expected shortfall)."""
+        if self.n == 0 or alfa <= 0:
+            return 0.0
+        medias, pesos = (self.medias, self.pesos) if inferior else (self.medias[::-1], self.pesos[::-1])
+        massa = min(1.0, alfa) * self.n
+        antes = np.cumsum(pesos) - pesos
+        usado = np.clip(massa - antes, 0, pesos)
+        return float((usado * medias).sum() / usado.sum())
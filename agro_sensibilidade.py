@@ -0,0 +1,133 @@
+# agro_sensibilidade.py
+# AgroExposure — Sensibilidade vetorizada (mapa de margem por hectare)
+#
+# Substitui os loops aninhados do "Mapa de Sensibilidade" por broadcasting NumPy:
+# a grade produtividade × preço (e, opcionalmente, um 3º eixo de quebra ou juros)
+# é calculada numa única expressão, em resoluções de até MAX_CELULAS (1000 × 1000) células.
+
+import math
+
+import numpy as np
+
+# Teto de células de uma grade (o mapa roda no pool compartilhado e fica no cache do processo)
+MAX_CELULAS = 1_000_000
+
+
+def _milhar(n: int) -> str:
+    return f"{n:,}".replace(",", ".")
+
+
+def _pontos(inicio: float, fim: float, passo: float) -> int:
+    """Nº de pontos de eixo(inicio, fim, passo), validando a faixa sem alocar nada."""
+    if passo <= 0:
+        raise ValueError("O passo da grade deve ser maior que zero.")
+    if fim <= inicio:
+        raise ValueError("O limite final da grade deve ser maior que o inicial.")
+    return math.ceil((fim - inicio) / passo)
+
+
+def eixo(inicio: float, fim: float, passo: float, max_pontos: int = MAX_CELULAS) -> np.ndarray:
+    """Eixo da grade no mesmo padrão do np.arange das páginas (fim exclusivo)."""
+    n = _pontos(inicio, fim, passo)
+    if n > max_pontos:
+        raise ValueError(f"A faixa teria {_milhar(n)} pontos (máximo {_milhar(max_pontos)}); aumente o passo.")
+    return np.arange(inicio, fim, passo, dtype=float)
+
+
+def grade(faixa_linhas, faixa_colunas, max_celulas: int = MAX_CELULAS):
+    """Eixos (linhas, colunas) de uma grade `(inicio, fim, passo)` × `(inicio, fim, passo)`.
+
+    ValueError se alguma faixa for inválida ou se a grade passar de `max_celulas` células.
+    """
+    n_linhas, n_colunas = _pontos(*faixa_linhas), _pontos(*faixa_colunas)
+    if n_linhas * n_colunas > max_celulas:
+        raise ValueError(
+            f"A grade teria {_milhar(n_linhas)} × {_milhar(n_colunas)} = {_milhar(n_linhas * n_colunas)} células "
+            f"(máximo {_milhar(max_celulas)}); aumente os passos ou reduza as faixas."
+        )
+    return eixo(*faixa_linhas), eixo(*faixa_colunas)
+
+
+def custo_fixo_ha(custo_operacional_total, valor_base_financiamento, taxa_juros_ano, dias_financiamento, area_total):
+    """Custo de caixa por hectare (Operação + Juros) — aceita arrays (ex.: vários juros)."""
+    juros = np.asarray(valor_base_financiamento, dtype=float) * ((np.asarray(taxa_juros_ano, dtype=float) / 100) / 365) * dias_financiamento
+    return (custo_operacional_total + juros) / area_total
+
+
+def mapa_margem_ha(prod_range, preco_range, custo_fixo_ha, arr_sc_ha_medio=0.0, fator_quebra=0.0) -> np.ndarray:
+    """Margem líquida (R$/ha) para cada produtividade (linhas) × preço (colunas).
+
+    - `custo_fixo_ha`: (Operação + Juros) / área total;
+    - `arr_sc_ha_medio`: sacas de arrendamento por hectare da área total (área arrendada × sc/ha ÷ área total),
+      valorizadas ao preço de cada coluna;
+    - `fator_quebra`: fração (0–1) aplicada sobre a produtividade.
+
+    Se `custo_fixo_ha` ou `fator_quebra` forem arrays 1-D, o resultado ganha um eixo à esquerda
+    (cubo k × produtividade × preço). Use apenas um deles como 3º eixo por chamada.
+    """
+    prod = np.asarray(prod_range, dtype=float)[:, None]
+    preco = np.asarray(preco_range, dtype=float)[None, :]
+    cf = np.asarray(custo_fixo_ha, dtype=float)[..., None, None]
+    q = np.asarray(fator_quebra, dtype=float)[..., None, None]
+    return prod * (1 - q) * preco - cf - arr_sc_ha_medio * preco
+
+
+# ============================================================
+# Curvas multi-driver e tornado (margem líquida vs. cada driver)
+# ============================================================
+
+# Drivers sensibilizados (nome do argumento de agro_engine.calcular_kpis -> rótulo)
+DRIVERS = {
+    "preco_mercado": "Preço de Mercado (R$/sc)",
+    "produtividade": "Produtividade (sc/ha)",
+    "taxa_juros_ano": "Taxa de Juros (% a.a.)",
+    "custo_ha_operacional": "Custo Operacional (R$/ha)",
+    "perc_comercializado": "% Travado (Hedge)",
+}
+
+# Limites físicos de alguns drivers (percentuais das páginas, 0–100)
+_LIMITES = {"perc_comercializado": (0.0, 100.0), "taxa_juros_ano": (0.0, None)}
+
+
+def faixa_driver(base: dict, driver: str, variacao: float, pontos: int) -> np.ndarray:
+    """Pontos do driver em ±`variacao` (fração) ao redor do valor-base, respeitando limites."""
+    v = float(base[driver])
+    x = np.linspace(v * (1 - variacao), v * (1 + variacao), pontos)
+    lo, hi = _LIMITES.get(driver, (None, None))
+    return np.clip(x, lo, hi) if (lo is not None or hi is not None) else x
+
+
+def curvas_sensibilidade(base: dict, variacao=0.25, pontos=500, drivers=None, kpi="margem_liquida_perc", faixas=None) -> dict:
+    """Avalia `kpi` contra cada driver numa única chamada vetorizada do motor.
+
+    `base` são os argumentos de calcular_kpis para o cenário atual. Cada driver varia
+    em ±`variacao` (ou na faixa explícita `faixas[driver] = (min, max)`) mantendo os demais fixos.
+    Retorna {driver: (x, y)}.
+    """
+    from agro_engine import calcular_kpis
+
+    drivers = list(drivers or DRIVERS)
+    faixas = faixas or {}
+    xs = np.empty((len(drivers), pontos))
+    for d, nome in enumerate(drivers):
+        if nome in faixas:
+            xs[d] = np.linspace(faixas[nome][0], faixas[nome][1], pontos)
+        else:
+            xs[d] = faixa_driver(base, nome, variacao, pontos)
+
+    # Linha d da grade varia só o driver d; demais entradas ficam no valor-base (broadcast)
+    entradas = {k: np.full((len(drivers), pontos), v, dtype=float) for k, v in base.items()}
+    for d, nome in enumerate(drivers):
+        entradas[nome][d] = xs[d]
+    y = calcular_kpis(**entradas)[kpi]
+    return {nome: (xs[d], y[d]) for d, nome in enumerate(drivers)}
+
+
+def tornado(base: dict, variacao=0.10, drivers=None, kpi="margem_liquida_perc") -> list:
+    """Ranking de drivers pelo impacto no `kpi` com choque de ±`variacao`.
+
+    Retorna lista de tuplas (driver, kpi_baixo, kpi_alto), do maior para o menor impacto.
+    """
+    curvas = curvas_sensibilidade(base, variacao=variacao, pontos=2, drivers=drivers, kpi=kpi)
+    linhas = [(nome, float(y[0]), float(y[1])) for nome, (_, y) in curvas.items()]
+    return sorted(linhas, key=lambda r: abs(r[2] - r[1]), reverse=True)
@@ -0,0 +1,148 @@
+# agro_solver.py
+# AgroExposure — Solver inverso em lote ("qual valor de X atinge a meta?")
+#
+# Perguntas do tipo "qual preço / % travado / produtividade / juros zera o lucro, entrega a
+# margem desejada ou cobre o caixa?" para N cenários (fazendas) de uma vez:
+# - Cada meta é um resíduo r(X) = 0 calculado sobre agro_engine.calcular_kpis;
+# - 1º passo é a interpolação linear entre os extremos da faixa: como o lucro é afim em preço
+#   e juros, esse passo já é a solução fechada (verificada pelo resíduo);
+# - Onde o resíduo é só afim por partes (volume aberto com max(0, ·), caixa mês a mês),
+#   segue regula falsi (Illinois) vetorizada, com o intervalo sempre entre sinais opostos.
+# Cenários sem mudança de sinal na faixa retornam NaN (meta inatingível na faixa), assim como
+# os que não convergem em max_iter (nunca um valor aproximado apresentado como resposta).
+
+import numpy as np
+
+from agro_engine import calcular_kpis
+from agro_fluxo import consolidar_fluxo, eventos_safra, primeiro_mes_apos
+
+# Variáveis que o solver pode ajustar (argumento de calcular_kpis -> rótulo)
+VARIAVEIS = {
+    "preco_mercado": "Preço de Mercado (R$/sc)",
+    "perc_comercializado": "% Travado (Hedge)",
+    "produtividade": "Produtividade (sc/ha)",
+    "taxa_juros_ano": "Taxa de Juros (% a.a.)",
+}
+
+
+def faixa_padrao(base: dict, variavel: str) -> tuple:
+    """Faixa de busca default de cada variável (limites físicos ou múltiplo do valor-base)."""
+    if variavel == "perc_comercializado":
+        return 0.0, 100.0
+    if variavel == "taxa_juros_ano":
+        return 0.0, 1000.0
+    return 0.0, 10 * np.maximum(1.0, np.asarray(base[variavel], dtype=float))
+
+
+# ---------------- metas (resíduos) ----------------
+def meta_lucro(alvo=0.0):
+    """Lucro líquido = `alvo` (default: lucro zero / nivelamento)."""
+    return lambda kpis, entradas: kpis["lucro_liquido"] - alvo
+
+
+def meta_margem(margem=None):
+    """Margem líquida = `margem` % (default: margem_desejada de cada cenário).
+
+    Usa lucro - m·receita (contínuo) em vez de margem_liquida_perc, que salta para 0 sem receita.
+    """
+    def residuo(kpis, entradas):
+        m = entradas["margem_desejada"] if margem is None else margem
+        return kpis["lucro_liquido"] - (np.asarray(m, dtype=float) / 100) * kpis["receita_bruta_total"]
+    return residuo
+
+
+def meta_caixa(cronograma: dict):
+    """Saldo acumulado >= 0 em todos os meses a partir da colheita (todo déficit mensal coberto).
+
+    `cronograma` são os demais argumentos de agro_fluxo.eventos_safra (percentuais de custo,
+    parcelas, datas, meses de plantio/colheita...). O resíduo é o menor saldo acumulado do período.
+    """
+    def residuo(kpis, entradas):
+        forma = kpis["lucro_liquido"].shape
+        r = lambda k: np.ravel(kpis[k])
+        ledger = eventos_safra(
+            custo_operacional_total=r("custo_operacional_total"),
+            valor_base_financiamento=r("valor_base_financiamento"),
+            custo_financeiro_juros=r("custo_financeiro_juros"),
+            receita_hedge=r("receita_hedge"),
+            receita_spot=r("receita_spot"),
+            **cronograma,
+        )
+        fluxo = consolidar_fluxo(ledger, resolucao="M")
+        colheita = primeiro_mes_apos(primeiro_mes_apos(cronograma["data_tomada"], cronograma["mes_plantio"]), cronograma["mes_colheita"])
+        apos_colheita = fluxo["periodos"][None, :] >= colheita[:, None]
+        saldo = np.where(apos_colheita, fluxo["saldo_acumulado"], np.inf).min(axis=1)
+        return saldo.reshape(forma)
+    return residuo
+
+
+# ---------------- solver ----------------
+def resolver(base: dict, variavel: str, meta, faixa=None, tol=1e-6, max_iter=60) -> dict:
+    """Valor de `variavel` que zera o resíduo `meta(kpis, entradas)` em cada cenário.
+
+    `base` são os argumentos de calcular_kpis (escalares ou arrays de N cenários). `faixa` =
+    (mín, máx) — escalares ou arrays — limita a busca (default: faixa_padrao).
+    Retorna {"valor": array (NaN sem solução na faixa ou sem convergência), "resolvido": bool,
+    "residuo": array}.
+    """
+    entradas = {k: np.asarray(v, dtype=float) for k, v in base.items()}
+    forma = np.broadcast_shapes(*(v.shape for v in entradas.values()))
+    lo, hi = faixa if faixa is not None else faixa_padrao(base, variavel)
+    lo = np.array(np.broadcast_to(np.asarray(lo, dtype=float), forma))
+    hi = np.array(np.broadcast_to(np.asarray(hi, dtype=float), forma))
+
+    def avaliar(x):
+        e = {**entradas, variavel: x}
+        return np.array(np.broadcast_to(meta(calcular_kpis(**e), e), forma), dtype=float)
+
+    f_lo, f_hi = avaliar(lo), avaliar(hi)
+    com_raiz = np.sign(f_lo) * np.sign(f_hi) <= 0
+    tol_f = tol * np.maximum(1.0, np.maximum(np.abs(f_lo), np.abs(f_hi)))
+
+    def secante(lo, hi, f_lo, f_hi):
+        den = f_hi - f_lo
+        x = np.where(den != 0, (lo * f_hi - hi * f_lo) / np.where(den != 0, den, 1.0), (lo + hi) / 2)
+        # Fora do intervalo (erro numérico) -> bissecção
+        return np.where((x >= np.minimum(lo, hi)) & (x <= np.maximum(lo, hi)), x, (lo + hi) / 2)
+
+    # Passo fechado (exato para resíduos afins na variável)
+    x = np.where(f_lo == 0, lo, secante(lo, hi, f_lo, f_hi))
+    fx = avaliar(x)
+    ativo = com_raiz & (np.abs(fx) > tol_f)
+    lado_ant = np.zeros(forma, dtype=np.int8)
+
+    for _ in range(max_iter):
+        if not ativo.any():
+            break
+        troca_lo = ativo & (fx * f_lo > 0)
+        troca_hi = ativo & ~troca_lo
+        # Illinois: mesmo extremo trocado duas vezes seguidas -> reduz o peso do outro
+        f_hi = np.where(troca_lo & (lado_ant == -1), f_hi / 2, f_hi)
+        f_lo = np.where(troca_hi & (lado_ant == 1), f_lo / 2, f_lo)
+        lo, f_lo = np.where(troca_lo, x, lo), np.where(troca_lo, fx, f_lo)
+        hi, f_hi = np.where(troca_hi, x, hi), np.where(troca_hi, fx, f_hi)
+        lado_ant = np.where(troca_lo, -1, np.where(troca_hi, 1, lado_ant)).astype(np.int8)
+
+        x = np.where(ativo, secante(lo, hi, f_lo, f_hi), x)
+        fx = np.where(ativo, avaliar(x), fx)
+        estreito = np.abs(hi - lo) <= tol * np.maximum(1.0, np.abs(x))
+        ativo &= (np.abs(fx) > tol_f) & ~estreito
+
+    resolvido = com_raiz & ~ativo
+    return {"valor": np.where(resolvido, x, np.nan), "resolvido": resolvido, "residuo": fx}
+
+
+def resolver_metas(base: dict, cronograma=None, variaveis=None, faixas=None) -> dict:
+    """Painel de metas: {variável: {"lucro_zero", "margem_meta"[, "caixa_coberto"]: array}}.
+
+    A meta de caixa só entra quando o `cronograma` do fluxo (ver meta_caixa) é informado.
+    Metas sem solução resolvida (fora da faixa ou sem convergência) vêm como NaN ("—" na página).
+    """
+    metas = {"lucro_zero": meta_lucro(0.0), "margem_meta": meta_margem()}
+    if cronograma is not None:
+        metas["caixa_coberto"] = meta_caixa(cronograma)
+    faixas = faixas or {}
+    return {
+        v: {nome: resolver(base, v, m, faixa=faixas.get(v))["valor"] for nome, m in metas.items()}
+        for v in (variaveis or VARIAVEIS)
+    }
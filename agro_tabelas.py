@@ -0,0 +1,64 @@
+# agro_tabelas.py
+# AgroExposure — Tabelas com estilo pré-calculado (sem callbacks por célula)
+#
+# Styler.applymap(func) / .apply(func, axis=1) chamam uma função Python por célula (ou linha)
+# a cada rerun. Aqui o estilo sai numa passada vetorizada por coluna, como uma máscara
+# (DataFrame de CSS do mesmo formato da tabela), entregue ao Styler de uma vez só:
+# - mascara_sinais: negativos em vermelho terroso, positivos em verde, textos "-…" em
+#   vermelho e percentuais em verde (regras da DRE Gerencial);
+# - mascara_linhas: destaque de linhas inteiras (ex.: TOTAL);
+# - exibir_tabela: alinhamento/fixação de colunas pelo column_config nativo do st.dataframe;
+#   acima de LIMITE_ESTILO células a tabela vai sem cores (o Styler renderiza célula a
+#   célula no servidor) e continua interativa.
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+CSS_NEGATIVO = "color: #A94A44; font-weight: 800;"
+CSS_POSITIVO = "color: #164B2E; font-weight: 800;"
+CSS_PERCENTUAL = "color: #164B2E; font-weight: 900;"
+CSS_TOTAL = "font-weight: bold; background-color: #E8F5E9; color: var(--primary); border-top: 2px solid var(--primary)"
+
+LIMITE_ESTILO = 50_000
+
+
+def mascara_sinais(df: pd.DataFrame, colunas) -> pd.DataFrame:
+    """CSS de cada célula de `colunas` pelo valor bruto (números) ou pelo texto já formatado."""
+    estilos = {}
+    for c in colunas:
+        valores = df[c]
+        x = pd.to_numeric(valores, errors="coerce")           # textos -> NaN
+        texto = valores.where(x.isna(), "").astype(str).str.strip()
+        estilos[c] = np.select(
+            [x < 0, x > 0, texto.str.startswith("-"), texto.str.contains("%", regex=False)],
+            [CSS_NEGATIVO, CSS_POSITIVO, CSS_NEGATIVO, CSS_PERCENTUAL],
+            default="",
+        )
+    return pd.DataFrame(estilos, index=df.index)
+
+
+def mascara_linhas(df: pd.DataFrame, linhas, css: str = CSS_TOTAL) -> pd.DataFrame:
+    """CSS `css` em todas as colunas das `linhas` (posições), vazio no resto."""
+    marcadas = np.zeros(len(df), dtype=bool)
+    marcadas[np.asarray(linhas, dtype=int)] = True
+    bloco = np.where(marcadas[:, None], css, "")
+    return pd.DataFrame(np.broadcast_to(bloco, (len(df), df.shape[1])), index=df.index, columns=df.columns)
+
+
+def exibir_tabela(df: pd.DataFrame, estilos: pd.DataFrame = None, alinhar_direita=(), fixar=(), **kwargs):
+    """st.dataframe com a máscara `estilos` (mesmo índice; colunas = subconjunto de `df`).
+
+    `alinhar_direita` / `fixar` viram column_config nativo (valores já formatados como texto);
+    demais argumentos vão direto para o st.dataframe.
+    """
+    config = dict(kwargs.pop("column_config", None) or {})
+    for c in alinhar_direita:
+        config.setdefault(c, st.column_config.TextColumn(alignment="right"))
+    for c in fixar:
+        config.setdefault(c, st.column_config.Column(pinned=True))
+
+    dados = df
+    if estilos is not None and df.size <= LIMITE_ESTILO:
+        dados = df.style.apply(lambda _: estilos, axis=None, subset=list(estilos.columns))
+    return st.dataframe(dados, column_config=config or None, **kwargs)
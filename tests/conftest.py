@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Módulos agro_* ficam na raiz do repositório (layout plano das páginas Streamlit)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
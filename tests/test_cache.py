@@ -0,0 +1,40 @@
+# Cache de resultados (agro_cache): cópias por chamada, arrays somente leitura e limite em bytes.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from agro_cache import CacheResultados, em_cache
+
+
+def test_dicts_e_dataframes_vem_como_copia():
+    cache = CacheResultados(max_itens=8)
+    chamadas = []
+
+    @em_cache(cache=cache)
+    def calcular(x):
+        chamadas.append(x)
+        return {"total": x, "serie": np.arange(3.0), "tabela": pd.DataFrame({"v": [x, x]})}
+
+    a = calcular(1)
+    a["total"] = 99
+    a["tabela"].loc[0, "v"] = -1
+    b = calcular(1)
+
+    assert chamadas == [1]
+    assert b["total"] == 1
+    assert b["tabela"]["v"].tolist() == [1, 1]
+    assert b["serie"] is a["serie"]  # arrays continuam compartilhados...
+    with pytest.raises(ValueError):
+        b["serie"][0] = 5.0  # ...mas somente leitura
+
+
+def test_limite_em_bytes_descarta_os_mais_antigos():
+    cache = CacheResultados(max_itens=100, max_bytes=3 * 8000)
+    for i in range(5):
+        cache.obter_ou_calcular(str(i), lambda: np.zeros(1000))
+    est = cache.estatisticas()
+    assert est["itens"] == 3 and est["bytes"] <= 3 * 8000
+    # Maior que o orçamento inteiro: devolvido, mas não guardado
+    assert cache.obter_ou_calcular("grande", lambda: np.zeros(10_000)).size == 10_000
+    assert cache.estatisticas()["itens"] == 3
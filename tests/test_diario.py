@@ -0,0 +1,166 @@
+# Diário de alterações + compactação (agro_estado / agro_banco), nos dois destinos.
+
+import json
+import threading
+import time
+from datetime import date, datetime
+
+import pytest
+
+import agro_banco
+import agro_estado
+from agro_estado import ArquivoJson, PerfilBanco, agendar_gravacao, estado_em, historico, ler_estado
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def destino(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(agro_estado, "COMPACTAR_APOS", 3)
+    monkeypatch.setattr(agro_banco, "COMPACTAR_APOS", 3)
+    if request.param == "json":
+        return ArquivoJson(tmp_path / "agro_state.json")
+    return PerfilBanco(tmp_path / "agro_state.db", "ana@fazenda.com", "principal")
+
+
+def gravar(destino, alteracoes, sessao="s1"):
+    agendar_gravacao(destino, alteracoes, imediato=True, sessao=sessao)
+
+
+def test_historico_guarda_antes_depois_e_sessao(destino):
+    gravar(destino, {"soja_produtividade_sc_ha": 60.0, "soja_data_desembolso": "2025-08-30"}, sessao="a")
+    gravar(destino, {"soja_produtividade_sc_ha": 65.0}, sessao="b")
+
+    linhas = [(h["sessao"], h["chave"], h["antes"], h["depois"]) for h in historico(destino)]
+    assert linhas == [
+        ("a", "soja_produtividade_sc_ha", None, 60.0),
+        ("a", "soja_data_desembolso", None, date(2025, 8, 30)),
+        ("b", "soja_produtividade_sc_ha", 60.0, 65.0),
+    ]
+    assert [h["depois"] for h in historico(destino, "soja_produtividade_sc_ha")] == [60.0, 65.0]
+
+
+def test_valor_igual_nao_gera_linha(destino):
+    gravar(destino, {"soja_a": 1})
+    gravar(destino, {"soja_a": 1})
+    assert len(historico(destino)) == 1
+
+
+def test_estado_em_reproduz_o_plano(destino):
+    gravar(destino, {"soja_a": 1, "soja_b": 2})
+    time.sleep(0.01)
+    marco = datetime.now()
+    time.sleep(0.01)
+    gravar(destino, {"soja_a": 10})
+
+    assert estado_em(destino, marco) == {"soja_a": 1, "soja_b": 2}
+    assert estado_em(destino, datetime.now()) == ler_estado(destino)
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 4, 7, 10])
+def test_retrato_mais_cauda_igual_ao_estado_final(destino, n):
+    # Atravessa o limite de compactação (3) em pontos diferentes
+    esperado = {}
+    for i in range(n):
+        alteracoes = {"soja_a": i, f"soja_k{i % 2}": i}
+        gravar(destino, alteracoes)
+        esperado.update(alteracoes)
+    assert ler_estado(destino) == esperado
+    # Outro processo (sem nada em memória) lê o mesmo estado
+    agro_estado._RETRATOS.clear()
+    agro_estado._DOBRADOS.clear()
+    assert ler_estado(destino) == esperado
+
+
+def test_compactacao_json_dobra_o_diario_no_retrato(tmp_path, monkeypatch):
+    monkeypatch.setattr(agro_estado, "COMPACTAR_APOS", 3)
+    d = ArquivoJson(tmp_path / "agro_state.json")
+    gravar(d, {"soja_a": 1})
+    gravar(d, {"soja_a": 2})
+    assert not d.caminho.exists()  # abaixo do limite: só o diário
+
+    gravar(d, {"soja_b": 3})
+    retrato = json.loads(d.caminho.read_text(encoding="utf-8"))
+    assert retrato["soja_a"] == 2 and retrato["soja_b"] == 3
+    assert retrato["_diario_pos"] == d.diario.stat().st_size
+    assert len(historico(d)) == 3  # o diário continua inteiro
+
+
+def test_compactacao_banco_dobra_a_cauda(tmp_path, monkeypatch):
+    monkeypatch.setattr(agro_banco, "COMPACTAR_APOS", 3)
+    b = agro_banco.banco(tmp_path / "agro_state.db")
+    b.gravar("p", "f", {"soja_a": 1}, "s")
+    b.gravar("p", "f", {"soja_a": 2}, "s")
+    assert b._con.execute("SELECT COUNT(*) FROM estado").fetchone()[0] == 0
+
+    b.gravar("p", "f", {"soja_b": 3}, "s")
+    assert dict(b._con.execute("SELECT chave, valor FROM estado").fetchall()) == {"soja_a": "2", "soja_b": "3"}
+    b.gravar("p", "f", {"soja_a": 4}, "s")  # cauda nova sobre o retrato
+    assert b.ler("p", "f") == {"soja_a": 4, "soja_b": 3}
+    assert len(b.historico("p", "f")) == 4
+
+
+def test_json_linha_cortada_nao_corrompe_a_proxima(tmp_path):
+    d = ArquivoJson(tmp_path / "agro_state.json")
+    gravar(d, {"soja_a": 1})
+    with open(d.diario, "ab") as f:
+        f.write(b'{"momento": 1, "sessao": "x", "chave": "soja_a", "ant')  # queda no meio da escrita
+    agro_estado._DOBRADOS.clear()
+
+    gravar(d, {"soja_b": 2})
+    agro_estado._RETRATOS.clear()
+    agro_estado._DOBRADOS.clear()
+    assert ler_estado(d) == {"soja_a": 1, "soja_b": 2}
+    assert [h["chave"] for h in historico(d)] == ["soja_a", "soja_b"]
+
+
+def test_json_antigo_abre_o_historico(tmp_path):
+    caminho = tmp_path / "agro_state.json"
+    caminho.write_text(json.dumps({"soja_a": 1, "soja_btn_x": True}), encoding="utf-8")
+    d = ArquivoJson(caminho)
+    gravar(d, {"soja_b": 2})
+    assert [(h["chave"], h["sessao"]) for h in historico(d)] == [("soja_a", ""), ("soja_b", "s1")]
+    assert ler_estado(d) == {"soja_a": 1, "soja_b": 2}
+
+
+def test_gravacao_lenta_nao_trava_outro_destino(tmp_path):
+    lento, rapido = ArquivoJson(tmp_path / "lento.json"), ArquivoJson(tmp_path / "rapido.json")
+    liberar, entrou = threading.Event(), threading.Event()
+    gravar_original = lento.gravar
+
+    def gravar_lento(alteracoes, sessao=""):
+        entrou.set()
+        assert liberar.wait(5)
+        gravar_original(alteracoes, sessao)
+
+    lento.gravar = gravar_lento
+    t = threading.Thread(target=gravar, args=(lento, {"soja_a": 1}))
+    t.start()
+    try:
+        assert entrou.wait(5)
+        inicio = time.monotonic()
+        gravar(rapido, {"soja_b": 2})
+        assert ler_estado(rapido) == {"soja_b": 2}
+        assert time.monotonic() - inicio < 1
+    finally:
+        liberar.set()
+        t.join(5)
+    assert ler_estado(lento) == {"soja_a": 1}
+
+
+def test_falha_volta_para_a_fila_sem_passar_por_cima_do_novo(tmp_path):
+    d = ArquivoJson(tmp_path / "agro_state.json")
+    salvo = {}
+    gravar_original = d.gravar
+
+    def falha_uma_vez(alteracoes, sessao=""):
+        d.gravar = gravar_original
+        # Chega um valor novo enquanto a escrita (que vai falhar) está em andamento
+        agendar_gravacao(d, {"soja_a": 2}, sessao="s1")
+        raise OSError("disco cheio")
+
+    d.gravar = falha_uma_vez
+    agendar_gravacao(d, {"soja_a": 1, "soja_b": 1}, imediato=True, sessao="s1", gravadas=salvo)
+    assert salvo == {}
+
+    agro_estado.descarregar(d)
+    assert ler_estado(d) == {"soja_a": 2, "soja_b": 1}
+    assert salvo == {"soja_a": 2, "soja_b": 1}
@@ -0,0 +1,119 @@
+# Motor vetorizado (agro_engine) contra as fórmulas escalares de "CÁLCULOS PRINCIPAIS" das páginas.
+
+from datetime import date
+
+import numpy as np
+import pytest
+
+from agro_engine import calcular_cenario, calcular_kpis
+
+
+def _calculos_principais(area_propria, area_arrendada, produtividade, custo_ha_operacional, perc_comercializado,
+                         preco_medio_venda, preco_mercado, margem_desejada, perc_financiado, taxa_juros_ano,
+                         data_tomada, data_pagamento, arrendamento_sc_ha):
+    """Bloco "CÁLCULOS PRINCIPAIS" de 1_PAG_SOJA.py antes do motor, linha a linha."""
+    area_total = area_propria + area_arrendada
+    if area_total == 0: area_total = 1
+    producao_total = area_total * produtividade
+
+    vol_arrendamento_sacas = area_arrendada * arrendamento_sc_ha
+    producao_liquida_sacas = producao_total - vol_arrendamento_sacas
+    qtd_vendida = producao_total * (perc_comercializado / 100)
+    receita_hedge = qtd_vendida * preco_medio_venda
+    qtd_aberta_fisica = max(0, producao_liquida_sacas - qtd_vendida)
+    receita_spot = qtd_aberta_fisica * preco_mercado
+    receita_bruta_total = receita_hedge + receita_spot
+    preco_medio_blended = receita_bruta_total / producao_liquida_sacas if producao_liquida_sacas > 0 else 0
+
+    custo_operacional_total = area_total * custo_ha_operacional
+    valor_base_financiamento = custo_operacional_total * (perc_financiado / 100)
+    dias_financiamento = max(0, (data_pagamento - data_tomada).days)
+    custo_financeiro_juros = valor_base_financiamento * ((taxa_juros_ano / 100) / 365) * dias_financiamento
+    custo_arrendamento_reais_hoje = vol_arrendamento_sacas * preco_mercado
+    custo_total_caixa = custo_operacional_total + custo_financeiro_juros
+    custo_total_safra = custo_total_caixa + custo_arrendamento_reais_hoje
+
+    lucro_operacional = receita_bruta_total - custo_operacional_total
+    fluxo_caixa_operacional = lucro_operacional - custo_financeiro_juros
+    lucro_liquido = receita_bruta_total - custo_total_caixa
+    margem_liquida_perc = (lucro_liquido / receita_bruta_total) * 100 if receita_bruta_total > 0 else 0
+
+    roi_perc = (lucro_liquido / custo_total_safra) * 100 if custo_total_safra > 0 else 0
+    roi_caixa_perc = (lucro_liquido / custo_total_caixa) * 100 if custo_total_caixa > 0 else 0
+    barter_operacional_sc_ha = custo_ha_operacional / preco_mercado if preco_mercado > 0 else 0
+    barter_total_sc_ha = (custo_total_safra / area_total) / preco_mercado if preco_mercado > 0 else 0
+
+    saldo_a_cobrir = custo_total_caixa - receita_hedge
+    vol_disponivel_pgto = producao_liquida_sacas - qtd_vendida
+    preco_breakeven_saldo = saldo_a_cobrir / vol_disponivel_pgto if vol_disponivel_pgto > 0 else 0
+
+    custo_op_fin_sc = custo_total_caixa / preco_mercado if preco_mercado > 0 else 0
+    breakeven_sc_total_conserv = custo_op_fin_sc + vol_arrendamento_sacas
+    breakeven_sc_ha_conservador = breakeven_sc_total_conserv / area_total if area_total > 0 else 0
+
+    preco_medio_total_producao = ((perc_comercializado/100) * preco_medio_venda) + ((1 - (perc_comercializado/100)) * preco_mercado)
+    breakeven_sc_ha_plano = (custo_total_caixa + custo_arrendamento_reais_hoje) / (area_total * preco_medio_total_producao) if (area_total > 0 and preco_medio_total_producao > 0) else 0
+    breakeven_sc_ha = breakeven_sc_ha_plano
+
+    receita_alvo_total = custo_total_caixa / (1 - (margem_desejada/100)) if margem_desejada < 100 else custo_total_caixa * 1.5
+    receita_faltante_para_meta = receita_alvo_total - receita_hedge
+    preco_alvo_restante_meta = receita_faltante_para_meta / qtd_aberta_fisica if qtd_aberta_fisica > 0 else 0
+
+    margem_seguranca_sc_ha = produtividade - breakeven_sc_ha
+    custo_sc_liquida = custo_total_caixa / producao_liquida_sacas if producao_liquida_sacas > 0 else 0
+    custo_sc_total = custo_total_safra / producao_liquida_sacas if producao_liquida_sacas > 0 else 0
+
+    custo_ha_medio_op_fin = (custo_total_caixa) / area_total if area_total > 0 else 0
+    custo_ha_area_arrendada = custo_ha_medio_op_fin + (arrendamento_sc_ha * preco_mercado)
+    juros_por_saca_reais = custo_financeiro_juros / producao_total if producao_total > 0 else 0
+
+    return {k: v for k, v in locals().items() if k not in ENTRADAS}
+
+
+BASE = dict(
+    area_propria=1000, area_arrendada=500, produtividade=60.0, custo_ha_operacional=6000.0,
+    perc_comercializado=25, preco_medio_venda=115.0, preco_mercado=105.0, margem_desejada=20,
+    perc_financiado=30.0, taxa_juros_ano=12.0, arrendamento_sc_ha=15.0,
+)
+DATAS = dict(data_tomada=date(2025, 8, 30), data_pagamento=date(2026, 4, 30))
+# Entradas que não são KPIs (produtividade também é saída: a efetiva)
+ENTRADAS = (set(BASE) | set(DATAS)) - {"produtividade"}
+
+CENARIOS = [
+    {},
+    {"area_propria": 0, "area_arrendada": 0},                     # área zerada -> 1 ha
+    {"perc_comercializado": 100},                                 # tudo travado: sem saldo aberto
+    {"arrendamento_sc_ha": 150.0},                                # arrendamento + hedge acima da produção: saldo aberto zera
+    {"preco_mercado": 0.0},                                       # divisões protegidas por preço
+    {"margem_desejada": 100},                                     # meta no limite (custo × 1,5)
+    {"produtividade": 0.0},                                       # sem produção
+    {"data_pagamento": date(2025, 1, 1)},                         # pagamento antes do desembolso: 0 dias
+    {"produtividade": 60.0 * (1 - 0.35), "taxa_juros_ano": 0.0},  # quebra já aplicada, sem juros
+]
+
+
+@pytest.mark.parametrize("ajuste", CENARIOS)
+def test_calcular_cenario_igual_as_formulas_da_pagina(ajuste):
+    entradas = {**BASE, **DATAS, **ajuste}
+    esperado = _calculos_principais(**entradas)
+    obtido = calcular_cenario(**entradas)
+    for k, v in esperado.items():
+        assert obtido[k] == pytest.approx(v, rel=1e-12, abs=1e-9), k
+
+
+def test_lote_vetorizado_igual_a_um_cenario_por_vez():
+    entradas = [{**BASE, **DATAS, **ajuste} for ajuste in CENARIOS]
+    lote = calcular_kpis(
+        dias_financiamento=[max(0, (e["data_pagamento"] - e["data_tomada"]).days) for e in entradas],
+        **{k: np.array([e[k] for e in entradas], dtype=float) for k in BASE},
+    )
+    for i, e in enumerate(entradas):
+        um = calcular_cenario(**e)
+        for k, v in lote.items():
+            assert float(v[i]) == pytest.approx(um[k], rel=1e-12, abs=1e-9), (i, k)
+
+
+def test_fator_quebra_igual_a_produtividade_efetiva():
+    com_fator = calcular_cenario(**BASE, **DATAS, fator_quebra=0.2)
+    efetiva = calcular_cenario(**{**BASE, "produtividade": BASE["produtividade"] * 0.8}, **DATAS)
+    assert com_fator == pytest.approx(efetiva)
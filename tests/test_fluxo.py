@@ -0,0 +1,105 @@
+# Livro de eventos (agro_fluxo) contra o loop de 12 meses da antiga seção "Fluxo de Caixa Projetado".
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from agro_fluxo import consolidar_fluxo, eventos_safra, tabela_necessidade_venda
+
+
+def _loop_12_meses(custo_operacional_total, valor_base_financiamento, custo_financeiro_juros, perc_insumos,
+                   perc_colheita, pct_entrada_insumo, pct_parc2, data_parc2, pct_parc3, data_parc3,
+                   data_pagamento, mes_colheita, receita_hedge, receita_spot):
+    """Loop de 1_PAG_SOJA.py antes do livro de eventos (janela fixa Set/25–Ago/26, plantio em setembro)."""
+    meses_fluxo = pd.date_range(start=date(2025, 9, 1), periods=12, freq="M")
+    entradas = np.zeros(12)
+    saidas = np.zeros(12)
+    perc_manutencao = 100 - perc_insumos - perc_colheita
+
+    custo_insumos_total = custo_operacional_total * (perc_insumos/100)
+    valor_insumos_financiado = min(custo_insumos_total, valor_base_financiamento)
+    custo_insumos_proprio = custo_insumos_total - valor_insumos_financiado
+    saldo_financiamento = max(0, valor_base_financiamento - custo_insumos_total)
+
+    idx_plantio = 0
+    saidas[idx_plantio] += custo_insumos_proprio * (pct_entrada_insumo/100)
+    for i, m in enumerate(meses_fluxo):
+        if m.month == data_parc2.month and m.year == data_parc2.year:
+            saidas[i] += custo_insumos_proprio * (pct_parc2/100)
+        if m.month == data_parc3.month and m.year == data_parc3.year:
+            saidas[i] += custo_insumos_proprio * (pct_parc3/100)
+
+    custo_manut_total = custo_operacional_total * (perc_manutencao/100)
+    idx_colheita_arr = (mes_colheita - 9) if mes_colheita >= 9 else (mes_colheita + 3)
+    duracao = max(1, idx_colheita_arr - idx_plantio + 1)
+    mensal_manut = custo_manut_total / duracao
+    for i in range(idx_plantio, idx_plantio + duracao):
+        if 0 <= i < 12:
+            pago_banco = min(mensal_manut, saldo_financiamento)
+            saidas[i] += mensal_manut - pago_banco
+            saldo_financiamento -= pago_banco
+
+    custo_colheita_total = custo_operacional_total * (perc_colheita/100)
+    if 0 <= idx_colheita_arr < 12:
+        pago_banco = min(custo_colheita_total, saldo_financiamento)
+        saidas[idx_colheita_arr] += custo_colheita_total - pago_banco
+        saldo_financiamento -= pago_banco
+
+    if valor_base_financiamento > 0:
+        for i, m in enumerate(meses_fluxo):
+            if m.month == data_pagamento.month and m.year == data_pagamento.year:
+                saidas[i] += (valor_base_financiamento + custo_financeiro_juros)
+                break
+
+    if 0 <= idx_colheita_arr < 12:
+        entradas[idx_colheita_arr] += receita_hedge
+    entradas[min(11, idx_colheita_arr + 2)] += receita_spot
+    return entradas, saidas
+
+
+BASE = dict(
+    custo_operacional_total=9_000_000.0, valor_base_financiamento=2_700_000.0, custo_financeiro_juros=215_000.0,
+    perc_insumos=60, perc_colheita=20, pct_entrada_insumo=50, pct_parc2=25, data_parc2=date(2026, 4, 30),
+    pct_parc3=25, data_parc3=date(2026, 5, 30), data_pagamento=date(2026, 4, 30), mes_colheita=4,
+    receita_hedge=2_587_500.0, receita_spot=6_142_500.0,
+)
+
+CENARIOS = [
+    {},
+    {"valor_base_financiamento": 0.0, "custo_financeiro_juros": 0.0},  # sem custeio
+    {"valor_base_financiamento": 7_000_000.0},                         # custeio sobra e paga manutenção/colheita
+    {"mes_colheita": 1, "data_pagamento": date(2026, 2, 15)},          # colheita em janeiro
+    {"perc_insumos": 30, "perc_colheita": 10, "mes_colheita": 3},
+]
+
+
+@pytest.mark.parametrize("ajuste", CENARIOS)
+def test_livro_igual_ao_loop_de_12_meses(ajuste):
+    e = {**BASE, **ajuste}
+    entradas, saidas = _loop_12_meses(**e)
+
+    ledger = eventos_safra(data_tomada=date(2025, 8, 30), mes_plantio=9, **e)
+    fluxo = consolidar_fluxo(ledger, inicio="2025-09", fim="2026-08", resolucao="M")
+
+    np.testing.assert_allclose(fluxo["entradas"][0], entradas, rtol=1e-12, atol=1e-6)
+    np.testing.assert_allclose(fluxo["saidas"][0], saidas, rtol=1e-12, atol=1e-6)
+    np.testing.assert_allclose(fluxo["saldo_acumulado"][0], np.cumsum(entradas - saidas), rtol=1e-12, atol=1e-6)
+
+
+def test_necessidade_de_venda_igual_ao_loop():
+    entradas, saidas = _loop_12_meses(**BASE)
+    gap = saidas - entradas
+    meses = pd.date_range(start=date(2025, 9, 1), periods=12, freq="M").strftime("%b/%y")
+
+    fluxo = consolidar_fluxo(
+        eventos_safra(data_tomada=date(2025, 8, 30), mes_plantio=9, **BASE), inicio="2025-09", fim="2026-08"
+    )
+    df = tabela_necessidade_venda(fluxo, preco_mercado=105.0, producao_total=90_000.0)
+
+    assert list(df["Mês"][:-1]) == list(meses[gap > 0])
+    assert df["Mês"].iloc[-1] == "TOTAL ACUMULADO"
+    np.testing.assert_allclose(df["Déficit a Cobrir"][:-1], gap[gap > 0])
+    assert df["Déficit a Cobrir"].iloc[-1] == pytest.approx(gap[gap > 0].sum())
+    assert df["Sacas Necessárias"].iloc[-1] == pytest.approx(gap[gap > 0].sum() / 105.0)
@@ -0,0 +1,61 @@
+# Sketch de quantis (agro_quantis): precisão contra a amostra completa, em memória constante.
+
+import numpy as np
+import pytest
+
+from agro_quantis import SketchQuantis
+
+QS = np.array([0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99])
+N = 200_000
+
+
+def _amostras():
+    rng = np.random.default_rng(7)
+    return {
+        "normal": rng.normal(1e6, 3e5, N),  # lucro líquido típico
+        "lognormal": rng.lognormal(0.0, 1.0, N),  # cauda longa à direita
+        "bimodal": np.concatenate([rng.normal(-5, 1, N // 2), rng.normal(5, 2, N // 2)]),  # com/sem quebra
+    }
+
+
+def _erro_de_posicao(sketch, x):
+    """Maior |posição real do quantil estimado − q| (erro em fração da amostra)."""
+    ordenado = np.sort(x)
+    return np.abs(np.searchsorted(ordenado, sketch.quantil(QS)) / x.size - QS).max()
+
+
+@pytest.mark.parametrize("nome", ["normal", "lognormal", "bimodal"])
+def test_quantis_em_lotes_proximos_dos_exatos(nome):
+    x = _amostras()[nome]
+    s = SketchQuantis()
+    for lote in np.array_split(x, 20):
+        s.adicionar(lote)
+
+    assert _erro_de_posicao(s, x) <= 0.002
+    assert s.medias.size <= s.compressao  # memória constante, não N
+    # Momentos e extremos são exatos
+    assert s.n == N
+    assert s.media == pytest.approx(x.mean(), rel=1e-9, abs=1e-12)
+    assert s.variancia == pytest.approx(x.var(ddof=1), rel=1e-9)
+    assert (s.minimo, s.maximo) == (x.min(), x.max())
+    # Média das caudas de 5% (CVaR)
+    ordenado = np.sort(x)
+    assert s.media_cauda(0.05) == pytest.approx(ordenado[: N // 20].mean(), abs=0.01 * x.std())
+    assert s.media_cauda(0.05, inferior=False) == pytest.approx(ordenado[-N // 20:].mean(), abs=0.01 * x.std())
+
+
+def test_mesclar_lotes_separados_tem_a_mesma_precisao():
+    x = _amostras()["bimodal"]
+    partes = [SketchQuantis().adicionar(p) for p in (x[::3], x[1::3], x[2::3])]
+    s = SketchQuantis.combinar(partes)
+    assert s.n == N
+    assert s.media == pytest.approx(x.mean(), abs=1e-9)
+    assert s.variancia == pytest.approx(x.var(ddof=1), rel=1e-9)
+    assert _erro_de_posicao(s, x) <= 0.002
+
+
+def test_cdf_inversa_do_quantil():
+    x = _amostras()["normal"]
+    s = SketchQuantis().adicionar(x)
+    np.testing.assert_allclose(s.cdf(s.quantil(QS)), QS, atol=1e-9)
+    assert s.cdf(np.median(x)) == pytest.approx(0.5, abs=0.002)
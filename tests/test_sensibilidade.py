@@ -0,0 +1,39 @@
+# Grade do mapa de sensibilidade (agro_sensibilidade): faixas inválidas e teto de células.
+
+import numpy as np
+import pytest
+
+from agro_sensibilidade import MAX_CELULAS, eixo, grade, mapa_margem_ha
+
+
+def test_grade_igual_ao_arange_das_paginas():
+    prod, preco = grade((40, 90, 5), (90, 185, 5))
+    np.testing.assert_array_equal(prod, np.arange(40, 90, 5))
+    np.testing.assert_array_equal(preco, np.arange(90, 185, 5))
+    assert mapa_margem_ha(prod, preco, custo_fixo_ha=4000.0).shape == (10, 19)
+
+
+def test_grade_no_teto_e_aceita():
+    prod, preco = grade((0, 1000, 1), (0, 1000, 1))
+    assert prod.size * preco.size == MAX_CELULAS
+
+
+@pytest.mark.parametrize("faixas", [
+    ((0, 1e6, 0.01), (0, 1, 1)),        # 1e8 pontos num eixo
+    ((0, 500, 0.01), (0, 1000, 0.01)),  # produto externo de bilhões de células
+    ((0, 1001, 1), (0, 1000, 1)),       # um pouco acima do teto
+])
+def test_grade_grande_demais_da_valueerror(faixas):
+    with pytest.raises(ValueError, match="células"):
+        grade(*faixas)
+
+
+@pytest.mark.parametrize("faixa", [(10, 10, 1), (90, 40, 5), (40, 90, 0), (40, 90, -1)])
+def test_faixa_invalida_da_valueerror(faixa):
+    with pytest.raises(ValueError):
+        grade(faixa, (90, 185, 5))
+
+
+def test_eixo_sozinho_tambem_tem_teto():
+    with pytest.raises(ValueError, match="pontos"):
+        eixo(0, 1e6, 0.01)
@@ -0,0 +1,73 @@
+# Solver inverso (agro_solver): valores devolvidos zeram o resíduo; sem solução ou sem convergência -> NaN.
+
+from datetime import date
+
+import numpy as np
+import pytest
+
+from agro_engine import calcular_kpis
+from agro_solver import VARIAVEIS, faixa_padrao, meta_caixa, meta_lucro, meta_margem, resolver
+
+# Quatro fazendas (produtividades diferentes) resolvidas de uma vez
+BASE = dict(
+    area_propria=1000.0, area_arrendada=500.0, produtividade=np.array([60.0, 45.0, 30.0, 70.0]),
+    custo_ha_operacional=6000.0, perc_comercializado=25.0, preco_medio_venda=115.0, preco_mercado=105.0,
+    margem_desejada=20.0, perc_financiado=30.0, taxa_juros_ano=12.0, dias_financiamento=243.0,
+    arrendamento_sc_ha=15.0,
+)
+CRONOGRAMA = dict(
+    perc_insumos=60, perc_colheita=20, pct_entrada_insumo=50, pct_parc2=25, data_parc2=date(2026, 4, 30),
+    pct_parc3=25, data_parc3=date(2026, 5, 30), data_tomada=date(2025, 8, 30), data_pagamento=date(2026, 4, 30),
+    mes_plantio=9, mes_colheita=4,
+)
+METAS = {"lucro_zero": meta_lucro(0.0), "margem_meta": meta_margem(), "caixa_coberto": meta_caixa(CRONOGRAMA)}
+
+
+def _residuo(variavel, meta, x):
+    e = {**{k: np.asarray(v, dtype=float) for k, v in BASE.items()}, variavel: np.asarray(x, dtype=float)}
+    return np.broadcast_to(meta(calcular_kpis(**e), e), (4,))
+
+
+def _escala(variavel, meta):
+    # Mesma tolerância do solver: relativa ao maior |resíduo| nos extremos da faixa
+    lo, hi = faixa_padrao(BASE, variavel)
+    return np.maximum(1.0, np.maximum(np.abs(_residuo(variavel, meta, lo)), np.abs(_residuo(variavel, meta, hi))))
+
+
+@pytest.mark.parametrize("variavel", list(VARIAVEIS))
+@pytest.mark.parametrize("nome", list(METAS))
+def test_valor_devolvido_zera_o_residuo(variavel, nome):
+    meta = METAS[nome]
+    r = resolver(BASE, variavel, meta)
+    valor = r["valor"]
+
+    assert np.array_equal(np.isfinite(valor), r["resolvido"])
+    ok = np.isfinite(valor)
+    res = _residuo(variavel, meta, np.where(ok, valor, 0.0))
+    assert np.all(np.abs(res[ok]) <= 1e-6 * _escala(variavel, meta)[ok])
+
+
+def test_sem_mudanca_de_sinal_na_faixa_da_nan():
+    # Margem de 20% só com juros: nenhuma taxa >= 0 chega lá nas fazendas abaixo do nivelamento
+    lo, hi = faixa_padrao(BASE, "taxa_juros_ano")
+    f_lo, f_hi = _residuo("taxa_juros_ano", METAS["margem_meta"], lo), _residuo("taxa_juros_ano", METAS["margem_meta"], hi)
+    sem_raiz = np.sign(f_lo) * np.sign(f_hi) > 0
+    assert sem_raiz.any()
+    r = resolver(BASE, "taxa_juros_ano", METAS["margem_meta"])
+    assert np.isnan(r["valor"][sem_raiz]).all()
+    assert not r["resolvido"][sem_raiz].any()
+
+
+def test_sem_convergencia_da_nan_nunca_aproximacao():
+    # Lucro x produtividade é afim só por partes (volume aberto com max(0, ·)): o passo fechado não basta
+    completo = resolver(BASE, "produtividade", METAS["lucro_zero"])
+    cortado = resolver(BASE, "produtividade", METAS["lucro_zero"], max_iter=0)
+    assert np.isfinite(completo["valor"]).all()
+    assert not cortado["resolvido"].any()
+    assert np.isnan(cortado["valor"]).all()
+
+    # Resíduo afim (lucro x preço): o passo fechado já é a solução, mesmo sem iterações
+    fechado = resolver(BASE, "preco_mercado", METAS["lucro_zero"], max_iter=0)
+    assert fechado["resolvido"].all()
+    res = _residuo("preco_mercado", METAS["lucro_zero"], fechado["valor"])
+    assert np.all(np.abs(res) <= 1e-6 * _escala("preco_mercado", METAS["lucro_zero"]))